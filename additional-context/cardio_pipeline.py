@@ -1,4 +1,6 @@
 # CELL 1 - imports
+# Notebook walkthrough (EDA + plots). Untuk training ulang tanpa mengulang tahap yang tidak berubah
+# gunakan DAG di cardio/pipeline.py: python -m cardio.pipeline --csv cardio_train.csv
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
@@ -11,7 +13,7 @@ except ImportError:
         """Fallback display for non-notebook environments."""
         print(obj)
 
-from sklearn.model_selection import train_test_split, GridSearchCV
+from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.linear_model import LogisticRegression
 from sklearn.ensemble import RandomForestClassifier
@@ -21,9 +23,16 @@ from sklearn.metrics import (
 )
 import joblib
 import json
+import os
 import subprocess
 import sys
 
+# shared helpers (cardio/) live in the project root, one level up
+_here = os.path.dirname(os.path.abspath(__file__)) if '__file__' in globals() else os.getcwd()
+sys.path.insert(0, os.path.abspath(os.path.join(_here, '..')))
+from cardio.features import CLEAN_LIMITS, FEATURE_ORDER, NUMERIC_FEATURES
+from cardio.dataset import load_dataset
+
 print('imports ready')
 
 # CELL 2 - load (sesuaikan path jika perlu)
@@ -31,15 +40,17 @@ import os
 print('Current working dir:', os.getcwd())
 csv_path = 'cardio_train.csv'  # ganti jika file ada di tempat lain
 if os.path.exists(csv_path):
-    df_preview = pd.read_csv(csv_path, sep=';')
-    print('Loaded preview shape:', df_preview.shape)
-    display(df_preview.head())
+    # CSV hanya di-parse sekali: hasil cleaning + encoding disimpan per kolom (.npy) di cache
+    # (cardio/dataset.py), key = fingerprint isi CSV + parameter cleaning; run berikutnya di-mmap
+    dataset = load_dataset(csv_path)
+    print('Dataset cache:', dataset.status, dataset.path)
+    print('Source rows:', dataset.manifest['source_rows'], '| cached rows:', dataset.rows)
 else:
     print(f"File '{csv_path}' tidak ditemukan di working directory. Upload file ke folder kerja atau ganti path pada variabel `csv_path`.")
 
 # CELL 3 - quick inspection
-if os.path.exists(csv_path):
-    df = pd.read_csv(csv_path, sep=';')
+if 'dataset' in globals():
+    df = dataset.frame()
     display(df.info())
     display(df.describe(include='all').T)
     print('\nMissing values per column:')
@@ -52,17 +63,11 @@ Atur batas outlier sesuai kebutuhan domain. Contoh batas yang digunakan di noteb
 """
 
 # CELL 4 - age to years & filter outliers
-if os.path.exists(csv_path):
-    df = pd.read_csv(csv_path, sep=';')
-    df['age_years'] = (df['age'] / 365).astype(int)
-    cond = (
-        (df['ap_hi'] >= 60) & (df['ap_hi'] <= 250) &
-        (df['ap_lo'] >= 40) & (df['ap_lo'] <= 180) &
-        (df['height'] >= 130) & (df['height'] <= 220) &
-        (df['weight'] >= 30) & (df['weight'] <= 250)
-    )
-    df = df[cond].copy()
-    print('After filtering, shape =', df.shape)
+if 'dataset' in globals():
+    # age_years = age (hari) / 365 dan filter CLEAN_LIMITS (cardio/features.py, dipakai juga
+    # oleh cardio.score_csv) sudah diterapkan saat cache dibangun
+    print('Cleaning limits:', CLEAN_LIMITS)
+    print('After filtering, shape =', df.shape, f"({dataset.manifest['source_rows'] - dataset.rows} rows dropped)")
     display(df.head())
 else:
     print('Skip cleaning: file not found')
@@ -71,12 +76,10 @@ else:
 Tambahkan BMI, selisih tekanan darah, dan kategori umur contoh.
 """
 
-# CELL 6 - feature engineering
+# CELL 6 - feature engineering (cardio/features.py, shared with serving)
 if 'df' in globals():
-    df['bmi'] = df['weight'] / ((df['height'] / 100) ** 2)
-    df['bp_diff'] = df['ap_hi'] - df['ap_lo']
-    df['age_cat'] = pd.cut(df['age_years'], bins=[0,30,45,60,200], labels=['<30','30-45','45-60','60+'])
-    display(df[['age_years','age_cat','height','weight','bmi','ap_hi','ap_lo']].head())
+    engineered = df[FEATURE_ORDER]
+    display(engineered[['age_years','height','weight','bmi','ap_hi','ap_lo']].head())
 else:
     print('Skip feature engineering: df not available')
 
@@ -85,15 +88,13 @@ Handle `gender`, `cholesterol`, `gluc`, dan `age_cat`.
 """
 
 # CELL 7 - encoding
-if 'df' in globals():
-    df['gender'] = df['gender'].astype(int)
-    # create gender_male (dataset Kaggle: 1 = female, 2 = male)
-    df['gender_male'] = (df['gender'] == 2).astype(int)
-    df = pd.get_dummies(df, columns=['cholesterol','gluc','age_cat'], drop_first=True)
-    # drop original 'gender' if not needed
-    df.drop(columns=['gender'], inplace=True)
+if 'engineered' in globals():
+    # gender_male (dataset Kaggle: 1 = female, 2 = male) and the cholesterol/gluc/age_cat
+    # dummies (drop_first) are already part of the cached frame; original 'gender' is dropped.
+    # Columns: id, age (hari), cardio + FEATURE_ORDER, dtypes di-downcast tanpa kehilangan nilai
     print('Columns after encoding/sample:')
     print(df.columns.tolist()[:40])
+    print(df.dtypes.value_counts().to_dict())
 else:
     print('Skip encoding: df not available')
 
@@ -156,7 +157,7 @@ Scale numerics menggunakan `StandardScaler`. Simpan scaler untuk deployment.
 
 # CELL 12 - scaling
 if 'X_train' in globals():
-    num_cols = X.select_dtypes(include=['float64','int64']).columns.tolist()
+    num_cols = [c for c in NUMERIC_FEATURES if c in X.columns]
     scaler = StandardScaler()
     # fit on train only
     X_train_scaled = X_train.copy()
@@ -200,32 +201,33 @@ if 'X_train_scaled' in globals():
 else:
     print('Skip RF: scaled data not available')
 
-"""## 12) (Optional) Hyperparameter tuning contoh GridSearch untuk RandomForest
-GridSearch bisa memakan waktu; ubah parameter jika perlu.
+"""## 12) (Optional) Hyperparameter tuning untuk RandomForest
+Successive halving (`cardio/search.py`) menggantikan GridSearchCV 12 kombinasi x 3 fold:
+kandidat 100 dan 200 tree berbagi satu forest warm-start, tiap rung memakai subsample fold
+yang makin besar, dan rung terakhir memakai fold penuh sehingga skornya sama dengan GridSearchCV.
+Semua fit berjalan di satu pool (tidak lagi n_jobs=-1 di dalam n_jobs=-1).
 Set SKIP_GRIDSEARCH=1 environment variable to skip this step.
 """
 
-# CELL 15 - GridSearch example (optional)
+# CELL 15 - hyperparameter search (optional)
 skip_grid = os.environ.get('SKIP_GRIDSEARCH', '0') == '1'
 if skip_grid:
-    print('SKIP_GRIDSEARCH=1, skipping GridSearch (saves time).')
+    print('SKIP_GRIDSEARCH=1, skipping hyperparameter search (saves time).')
 elif 'X_train_scaled' in globals():
-    print('Starting GridSearchCV... This may take 10-30 minutes.')
-    print('Set environment variable SKIP_GRIDSEARCH=1 to skip this step in future runs.')
+    from cardio.search import halving_search
     param_grid = {
         'n_estimators': [100, 200],
         'max_depth': [None, 10, 20],
         'min_samples_split': [2, 5]
     }
-    # verbose=2 shows progress for each fit
-    gs = GridSearchCV(RandomForestClassifier(random_state=42, n_jobs=-1), param_grid, cv=3, scoring='f1', n_jobs=-1, verbose=2)
-    gs.fit(X_train_scaled, y_train)
-    print('Best params:', gs.best_params_)
-    best_rf = gs.best_estimator_
+    # logs score and fit time per candidate per rung
+    search = halving_search(X_train_scaled, y_train, param_grid, cv=3, scoring='f1', n_jobs=-1)
+    print('Best params:', search.best_params)
+    best_rf = search.best_estimator
     y_pred_best = best_rf.predict(X_test_scaled)
     print(classification_report(y_test, y_pred_best))
 else:
-    print('Skip GridSearch: scaled data not available')
+    print('Skip hyperparameter search: scaled data not available')
 
 """## 13) Feature importance
 Print & plot feature importance dari Random Forest.
@@ -243,41 +245,34 @@ if 'rf' in globals():
 else:
     print('Skip feature importance: rf not available')
 
-"""## 14) SHAP (opsional)
-Gunakan SHAP untuk explainability per-sample jika ingin.
-Pastikan paket `shap` sudah terinstall.
-Set SKIP_SHAP=1 environment variable to skip this step.
+"""## 14) Explainability per-sample
+Kontribusi tiap fitur untuk setiap pasien di test set (tanpa paket `shap`).
+Set SKIP_EXPLAIN=1 environment variable to skip this step.
+TreeSHAP (sampel 1000 baris) tetap ada sebagai stage `shap` di `cardio.pipeline`.
 """
 
-# CELL 17 - SHAP (optional)
-skip_shap = os.environ.get('SKIP_SHAP', '0') == '1'
-if skip_shap:
-    print('SKIP_SHAP=1, skipping SHAP analysis (saves time).')
+# CELL 17 - Explanations (path contributions, seluruh test set)
+# Kontribusi per fitur dari jalur tiap pohon (cardio.explain): base_value +
+# jumlah kontribusi = probabilitas forest persis. Engine yang sama dipakai
+# endpoint explain di service; beberapa detik untuk seluruh test set, jadi
+# tidak perlu sampling seperti SHAP (SKIP_EXPLAIN=1 untuk melewati).
+skip_explain = os.environ.get('SKIP_EXPLAIN', os.environ.get('SKIP_SHAP', '0')) == '1'
+if skip_explain:
+    print('SKIP_EXPLAIN=1, skipping explanations.')
+elif 'rf' in globals() and 'X_test_scaled' in globals():
+    from cardio.explain import PathExplainer, explain_parallel, summarize
+    explainer = PathExplainer.from_model(rf, list(X_test_scaled.columns))
+    contributions, explained_proba = explain_parallel(explainer, X_test_scaled.to_numpy(dtype=float))
+    print(f'Explained {len(contributions)} test rows; max |proba diff| vs rf:',
+          np.abs(explained_proba - rf.predict_proba(X_test_scaled)[:, 1]).max())
+    mean_abs = pd.Series(summarize(explainer, contributions)['mean_abs'])
+    plt.figure(figsize=(8, 6))
+    mean_abs.sort_values().plot(kind='barh')
+    plt.title('Mean |contribution| per fitur (test set)')
+    plt.tight_layout()
+    plt.show()
 else:
-    try:
-        if 'rf' in globals() and 'X_test_scaled' in globals():
-            import shap
-            print('Starting SHAP analysis... This may take 5-15 minutes.')
-            print('Set environment variable SKIP_SHAP=1 to skip this step in future runs.')
-            
-            # Sample subset for faster SHAP calculation (1000 samples instead of all 13k+)
-            max_samples = min(1000, len(X_test_scaled))
-            print(f'Using {max_samples} samples for SHAP (out of {len(X_test_scaled)} test samples).')
-            sample_indices = np.random.choice(len(X_test_scaled), max_samples, replace=False)
-            X_shap = X_test_scaled.iloc[sample_indices] if hasattr(X_test_scaled, 'iloc') else X_test_scaled[sample_indices]
-            
-            print('Creating SHAP explainer...')
-            explainer = shap.TreeExplainer(rf)
-            print('Computing SHAP values...')
-            shap_values = explainer.shap_values(X_shap)
-            print('Generating SHAP summary plot...')
-            # Summary plot
-            shap.summary_plot(shap_values[1], X_shap)
-            print('SHAP analysis complete.')
-        else:
-            print('Skip SHAP: rf or X_test_scaled not available')
-    except Exception as e:
-        print('SHAP error or not installed:', e)
+    print('Skip explanations: rf or X_test_scaled not available')
 
 """## 15) Final evaluation & save model
 Simpan model RandomForest yang sudah dilatih.
@@ -287,6 +282,32 @@ Simpan model RandomForest yang sudah dilatih.
 if 'rf' in globals():
     joblib.dump(rf, 'rf_cardio_model.joblib')
     print('Model saved to rf_cardio_model.joblib')
+    # Array-backed export for MODEL_BACKEND=compiled, checked against sklearn on the test split
+    from cardio.forest import CompiledForest, check_parity
+    compiled_rf = CompiledForest.from_sklearn(rf)
+    parity = check_parity(rf, compiled_rf, X_test_scaled)
+    print('Compiled forest parity on test split:', parity)
+    if parity['label_mismatches'] == 0 and parity['max_proba_diff'] <= 1e-12:
+        compiled_rf.save('rf_cardio_model.npz')
+        print('Compiled forest saved to rf_cardio_model.npz')
+        # Bundle NumPy-only (forest + scaler + urutan fitur) untuk serving tanpa sklearn
+        from cardio.portable import export as export_bundle
+        export_bundle(compiled_rf, scaler, 'cardio_model.cardio', list(X_train.columns))
+        print('Portable bundle saved to cardio_model.cardio')
+    else:
+        print('Compiled forest does not match sklearn, not saved')
+    # Logistic regression CELL 13 sebagai tier pertama (cardio.cascade): band
+    # di-tune di separuh test split supaya label tetap >= 99% sama dengan forest,
+    # agreement yang dicetak diukur di separuh lainnya
+    if 'lr' in globals():
+        from cardio.cascade import build as build_cascade
+        lr_cascade, cascade_report = build_cascade(lr, compiled_rf, X_test_scaled, y_test)
+        lr_cascade.save('lr_cascade.npz')
+        print('Cascade saved to lr_cascade.npz:', {k: cascade_report[k] for k in ('band', 'agreement', 'short_circuit_fraction', 'latency_saved_fraction')})
+    # Statistik referensi fitur X_train (belum di-scale) untuk monitor drift di service (cardio.drift)
+    from cardio.drift import reference as drift_reference
+    drift_reference(X_train.to_numpy(dtype=float), list(X_train.columns)).save('drift_reference.json')
+    print('Drift reference saved to drift_reference.json')
     # basic final metrics
     if 'y_pred_rf' in globals():
         print('Final RF Accuracy:', accuracy_score(y_test, y_pred_rf))
@@ -1,17 +1,32 @@
 """FastAPI service for cardio disease prediction using pre-trained model artifacts."""
 from __future__ import annotations
 
+import asyncio
 import json
+import os
+import sys
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import joblib
 import numpy as np
-import pandas as pd
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel, Field, PositiveInt
 
-MODEL_PATH = Path("rf_cardio_model.joblib")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from cardio.batching import MicroBatcher  # noqa: E402
+from cardio.cascade import Cascade  # noqa: E402
+from cardio.drift import DriftMonitor, DriftSketch  # noqa: E402
+from cardio.predlog import PredictionLog  # noqa: E402
+from cardio.features import RAW_FIELDS, build_features, scale_features  # noqa: E402
+from cardio.forest import CompiledForest, load_model, predict_with_proba  # noqa: E402
+from cardio.registry import DEFAULT_HISTORY, ModelRegistry, ModelVersion  # noqa: E402
+from cardio import wire  # noqa: E402
+from cardio.result_cache import ResultCache, canonical_key, model_version  # noqa: E402
+from cardio.timing import METRICS, StageTimer  # noqa: E402
+
+MODEL_PATH = Path(os.environ.get("MODEL_PATH", "rf_cardio_model.joblib"))
 SCALER_PATH = Path("scaler_cardio.joblib")
 FEATURES_PATH = Path("features.json")
 
@@ -25,12 +40,87 @@ if not MODEL_PATH.exists() or not SCALER_PATH.exists() or not FEATURES_PATH.exis
         "Missing required artifact(s): " + ", ".join(missing)
     )
 
-rf_model = joblib.load(MODEL_PATH)
-scaler = joblib.load(SCALER_PATH)
+# MODEL_BACKEND=compiled serves through cardio.forest.CompiledForest.
+# SHARED_MODEL_PATH is set by serve_shared.py: every worker maps the same
+# exported forest read-only instead of unpickling its own copy.
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "sklearn")
+SHARED_MODEL_PATH = os.environ.get("SHARED_MODEL_PATH")
+# CASCADE_PATH=lr_cascade.npz (cardio.cascade): the logistic regression
+# answers rows outside its tuned band, only the rest reach the forest
+CASCADE_PATH = os.environ.get("CASCADE_PATH")
+# Training reference of the drift monitor (the pipeline's `drift` stage);
+# without it /stats/drift only reports the live sketch
+DRIFT_REFERENCE_PATH = os.environ.get("DRIFT_REFERENCE_PATH", "drift_reference.json")
+# POST /models/reload needs this token in X-Admin-Token; unset disables it
+MODEL_ADMIN_TOKEN = os.environ.get("MODEL_ADMIN_TOKEN")
 with FEATURES_PATH.open("r", encoding="utf-8") as fh:
     FEATURE_ORDER = json.load(fh)
 
 
+def _load_version(source: Dict[str, Any]) -> ModelVersion:
+    """Load a model / scaler (/ cascade) set from local paths; defaults are the startup ones."""
+    model_path = source.get("model_path")
+    scaler_path = Path(source.get("scaler_path") or SCALER_PATH)
+    cascade_path = source.get("cascade_path") or CASCADE_PATH
+    drift_path = Path(source.get("drift_path") or DRIFT_REFERENCE_PATH)
+    timer = StageTimer()
+    with timer.span("model_load"):
+        if model_path is None and SHARED_MODEL_PATH:
+            model = CompiledForest.load(SHARED_MODEL_PATH, mmap_mode="r")
+        else:
+            model = load_model(Path(model_path or MODEL_PATH), MODEL_BACKEND)
+    if cascade_path:
+        with timer.span("cascade_load"):
+            model = Cascade.load(cascade_path, model)
+    with timer.span("scaler_load"):
+        scaler = joblib.load(scaler_path)
+    METRICS.observe_timer(timer, endpoint="startup")
+    paths = {
+        "model": Path(model_path or SHARED_MODEL_PATH or MODEL_PATH),
+        "scaler": scaler_path,
+        "features": FEATURES_PATH,
+        **({"cascade": Path(cascade_path)} if cascade_path else {}),
+    }
+    artifacts = {key: {"path": str(path), "bytes": path.stat().st_size} for key, path in paths.items()}
+    drift_reference = None
+    if drift_path.exists():
+        drift_reference = DriftSketch.load(drift_path)
+        # Not part of the version: the reference does not change predictions
+        artifacts["drift_reference"] = {"path": str(drift_path), "bytes": drift_path.stat().st_size}
+    return ModelVersion(
+        # Path + size + mtime: a file replaced in place is a new version
+        version=model_version(*paths.values()),
+        model=model,
+        scaler=scaler,
+        feature_order=FEATURE_ORDER,
+        source={key: str(path) for key, path in paths.items()},
+        artifacts=artifacts,
+        drift_reference=drift_reference,
+    )
+
+
+# Results per canonical input, valid only for the active model version
+# (RESULT_CACHE_SIZE / RESULT_CACHE_TTL, 0 disables)
+RESULT_CACHE = ResultCache.from_env()
+# Live input sketch, compared against the active version's drift reference
+DRIFT = DriftMonitor()
+# Binary log of every prediction (PREDICTION_LOG_DIR unset disables it)
+PREDLOG = PredictionLog.from_env()
+# The explainer is built at load for compiled forests; the sklearn backend
+# copies the forest for it, so only with EXPLAIN_PRELOAD=1
+# MODEL_HISTORY previous versions stay in memory for rollback (one model each)
+REGISTRY = ModelRegistry(
+    _load_version,
+    history=int(os.environ.get("MODEL_HISTORY", DEFAULT_HISTORY)),
+    explain_preload=os.environ.get("EXPLAIN_PRELOAD", "0") == "1",
+)
+REGISTRY.on_swap(lambda active: RESULT_CACHE.bind(active.version))
+REGISTRY.on_swap(lambda active: DRIFT.set_reference(active.drift_reference))
+# The first version is loaded and warmed before the worker accepts requests;
+# later ones are loaded next to it by POST /models/reload and swapped in
+REGISTRY.load()
+
+
 class PredictionRequest(BaseModel):
     age: PositiveInt = Field(..., le=120, description="Age in years")
     gender: int = Field(2, ge=1, le=2, description="1 = female, 2 = male")
@@ -69,64 +159,258 @@ app = FastAPI(
 )
 
 
-def _prepare_features(payload: PredictionRequest) -> pd.DataFrame:
+def _raw_row(payload: PredictionRequest) -> Tuple[float, ...]:
     data: Dict[str, Any] = payload.dict()
-    df = pd.DataFrame([data])
-
-    # Feature engineering identical to training pipeline
-    df["age_years"] = df["age"].astype(int)
-    df["bmi"] = df["weight"] / ((df["height"] / 100) ** 2)
-    df["bp_diff"] = df["ap_hi"] - df["ap_lo"]
-    df["age_cat"] = pd.cut(
-        df["age_years"],
-        bins=[0, 30, 45, 60, 200],
-        labels=["<30", "30-45", "45-60", "60+"],
-        include_lowest=True,
-        right=True,
-    )
+    return canonical_key(data[field] for field in RAW_FIELDS)
+
 
-    # Encoding
-    df["gender"] = df["gender"].astype(int)
-    df["gender_male"] = (df["gender"] == 2).astype(int)
-    df = pd.get_dummies(df, columns=["cholesterol", "gluc", "age_cat"], drop_first=True)
+def _prepare_features(raw: Tuple[float, ...]) -> np.ndarray:
+    # Feature engineering identical to training pipeline (cardio.features)
+    return build_features(np.array([raw], dtype=np.float64), FEATURE_ORDER)
 
-    # Drop columns not used during training
-    df = df.drop(columns=["age", "gender"], errors="ignore")
 
-    # Ensure all expected columns exist
-    for col in FEATURE_ORDER:
-        if col not in df.columns:
-            df[col] = 0
+def _score_batch(features: np.ndarray) -> Tuple[np.ndarray, ...]:
+    # One version for the whole batch, even if a swap lands mid-batch
+    current = REGISTRY.current()
+    timer = StageTimer()
+    with timer.span("scale"):
+        scaled = scale_features(features, current.scaler, current.feature_order)
+    with timer.span("predict"):
+        preds, proba = predict_with_proba(current.model, scaled)
+    # Every row of the batch reports the batch's scale/predict time
+    stage_times = np.broadcast_to([seconds for _, seconds in timer.spans], (len(features), len(timer.spans)))
+    versions = np.full(len(features), current.version, dtype=object)
+    return preds, proba[:, 1], scaled, stage_times, versions
 
-    df = df[FEATURE_ORDER].astype(float)
-    return df
+
+# Concurrent /predict calls arriving within BATCH_MAX_WAIT_US are scored together
+batcher = MicroBatcher(
+    _score_batch,
+    max_batch_size=int(os.environ.get("BATCH_MAX_SIZE", 64)),
+    max_wait_us=int(os.environ.get("BATCH_MAX_WAIT_US", 1000)),
+)
 
 
 @app.get("/health")
-def health_check() -> Dict[str, str]:
-    return {"status": "ok", "model": str(MODEL_PATH.name)}
+def health_check() -> Dict[str, Any]:
+    current = REGISTRY.current()
+    return {
+        "status": "ok",
+        "model": str(MODEL_PATH.name),
+        "backend": type(current.model).__name__,
+        "shared": bool(SHARED_MODEL_PATH),
+        "pid": os.getpid(),
+        "state": REGISTRY.state,
+        "version": current.version,
+    }
+
+
+class ReloadRequest(BaseModel):
+    model_path: Optional[str] = None
+    scaler_path: Optional[str] = None
+    cascade_path: Optional[str] = None
+    drift_path: Optional[str] = None
+
+
+@app.get("/models")
+def models() -> Dict[str, Any]:
+    """Active version, load in progress (if any) and the versions kept for rollback."""
+    return REGISTRY.status()
+
+
+@app.post("/models/reload", status_code=202)
+def reload_model(request: Optional[ReloadRequest] = None, x_admin_token: Optional[str] = Header(None)) -> Dict[str, Any]:
+    """Load and warm a new version in the background, then swap it in."""
+    if not MODEL_ADMIN_TOKEN or x_admin_token != MODEL_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Reload is disabled or the admin token is wrong")
+    source = (request or ReloadRequest()).dict()
+    if not REGISTRY.load_async({key: value for key, value in source.items() if value}):
+        raise HTTPException(status_code=409, detail="A model load is already running")
+    return {"status": "loading", "model": REGISTRY.status()}
+
+
+_served = False
 
 
 @app.post("/predict")
-def predict(payload: PredictionRequest) -> Dict[str, Any]:
-    try:
-        features = _prepare_features(payload)
-        scaled = scaler.transform(features)
-        preds = rf_model.predict(scaled)
-        proba = rf_model.predict_proba(scaled)[0, 1]
-    except Exception as exc:  # pragma: no cover - defensive
-        raise HTTPException(status_code=500, detail=str(exc)) from exc
+async def predict(payload: PredictionRequest, response: Response, lean: bool = False) -> Dict[str, Any]:
+    """``lean=true`` answers with prediction and probability only (no feature echo)."""
+    global _served
+    timer = StageTimer()
+    start = "warm" if _served else "cold"
+    _served = True
+    key = _raw_row(payload)
+    # Cache hits included; the sketch is updated in batches off this path
+    DRIFT.observe(key)
+    with timer.span("cache"):
+        cached = RESULT_CACHE.get(key)
+    if cached is not None:
+        pred, proba, scaled = cached
+        version = RESULT_CACHE.version
+    else:
+        try:
+            with timer.span("features"):
+                features = _prepare_features(key)
+            with timer.span("batch"):
+                pred, proba, scaled, stage_times, version = await batcher.submit(features[0])
+        except Exception as exc:  # pragma: no cover - defensive
+            METRICS.inc("requests", endpoint="predict", start=start, status="error")
+            raise HTTPException(status_code=500, detail=str(exc)) from exc
+        if timer.enabled:
+            # Split the time spent in the batcher into queueing vs. the batch's own work
+            _, batch_seconds = timer.spans.pop()
+            timer.add("queue", max(batch_seconds - float(np.sum(stage_times)), 0.0))
+            timer.add("scale", float(stage_times[0]))
+            timer.add("predict", float(stage_times[1]))
+        pred, proba, scaled = int(pred), float(proba), tuple(float(v) for v in scaled)
+        RESULT_CACHE.put(key, (pred, proba, scaled), version)
+
+    PREDLOG.log([key], [pred], [proba], version, timer, "fastapi", [cached is not None])
+    if timer.enabled:
+        response.headers["Server-Timing"] = timer.server_timing()
+        METRICS.observe_timer(timer, endpoint="predict", start=start)
+    if RESULT_CACHE.enabled:
+        METRICS.inc("result_cache", endpoint="predict", outcome="miss" if cached is None else "hit")
+    METRICS.inc("requests", endpoint="predict", start=start, status="ok")
 
+    if lean:
+        return {"prediction": pred, "probability": proba}
     return {
-        "prediction": int(preds[0]),
-        "probability": float(proba),
+        "prediction": pred,
+        "probability": proba,
         "features": {
             "ordered": FEATURE_ORDER,
-            "scaled": dict(zip(FEATURE_ORDER, np.round(scaled[0], 6))),
+            "scaled": dict(zip(FEATURE_ORDER, np.round(scaled, 6))),
         },
     }
 
 
+def _explain_rows(current: ModelVersion, raw: np.ndarray) -> List[Dict[str, Any]]:
+    features = build_features(raw, current.feature_order)
+    contributions, proba = current.explain(features)
+    explained = current.path_explainer().describe(contributions, features)
+    return [{"probability": float(p), **explanation} for p, explanation in zip(proba, explained)]
+
+
+@app.post("/explain")
+async def explain(payload: Union[PredictionRequest, List[PredictionRequest]], response: Response) -> Dict[str, Any]:
+    """Per-feature path contributions (``cardio.explain``) for one patient or a list.
+
+    ``base_value + sum(contributions)`` is the forest's probability; with
+    CASCADE_PATH the linear tier may have answered /predict instead.
+    """
+    current = REGISTRY.current()
+    if not current.explainable:
+        raise HTTPException(status_code=501, detail="The active model cannot be explained")
+    payloads = payload if isinstance(payload, list) else [payload]
+    timer = StageTimer()
+    raw = np.array([_raw_row(item) for item in payloads], dtype=np.float64).reshape(-1, len(RAW_FIELDS))
+    with timer.span("explain"):
+        results = await asyncio.get_running_loop().run_in_executor(None, _explain_rows, current, raw) if len(raw) else []
+    METRICS.inc("requests", endpoint="explain", status="ok")
+    if timer.enabled:
+        response.headers["Server-Timing"] = timer.server_timing()
+        METRICS.observe_timer(timer, endpoint="explain")
+    if isinstance(payload, list):
+        return {"count": len(results), "results": results}
+    return results[0]
+
+
+def _score_packed(raw: np.ndarray, valid: np.ndarray) -> Tuple[np.ndarray, np.ndarray, str]:
+    current = REGISTRY.current()
+    DRIFT.observe(raw[valid])
+    features = build_features(raw[valid], current.feature_order)
+    if not len(features):
+        return np.zeros(0, dtype=np.int8), np.zeros(0), current.version
+    return (*current.score(features), current.version)
+
+
+@app.post("/predict/batch")
+async def predict_batch(request: Request) -> Response:
+    """Packed records (``cardio.wire``) in, packed scores out.
+
+    The batch is already vectorised, so it skips the micro-batcher and the
+    result cache. ``Accept: application/json`` returns the same arrays as
+    JSON lists (invalid records are ``null``).
+    """
+    if wire.media_type(request.headers.get("content-type", "")) != wire.REQUEST_TYPE:
+        raise HTTPException(status_code=415, detail=f"Send {wire.REQUEST_TYPE} records; JSON goes to /predict")
+    timer = StageTimer()
+    body = await request.body()
+    try:
+        with timer.span("parse"):
+            raw, valid = wire.decode_records(body)
+    except ValueError as exc:
+        METRICS.inc("requests", endpoint="predict_batch", status="error")
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    with timer.span("predict"):
+        labels, proba, version = await asyncio.get_running_loop().run_in_executor(None, _score_packed, raw, valid)
+    PREDLOG.log(raw[valid], labels, proba, version, timer, "fastapi_batch")
+
+    errors = int(len(valid) - valid.sum())
+    METRICS.inc("rows", len(valid), endpoint="predict_batch")
+    METRICS.inc("row_errors", errors, endpoint="predict_batch")
+    METRICS.inc("requests", endpoint="predict_batch", status="ok")
+    headers = {}
+    if timer.enabled:
+        headers["Server-Timing"] = timer.server_timing()
+        METRICS.observe_timer(timer, endpoint="predict_batch")
+    accept = request.headers.get("accept", "")
+    if wire.accepts(accept, "application/json") and not wire.accepts(accept, wire.RESPONSE_TYPE):
+        predictions: List[Optional[int]] = [None] * len(valid)
+        probabilities: List[Optional[float]] = [None] * len(valid)
+        for i, label, p in zip(valid.nonzero()[0].tolist(), labels, proba):
+            predictions[i], probabilities[i] = int(label), float(p)
+        body = json.dumps({
+            "count": len(valid), "errors": errors, "predictions": predictions, "probabilities": probabilities,
+        }).encode("utf-8")
+        return Response(body, media_type="application/json", headers=headers)
+    return Response(wire.encode_scores(labels, proba, valid), media_type=wire.RESPONSE_TYPE, headers=headers)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    """Stage latency histograms and request counters (Prometheus text format)."""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stats/batching")
+def batching_stats() -> Dict[str, Any]:
+    """Batch-size histogram and queueing delay of the micro-batcher."""
+    return batcher.stats()
+
+
+@app.get("/stats/cache")
+def cache_stats() -> Dict[str, Any]:
+    """Hit rate, evictions and approximate memory of the result cache."""
+    return RESULT_CACHE.stats()
+
+
+@app.get("/stats/drift")
+def drift_stats(sketch: bool = False) -> Dict[str, Any]:
+    """PSI / KS of the live inputs against the training reference, per feature.
+
+    ``sketch=true`` adds this worker's raw sketch, which ``python -m
+    cardio.drift compare`` merges across workers.
+    """
+    return DRIFT.report(include_sketch=sketch)
+
+
+@app.get("/stats/log")
+def log_stats() -> Dict[str, Any]:
+    """Records written / dropped by the prediction log and its current file."""
+    return PREDLOG.stats()
+
+
+@app.get("/stats/cascade")
+def cascade_stats() -> Dict[str, Any]:
+    """Rows answered by the linear tier vs. the forest (CASCADE_PATH only)."""
+    current = REGISTRY.current()
+    if not isinstance(current.model, Cascade):
+        return {"enabled": False}
+    return {"enabled": True, **current.model.stats()}
+
+
 @app.get("/")
 def root() -> Dict[str, str]:
     return {
@@ -134,3 +418,4 @@ def root() -> Dict[str, str]:
         "docs": "/docs",
         "health": "/health",
     }
+
@@ -0,0 +1,67 @@
+"""Run inference_api with several uvicorn workers sharing one forest in memory.
+
+The forest is exported once to an uncompressed ``.npz`` (in a short-lived
+child process, so the launcher never holds the unpickled model) and every
+worker maps it read-only through ``SHARED_MODEL_PATH``. The pages live in
+the OS page cache once, however many workers attach.
+
+    python serve_shared.py --workers 4 --port 8000
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def export_shared_model(model_path: Path, directory: Path) -> Path:
+    """Return a mappable .npz for ``model_path``, exporting joblib artifacts."""
+    if model_path.suffix == ".npz":
+        return model_path.resolve()
+    directory.mkdir(parents=True, exist_ok=True)
+    target = directory / f"rf_cardio_model-{os.getpid()}.npz"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])))
+    subprocess.run(
+        [sys.executable, "-m", "cardio.forest", str(model_path), str(target)],
+        check=True,
+        env=env,
+    )
+    return target
+
+
+def main(argv: Any = None) -> None:
+    import uvicorn
+
+    default_dir = "/dev/shm" if Path("/dev/shm").is_dir() else tempfile.gettempdir()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--model", default=os.environ.get("MODEL_PATH", "rf_cardio_model.joblib"))
+    parser.add_argument("--shared-dir", default=default_dir, help="Where the exported forest is written")
+    args = parser.parse_args(argv)
+
+    model_path = Path(args.model)
+    shared_path = export_shared_model(model_path, Path(args.shared_dir))
+    os.environ["SHARED_MODEL_PATH"] = str(shared_path)
+    # One numpy thread per worker; parallelism comes from the processes
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, "1")
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+    print(f"Shared forest at {shared_path}; starting {args.workers} worker(s)")
+    try:
+        uvicorn.run("inference_api:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        if shared_path != model_path.resolve():
+            shared_path.unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,155 +1,522 @@
 from http.server import BaseHTTPRequestHandler
 import json
+import math
 import os
 import sys
+import time
 import traceback
-import tempfile
-
-# --- GLOBAL VARIABLES ---
-model = None
-scaler = None
-_model_loaded = False
-
-# --- LAZY LOADER ---
-def load_resources():
-    global model, scaler, _model_loaded
-    if _model_loaded: return
-
-    try:
-        import joblib
-        from urllib.request import urlopen, Request
-    except ImportError as e:
-        raise RuntimeError(f"Library Import Failed: {str(e)}")
-
-    try:
-        model_url = os.environ.get('MODEL_URL')
-        scaler_url = os.environ.get('SCALER_URL')
-
-        if not model_url or not scaler_url:
-            raise ValueError("Environment variables MODEL_URL or SCALER_URL not set")
-
-        def download_file(url):
-            req = Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-            with urlopen(req, timeout=30) as response:
-                return response.read()
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.joblib') as tmp_model:
-            tmp_model.write(download_file(model_url))
-            tmp_model_path = tmp_model.name
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.joblib') as tmp_scaler:
-            tmp_scaler.write(download_file(scaler_url))
-            tmp_scaler_path = tmp_scaler.name
-
-        model = joblib.load(tmp_model_path)
-        scaler = joblib.load(tmp_scaler_path)
-        
-        os.unlink(tmp_model_path)
-        os.unlink(tmp_scaler_path)
-        
-        _model_loaded = True
-        print("Status: Model loaded successfully")
-
-    except Exception as e:
-        traceback.print_exc()
-        raise RuntimeError(f"Model Load Failed: {str(e)}")
+
+# Package `cardio/` (shared helpers) ada di root project
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Timing per stage (Server-Timing + metrics); matikan dengan CARDIO_TIMING=0
+from cardio.timing import METRICS, StageTimer  # noqa: E402
+# Cache hasil per input (RESULT_CACHE_SIZE, RESULT_CACHE_TTL; 0 = mati)
+from cardio.result_cache import ResultCache, canonical_key, model_version  # noqa: E402
+
+# Registry versi model (load di background, warm-up, swap atomik)
+from cardio.registry import ModelRegistry, ModelVersion  # noqa: E402
+# Format biner untuk client batch (Content-Type: application/x-cardio-records)
+from cardio import wire  # noqa: E402
+# Monitor drift input live vs data training (DRIFT_REFERENCE_URL, GET ?drift)
+from cardio.drift import DriftMonitor  # noqa: E402
+# Log biner tiap prediksi (PREDICTION_LOG_DIR; replay: python -m cardio.predlog)
+from cardio.predlog import PredictionLog  # noqa: E402
+
+# "sklearn" (default) atau "compiled" (cardio.forest.CompiledForest)
+MODEL_BACKEND = os.environ.get('MODEL_BACKEND', 'sklearn')
+# Array model dibaca memory-mapped dari file cache; kosongkan untuk load biasa
+MODEL_MMAP_MODE = os.environ.get('MODEL_MMAP_MODE', 'r') or None
+# Token untuk POST ?reload (hot-swap model); kosong = reload dimatikan
+MODEL_ADMIN_TOKEN = os.environ.get('MODEL_ADMIN_TOKEN')
+# Jumlah versi lama yang tetap di memori untuk rollback; tiap versi memegang
+# forest-nya sendiri, jadi default 0 (setelah swap hanya versi aktif yang tersisa)
+MODEL_HISTORY = int(os.environ.get('MODEL_HISTORY', 0))
+# API_DEBUG=1: response 500 ikut membawa traceback (default hanya di log server)
+API_DEBUG = os.environ.get('API_DEBUG', '0') == '1'
+
+RESULT_CACHE = ResultCache.from_env()  # di-bind ke versi model yang aktif
+DRIFT = DriftMonitor()  # reference ikut versi model yang aktif
+PREDLOG = PredictionLog.from_env()  # mati kalau PREDICTION_LOG_DIR kosong
+
+
+def _env_source():
+    return {
+        'model_url': os.environ.get('MODEL_URL'),
+        'scaler_url': os.environ.get('SCALER_URL'),
+        # CASCADE_URL (lr_cascade.npz dari cardio.cascade): logistic regression
+        # menjawab request di luar band-nya, sisanya baru ke forest
+        'cascade_url': os.environ.get('CASCADE_URL'),
+        # drift_reference.json dari stage `drift` cardio.pipeline (opsional)
+        'drift_url': os.environ.get('DRIFT_REFERENCE_URL'),
+    }
+
+
+# --- MODEL LOADER ---
+def _load_version(source):
+    """Download (lewat cache) dan load satu set artifact menjadi ModelVersion.
+
+    ``source`` kosong = URL dari environment (MODEL_URL, SCALER_URL, CASCADE_URL,
+    DRIFT_REFERENCE_URL).
+    """
+    from urllib.parse import urlparse
+    from cardio.artifact_cache import ArtifactCache
+    from cardio.features import FEATURE_ORDER
+    from cardio.portable import is_bundle
+
+    timer = StageTimer()
+    source = {**_env_source(), **{k: v for k, v in source.items() if v}}
+    model_url = source.get('model_url')
+    scaler_url = source.get('scaler_url')
+    cascade_url = source.get('cascade_url')
+    drift_url = source.get('drift_url')
+    # Bundle .cardio (cardio.portable) sudah berisi scaler + urutan fitur,
+    # di-load dengan numpy saja: SCALER_URL tidak perlu, sklearn tidak di-import
+    portable = bool(model_url) and is_bundle(urlparse(model_url).path)
+
+    if not model_url or not (scaler_url or portable):
+        raise ValueError("Environment variables MODEL_URL or SCALER_URL not set")
+
+    # Cache di disk (ARTIFACT_CACHE_DIR, default /tmp): download ulang
+    # hanya kalau ETag / isi file di server berubah. Model & scaler
+    # di-download paralel, streaming per chunk langsung ke disk.
+    cache = ArtifactCache.from_env()
+    with timer.span('download'):
+        urls = [model_url] if portable else [model_url, scaler_url]
+        optional = {name: url for name, url in (('cascade', cascade_url), ('drift', drift_url)) if url}
+        fetched = cache.fetch_many(urls + list(optional.values()))
+        extra = dict(zip(optional, fetched[len(urls):]))
+
+    if portable:
+        from cardio.portable import load as load_bundle
+
+        model_artifact = fetched[0]
+        start = time.perf_counter()
+        with timer.span('model_load'):
+            bundle = load_bundle(model_artifact.path)
+        if bundle.feature_order != FEATURE_ORDER:
+            raise ValueError("Feature order in the model bundle does not match features.json")
+        model, scaler = bundle.model, bundle.scaler
+        loaded = [('model', model_artifact, time.perf_counter() - start)]
+    else:
+        try:
+            import joblib
+        except ImportError as e:
+            # deployment yang memakai requirements-serverless.txt (numpy saja) hanya bisa load .cardio
+            raise RuntimeError("MODEL_URL .joblib / .npz needs scikit-learn and joblib "
+                               "(pip install -r requirements.txt); requirements-serverless.txt "
+                               "only serves a .cardio bundle") from e
+        from cardio.forest import load_model
+
+        model_artifact, scaler_artifact = fetched[:2]
+        # Artifact .npz = forest yang sudah di-export oleh cardio.forest
+        start = time.perf_counter()
+        with timer.span('model_load'):
+            model = load_model(model_artifact.path, MODEL_BACKEND, mmap_mode=MODEL_MMAP_MODE)
+        model_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with timer.span('scaler_load'):
+            scaler = joblib.load(scaler_artifact.path)
+        scaler_seconds = time.perf_counter() - start
+        loaded = [('model', model_artifact, model_seconds), ('scaler', scaler_artifact, scaler_seconds)]
+
+    if cascade_url:
+        from cardio.cascade import Cascade
+
+        cascade_artifact = extra['cascade']
+        start = time.perf_counter()
+        with timer.span('cascade_load'):
+            model = Cascade.load(cascade_artifact.path, model)
+        loaded.append(('cascade', cascade_artifact, time.perf_counter() - start))
+
+    drift_reference = None
+    if drift_url:
+        from cardio.drift import DriftSketch
+
+        start = time.perf_counter()
+        drift_reference = DriftSketch.load(extra['drift'].path)
+        loaded.append(('drift_reference', extra['drift'], time.perf_counter() - start))
+
+    artifacts = {
+        name: {
+            "cache": artifact.status,
+            "bytes": artifact.size,
+            "sha256": artifact.sha256,
+            "fetch_seconds": round(artifact.seconds, 4),
+            "load_seconds": round(seconds, 4),
+        }
+        for name, artifact, seconds in loaded
+    }
+    METRICS.observe_timer(timer, endpoint='startup')
+    print(f"Status: Model loaded successfully (backend: {type(model).__name__}, "
+          f"cache: {'/'.join(artifact.status for _, artifact, _ in loaded)})")
+    # Versi = checksum semua artifact; hasil model lama tidak pernah dipakai lagi
+    # (reference drift tidak ikut: tidak mengubah hasil prediksi)
+    return ModelVersion(
+        version=model_version(*(artifact.sha256 for name, artifact, _ in loaded if name != 'drift_reference')),
+        model=model,
+        scaler=scaler,
+        source=source,
+        artifacts=artifacts,
+        drift_reference=drift_reference,
+    )
+
+
+# Explainer dibangun saat load (sebelum versi aktif) untuk backend compiled/.cardio;
+# backend sklearn menyalin forest, jadi hanya dengan EXPLAIN_PRELOAD=1
+REGISTRY = ModelRegistry(_load_version, history=MODEL_HISTORY, explain_preload=os.environ.get('EXPLAIN_PRELOAD', '0') == '1')
+REGISTRY.on_swap(lambda active: RESULT_CACHE.bind(active.version))
+REGISTRY.on_swap(lambda active: DRIFT.set_reference(active.drift_reference))
+# Load + warm-up mulai di background saat proses start, jadi request pertama
+# tidak menanggung seluruh load (MODEL_PRELOAD=0: baru saat GET/POST pertama)
+if os.environ.get('MODEL_PRELOAD', '1') != '0':
+    REGISTRY.ensure_loaded()
+
+
+def load_resources(timer=None):
+    """Versi model yang aktif; request yang datang saat load berjalan menunggu di sini."""
+    timer = timer or StageTimer(enabled=False)
+    with timer.span('load_wait'):
+        return REGISTRY.wait()
+
+# --- FEATURE CONSTRUCTION ---
+# Default tiap input mentah kalau tidak dikirim: (nama field, default, tipe).
+# Feature engineering (18 kolom sesuai features.json) ada di cardio.features.
+FIELD_DEFAULTS = {
+    'age': (0, int),
+    'gender': (1, int),
+    'height': (0, float),
+    'weight': (0, float),
+    'ap_hi': (0, int),
+    'ap_lo': (0, int),
+    'cholesterol': (1, int),
+    'gluc': (1, int),
+    'smoke': (0, int),
+    'alco': (0, int),
+    'active': (1, int),
+}
+
+
+def parse_records(body_str, content_type=''):
+    """Return (records, is_batch) from a JSON object, JSON array or NDJSON body."""
+    if 'ndjson' in content_type or 'jsonlines' in content_type:
+        lines = body_str.splitlines()
+        return [json.loads(line) for line in lines if line.strip()], True
+
+    body = json.loads(body_str)
+    if isinstance(body, list):
+        return body, True
+    return [body], False
+
+
+def validate_records(records):
+    """Cast every record to its raw row in RAW_FIELDS order.
+
+    Returns (rows, valid_index, errors): the rows of the valid records, their
+    positions in ``records`` and a list of (index, message) for the rest.
+    """
+    from cardio.features import RAW_FIELDS
+
+    fields = [(name,) + FIELD_DEFAULTS[name] for name in RAW_FIELDS]
+    height_index = RAW_FIELDS.index('height')
+
+    rows = []
+    valid_index = []
+    errors = []
+    for i, record in enumerate(records):
+        if not isinstance(record, dict):
+            errors.append((i, "Record must be a JSON object"))
+            continue
+        try:
+            row = [cast(record.get(name, default)) for name, default, cast in fields]
+        except (TypeError, ValueError, OverflowError) as e:
+            errors.append((i, str(e)))
+            continue
+        if not all(map(math.isfinite, row)):
+            errors.append((i, "All fields must be finite numbers"))
+            continue
+        if not row[height_index] > 0:
+            errors.append((i, "height must be greater than 0"))
+            continue
+        rows.append(row)
+        valid_index.append(i)
+    return rows, valid_index, errors
+
+
+def score_records(records, timer=None, current=None):
+    """(valid_index, results, errors) with one (label, probability) per valid record.
+
+    Records seen before with the same model come from RESULT_CACHE; only the
+    misses go through feature building and ``current`` (default: the active
+    ModelVersion).
+    """
+    import numpy as np
+    from cardio.features import RAW_FIELDS, build_features
+
+    timer = timer or StageTimer(enabled=False)
+    current = current or load_resources(timer)
+    with timer.span('validate'):
+        rows, valid_index, errors = validate_records(records)
+    if rows:
+        # Semua input valid (termasuk cache hit); sketch di-update per batch
+        DRIFT.observe(rows)
+
+    version = current.version
+    with timer.span('cache'):
+        keys = [canonical_key(row) for row in rows]
+        results = [RESULT_CACHE.get(key) for key in keys]
+    missing = [k for k, result in enumerate(results) if result is None]
+    if missing:
+        with timer.span('features'):
+            raw = np.array([rows[k] for k in missing], dtype=np.float64).reshape(-1, len(RAW_FIELDS))
+            X = build_features(raw)
+        labels, probas = predict_matrix(X, timer, current)
+        for k, label, proba in zip(missing, labels, probas):
+            results[k] = (int(label), float(proba))
+            RESULT_CACHE.put(keys[k], results[k], version)
+
+    if PREDLOG.enabled and rows:
+        cached = np.ones(len(rows), dtype=bool)
+        cached[missing] = False
+        labels, probas = zip(*results)
+        PREDLOG.log(rows, labels, probas, version, timer, 'json', cached)
+
+    if RESULT_CACHE.enabled:
+        METRICS.inc('result_cache', len(rows) - len(missing), endpoint='predict', outcome='hit')
+        METRICS.inc('result_cache', len(missing), endpoint='predict', outcome='miss')
+    return valid_index, results, errors
+
+
+def predict_matrix(X, timer=None, current=None):
+    """Scale the numeric block of X and score every row in one pass."""
+    timer = timer or StageTimer(enabled=False)
+    current = current or load_resources(timer)
+
+    # Scale cuma yang numerik, dummy tidak di-scale
+    return current.score(X, timer)
 
 # --- HANDLER ---
 class handler(BaseHTTPRequestHandler):
 
-    def _send_response(self, status, data):
+    def _send_response(self, status, data, timer=None):
+        body = json.dumps(data).encode('utf-8')
+        self._send_body(status, body, 'application/json', timer)
+
+    def _send_body(self, status, body, content_type, timer=None):
         self.send_response(status)
-        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        if timer is not None and timer.enabled:
+            self.send_header('Server-Timing', timer.server_timing())
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode('utf-8'))
+        self.wfile.write(body)
 
     def do_OPTIONS(self):
         self._send_response(200, {})
 
     def do_GET(self):
+        # GET /api/predict?metrics -> Prometheus text format
+        if self.path.rstrip('/').endswith('/metrics') or 'metrics' in self.path.partition('?')[2]:
+            self._send_body(200, METRICS.render().encode('utf-8'), 'text/plain; version=0.0.4')
+            return
+
+        # GET /api/predict?drift -> PSI / KS input live vs reference training
+        # (?drift=sketch ikut mengirim sketch mentah untuk `cardio.drift compare`)
+        query = self.path.partition('?')[2]
+        if 'drift' in query:
+            self._send_response(200, DRIFT.report(include_sketch='drift=sketch' in query))
+            return
+
+        # Health check ikut memicu load + warm-up di background (tanpa menunggu)
+        REGISTRY.ensure_loaded()
+        current = REGISTRY.current()
         self._send_response(200, {
             "status": "Alive",
             "message": "API Ready. Send POST request to predict.",
-            "model_loaded": _model_loaded
+            "model_loaded": current is not None,
+            "model": REGISTRY.status(),
+            "artifacts": current.artifacts if current else {},
+            "cascade": current.model.stats() if current and hasattr(current.model, 'stats') else None,
+            "result_cache": RESULT_CACHE.stats(),
+            "prediction_log": PREDLOG.stats()
         })
 
+    def _reload(self):
+        """POST ?reload: load versi baru di background lalu swap (butuh X-Admin-Token)."""
+        body_str = self._read_body()
+        if not MODEL_ADMIN_TOKEN or self.headers.get('X-Admin-Token') != MODEL_ADMIN_TOKEN:
+            self._send_response(403, {"status": "error", "message": "Reload is disabled or the admin token is wrong"})
+            return
+        try:
+            body = json.loads(body_str or b'{}')
+        except ValueError:
+            body = None
+        if not isinstance(body, dict):
+            self._send_response(400, {"status": "error", "message": "Reload body must be a JSON object"})
+            return
+        # URL kosong = URL dari environment; file yang diganti di URL yang sama
+        # tetap ter-download ulang karena cache memvalidasi ETag
+        source = {key: body.get(key) for key in ('model_url', 'scaler_url', 'cascade_url', 'drift_url')}
+        started = REGISTRY.load_async(source)
+        self._send_response(202 if started else 409, {
+            "status": "loading" if started else "busy",
+            "model": REGISTRY.status()
+        })
+
+    def _read_body(self):
+        # Body selalu dibaca habis sebelum response apa pun: di koneksi
+        # keep-alive sisa body akan terbaca sebagai request berikutnya
+        content_length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(content_length)
+
+    def _score_packed(self, raw, valid, current, timer):
+        """Body biner (cardio.wire): tanpa JSON, tanpa cast per field, tanpa result cache."""
+        from cardio.features import build_features
+
+        with timer.span('features'):
+            X = build_features(raw[valid])
+        DRIFT.observe(raw[valid])
+        labels, probas = predict_matrix(X, timer, current) if len(X) else ([], [])
+        PREDLOG.log(raw[valid], labels, probas, current.version, timer, 'packed')
+
+        errors = int(len(valid) - valid.sum())
+        METRICS.inc('rows', len(valid), endpoint='predict')
+        METRICS.inc('row_errors', errors, endpoint='predict')
+        accept = self.headers.get('Accept', '')
+        if wire.accepts(accept, 'application/json') and not wire.accepts(accept, wire.RESPONSE_TYPE):
+            # JSON kolom (tanpa objek per baris); baris tidak valid = null
+            predictions, probabilities = [None] * len(valid), [None] * len(valid)
+            for i, label, proba in zip(valid.nonzero()[0].tolist(), labels, probas):
+                predictions[i], probabilities[i] = int(label), float(proba)
+            self._send_response(200, {
+                "status": "success",
+                "count": len(valid),
+                "errors": errors,
+                "predictions": predictions,
+                "probabilities": probabilities
+            }, timer)
+            return
+        self._send_body(200, wire.encode_scores(labels, probas, valid), wire.RESPONSE_TYPE, timer)
+
+    def _explain(self, body_str, current, timer):
+        """POST ?explain: kontribusi per fitur (cardio.explain), single atau batch JSON."""
+        import numpy as np
+        from cardio.features import RAW_FIELDS, build_features
+
+        with timer.span('parse'):
+            records, is_batch = parse_records(body_str, self.headers.get('Content-Type', ''))
+        with timer.span('validate'):
+            rows, valid_index, errors = validate_records(records)
+        if not is_batch and errors:
+            raise ValueError(errors[0][1])
+        with timer.span('features'):
+            X = build_features(np.array(rows, dtype=np.float64).reshape(-1, len(RAW_FIELDS)))
+        # Probabilitas di sini = forest (dengan cascade bisa beda dari jawaban tier linear)
+        contributions, probas = current.explain(X, timer) if len(X) else ([], [])
+        explained = current.path_explainer().describe(contributions, X) if len(X) else []
+        results = [None] * len(records)
+        for i, proba, explanation in zip(valid_index, probas, explained):
+            results[i] = {"index": i, "status": "success", "probability": float(proba), **explanation}
+        for i, message in errors:
+            results[i] = {"index": i, "status": "error", "message": message}
+
+        if not is_batch:
+            result = results[0]
+            del result["index"]
+            self._send_response(200, result, timer)
+            return
+        self._send_response(200, {
+            "status": "success",
+            "count": len(records),
+            "errors": len(errors),
+            "results": results
+        }, timer)
+
     def do_POST(self):
+        query = self.path.partition('?')[2]
+        if 'reload' in query:
+            self._reload()
+            return
+
+        endpoint = 'explain' if 'explain' in query else 'predict'
+        timer = StageTimer()
+        start = 'warm' if REGISTRY.current() is not None else 'cold'
+        status = 'ok'
         try:
-            load_resources()
-            import numpy as np
-
-            content_length = int(self.headers.get('Content-Length', 0))
-            body_str = self.rfile.read(content_length)
-            body = json.loads(body_str)
-
-            # --- 1. FEATURE CONSTRUCTION (18 Fitur) ---
-            age = int(body.get('age', 0))
-            gender = int(body.get('gender', 1))
-            height = float(body.get('height', 0))
-            weight = float(body.get('weight', 0))
-            ap_hi = int(body.get('ap_hi', 0))
-            ap_lo = int(body.get('ap_lo', 0))
-            cholesterol = int(body.get('cholesterol', 1))
-            gluc = int(body.get('gluc', 1))
-            smoke = int(body.get('smoke', 0))
-            alco = int(body.get('alco', 0))
-            active = int(body.get('active', 1))
-
-            bmi = weight / ((height / 100) ** 2)
-            bp_diff = ap_hi - ap_lo
-            gender_male = 1 if gender == 2 else 0
-            
-            # --- 2. SPLIT FEATURES ---
-            # Kelompok 1: Numeric Features (Wajib di-Scale) - 11 Fitur
-            features_numeric = [
-                height, weight, ap_hi, ap_lo, smoke, alco, active,
-                age, bmi, bp_diff, gender_male
-            ]
-
-            # Kelompok 2: Dummy Features (Tidak di-Scale) - 7 Fitur
-            features_dummy = [
-                1 if cholesterol == 2 else 0,
-                1 if cholesterol == 3 else 0,
-                1 if gluc == 2 else 0,
-                1 if gluc == 3 else 0,
-                1 if 30 <= age < 45 else 0,
-                1 if 45 <= age < 60 else 0,
-                1 if age >= 60 else 0
-            ]
-
-            # --- 3. SCALING & COMBINE ---
-            # Scale cuma yang numerik
-            numeric_array = np.array([features_numeric])
-            scaled_numeric = scaler.transform(numeric_array) # Output: (1, 11)
-            
-            # Gabungin balik sama dummy (tanpa scale)
-            dummy_array = np.array([features_dummy]) # Output: (1, 7)
-            
-            # Final input: (1, 18)
-            final_features = np.concatenate([scaled_numeric, dummy_array], axis=1)
-
-            # --- 4. PREDICT ---
-            prediction = model.predict(final_features)[0]
-            
-            proba = 0
-            if hasattr(model, "predict_proba"):
-                proba = model.predict_proba(final_features)[0][1]
+            with timer.span('read'):
+                body_str = self._read_body()
+
+            # Satu snapshot per request: swap di tengah jalan tidak mengganti model
+            current = load_resources(timer)
+
+            if endpoint == 'explain':
+                self._explain(body_str, current, timer)
+                return
+
+            if wire.media_type(self.headers.get('Content-Type', '')) == wire.REQUEST_TYPE:
+                try:
+                    with timer.span('parse'):
+                        raw, valid = wire.decode_records(body_str)
+                except ValueError as e:
+                    # Body biner rusak = 400, sama dengan /predict/batch di inference_api.py
+                    status = 'error'
+                    self._send_response(400, {"status": "error", "message": str(e)}, timer)
+                    return
+                self._score_packed(raw, valid, current, timer)
+                return
+
+            with timer.span('parse'):
+                records, is_batch = parse_records(body_str, self.headers.get('Content-Type', ''))
+
+            valid_index, scored, errors = score_records(records, timer, current)
+            METRICS.inc('rows', len(records), endpoint='predict')
+            METRICS.inc('row_errors', len(errors), endpoint='predict')
+
+            if not is_batch:
+                # Mode single: format response lama tetap dipertahankan
+                if errors:
+                    raise ValueError(errors[0][1])
+                label, proba = scored[0]
+                self._send_response(200, {
+                    "status": "success",
+                    "prediction": label,
+                    "probability": proba
+                }, timer)
+                return
+
+            # Mode batch: satu matrix (N, 18) untuk yang belum di-cache,
+            # error per baris tidak menggagalkan batch
+            results = [None] * len(records)
+            for i, (label, proba) in zip(valid_index, scored):
+                results[i] = {
+                    "index": i,
+                    "status": "success",
+                    "prediction": label,
+                    "probability": proba
+                }
+            for i, message in errors:
+                results[i] = {"index": i, "status": "error", "message": message}
 
             self._send_response(200, {
                 "status": "success",
-                "prediction": int(prediction),
-                "probability": float(proba)
-            })
+                "count": len(records),
+                "errors": len(errors),
+                "results": results
+            }, timer)
 
         except Exception as e:
+            status = 'error'
             error_msg = str(e)
             trace = traceback.format_exc()
             print("ERROR:", trace)
-            self._send_response(500, {
-                "status": "error",
-                "message": error_msg,
-                "trace": trace
-            })
\ No newline at end of file
+            response = {"status": "error", "message": error_msg}
+            if API_DEBUG:
+                response["trace"] = trace
+            self._send_response(500, response, timer)
+
+        finally:
+            METRICS.inc('requests', endpoint=endpoint, start=start, status=status)
+            METRICS.observe_timer(timer, endpoint=endpoint, start=start)
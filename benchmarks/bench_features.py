@@ -0,0 +1,90 @@
+"""Parity check and micro-benchmark: cardio.features vs the pandas encoding.
+
+The reference is the pandas code CELL 6/7 of cardio_pipeline.py and
+inference_api.py used before cardio.features existed. Every column must
+match exactly; timings are reported for one row and for a batch.
+
+    python benchmarks/bench_features.py --rows 10000
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from cardio.features import FEATURE_ORDER, RAW_FIELDS, build_features  # noqa: E402
+
+
+def random_raw(n: int, seed: int = 0) -> np.ndarray:
+    """Raw inputs covering every category and all age-bin edges."""
+    rng = np.random.default_rng(seed)
+    columns = {
+        "age": np.concatenate([[1, 29, 30, 31, 44, 45, 46, 59, 60, 61, 120], rng.integers(1, 121, n)]),
+        "gender": rng.integers(1, 3, n + 11),
+        "height": rng.integers(120, 231, n + 11),
+        "weight": rng.uniform(25, 250, n + 11).round(1),
+        "ap_hi": rng.integers(60, 251, n + 11),
+        "ap_lo": rng.integers(40, 181, n + 11),
+        "cholesterol": rng.integers(1, 4, n + 11),
+        "gluc": rng.integers(1, 4, n + 11),
+        "smoke": rng.integers(0, 2, n + 11),
+        "alco": rng.integers(0, 2, n + 11),
+        "active": rng.integers(0, 2, n + 11),
+    }
+    return np.column_stack([columns[field] for field in RAW_FIELDS]).astype(np.float64)
+
+
+def pandas_features(raw: np.ndarray) -> np.ndarray:
+    """The original per-request pandas path."""
+    df = pd.DataFrame(raw, columns=list(RAW_FIELDS))
+    df["age_years"] = df["age"].astype(int)
+    df["bmi"] = df["weight"] / ((df["height"] / 100) ** 2)
+    df["bp_diff"] = df["ap_hi"] - df["ap_lo"]
+    df["age_cat"] = pd.cut(
+        df["age_years"],
+        bins=[0, 30, 45, 60, 200],
+        labels=["<30", "30-45", "45-60", "60+"],
+    )
+    df["gender"] = df["gender"].astype(int)
+    df["gender_male"] = (df["gender"] == 2).astype(int)
+    for col in ("cholesterol", "gluc"):
+        df[col] = df[col].astype(int)
+    df = pd.get_dummies(df, columns=["cholesterol", "gluc", "age_cat"], drop_first=True)
+    df = df.drop(columns=["age", "gender"], errors="ignore")
+    for col in FEATURE_ORDER:
+        if col not in df.columns:
+            df[col] = 0
+    return df[FEATURE_ORDER].astype(float).to_numpy()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    raw = random_raw(args.rows)
+    expected = pandas_features(raw)
+    actual = build_features(raw)
+    mismatched = [name for j, name in enumerate(FEATURE_ORDER) if not np.array_equal(expected[:, j], actual[:, j])]
+    if mismatched:
+        raise SystemExit(f"Parity FAILED for columns: {mismatched}")
+    print(f"Parity OK on {len(raw)} rows x {len(FEATURE_ORDER)} columns")
+
+    one = raw[:1]
+    for label, rows, number in (("single row", one, args.repeat), (f"batch of {len(raw)}", raw, 5)):
+        t_pandas = min(timeit.repeat(lambda: pandas_features(rows), number=number, repeat=3)) / number
+        t_numpy = min(timeit.repeat(lambda: build_features(rows), number=number, repeat=3)) / number
+        print(
+            f"{label:>16}: pandas {t_pandas * 1e3:9.3f} ms | numpy {t_numpy * 1e3:9.3f} ms "
+            f"| speedup x{t_pandas / t_numpy:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
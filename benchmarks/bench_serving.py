@@ -0,0 +1,367 @@
+"""Serving benchmark: cold start, latency percentiles, throughput and peak RSS.
+
+Both entry points run in their own subprocess so start-up and memory are
+measured from scratch:
+
+* ``vercel``  - ``api/predict.py``'s ``handler`` behind ``http.server``, with
+  MODEL_URL / SCALER_URL served by ``cardio.standin`` and an empty artifact
+  cache (the first request pays download + load, like a Vercel cold start);
+* ``server``  - the same handler under ``cardio.httpserver`` (HTTP/1.1
+  keep-alive, bounded worker pool), same artifacts;
+* ``fastapi`` - ``inference_api:app`` under uvicorn.
+
+Requests are synthetic patients (``cardio.synthetic``) sent at fixed
+concurrency levels. Results are written as JSON; ``compare`` flags
+regressions between two runs::
+
+    python benchmarks/bench_serving.py run --artifacts model/ --concurrency 1 4 16
+    python benchmarks/bench_serving.py compare old.json new.json --threshold 0.10
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+from cardio.standin import ArtifactServer  # noqa: E402
+from cardio.synthetic import synthetic_patients  # noqa: E402
+
+TARGETS = ("vercel", "server", "fastapi")
+SCALER_FILE = "scaler_cardio.joblib"
+
+VERCEL_SERVER = """
+import sys
+sys.path.insert(0, sys.argv[2])
+from http.server import ThreadingHTTPServer
+from predict import handler
+handler.log_message = lambda *args: None
+ThreadingHTTPServer(("127.0.0.1", int(sys.argv[1])), handler).serve_forever()
+"""
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _peak_rss_mb(pid: int) -> Optional[float]:
+    """High-water mark of the resident set (Linux ``VmHWM``)."""
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _percentiles(latencies: Sequence[float]) -> Dict[str, float]:
+    if not latencies:
+        return {}
+    values = np.asarray(latencies) * 1e3
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(p50), 3),
+        "p95": round(float(p95), 3),
+        "p99": round(float(p99), 3),
+        "max": round(float(values.max()), 3),
+    }
+
+
+class _Target:
+    """One server subprocess plus how to talk to it."""
+
+    def __init__(self, name: str, artifacts: Path, model_file: str, backend: str, standin: ArtifactServer) -> None:
+        self.name = name
+        self.port = _free_port()
+        self.workdir = Path(tempfile.mkdtemp(prefix=f"bench-{name}-"))
+        self.log = (self.workdir / "server.log").open("wb")
+        env = dict(os.environ, MODEL_BACKEND=backend, PYTHONPATH=str(ROOT))
+        if name in ("vercel", "server"):
+            self.ready_path, self.predict_path = "/", "/"
+            env.update(
+                MODEL_URL=standin.url(model_file),
+                SCALER_URL=standin.url(SCALER_FILE),
+                ARTIFACT_CACHE_DIR=str(self.workdir / "cache"),
+            )
+            if name == "vercel":
+                cmd = [sys.executable, "-c", VERCEL_SERVER, str(self.port), str(ROOT / "api")]
+            else:
+                cmd = [sys.executable, "-m", "cardio.httpserver", "--port", str(self.port), "--quiet"]
+        elif name == "fastapi":
+            self.ready_path, self.predict_path = "/health", "/predict"
+            # inference_api reads its artifacts from the working directory
+            for source in (artifacts / model_file, artifacts / SCALER_FILE, ROOT / "cardio" / "features.json"):
+                shutil.copy(source, self.workdir / source.name)
+            env["MODEL_PATH"] = model_file
+            cmd = [
+                sys.executable, "-m", "uvicorn", "inference_api:app",
+                "--app-dir", str(ROOT / "additional-context"),
+                "--port", str(self.port), "--log-level", "warning",
+            ]
+        else:
+            raise ValueError(f"Unknown target: {name}")
+        self.started = time.perf_counter()
+        self.process = subprocess.Popen(cmd, cwd=self.workdir, env=env, stdout=self.log, stderr=subprocess.STDOUT)
+
+    def wait_ready(self, timeout: float) -> float:
+        deadline = self.started + timeout
+        while time.perf_counter() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.name} server exited; see {self.log.name}")
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=1)
+                conn.request("GET", self.ready_path)
+                if conn.getresponse().status == 200:
+                    conn.close()
+                    return time.perf_counter() - self.started
+                conn.close()
+            except OSError:
+                pass
+            time.sleep(0.02)
+        raise RuntimeError(f"{self.name} server not ready after {timeout}s; see {self.log.name}")
+
+    def close(self) -> None:
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def _post(conn: http.client.HTTPConnection, path: str, body: bytes) -> int:
+    conn.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    response.read()
+    if response.will_close:
+        conn.close()
+    return response.status
+
+
+def run_load(target: _Target, bodies: Sequence[bytes], concurrency: int, requests: int) -> Dict[str, Any]:
+    """Send ``requests`` POSTs from ``concurrency`` threads (keep-alive when the server allows)."""
+    latencies: List[float] = []
+    errors = 0
+    issued = 0
+    lock = threading.Lock()
+
+    def worker() -> None:
+        nonlocal errors, issued
+        conn = http.client.HTTPConnection("127.0.0.1", target.port, timeout=60)
+        local: List[float] = []
+        failed = 0
+        while True:
+            with lock:
+                if issued >= requests:
+                    break
+                index = issued
+                issued += 1
+            start = time.perf_counter()
+            try:
+                status = _post(conn, target.predict_path, bodies[index % len(bodies)])
+            except (OSError, http.client.HTTPException):
+                status = 0
+                conn.close()
+            local.append(time.perf_counter() - start)
+            failed += status != 200
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "throughput_rps": round(len(latencies) / seconds, 1) if seconds else 0.0,
+        "latency_ms": _percentiles(latencies),
+    }
+
+
+def bench_target(
+    name: str,
+    artifacts: Path,
+    model_file: str,
+    backend: str,
+    standin: ArtifactServer,
+    bodies: Sequence[bytes],
+    levels: Sequence[int],
+    requests: int,
+    warmup: int,
+    timeout: float,
+) -> Dict[str, Any]:
+    target = _Target(name, artifacts, model_file, backend, standin)
+    try:
+        ready = target.wait_ready(timeout)
+        conn = http.client.HTTPConnection("127.0.0.1", target.port, timeout=timeout)
+        status = _post(conn, target.predict_path, bodies[0])
+        first = time.perf_counter() - target.started
+        conn.close()
+        if status != 200:
+            raise RuntimeError(f"{name}: first request returned HTTP {status}; see {target.log.name}")
+
+        results = []
+        for concurrency in levels:
+            run_load(target, bodies, concurrency, warmup)
+            results.append(run_load(target, bodies, concurrency, requests))
+            print(f"{name:>8} c={concurrency:<3} {json.dumps(results[-1]['latency_ms'])} "
+                  f"{results[-1]['throughput_rps']} req/s", file=sys.stderr)
+        return {
+            "cold_start_s": {"ready": round(ready, 3), "first_response": round(first, 3)},
+            "peak_rss_mb": _peak_rss_mb(target.process.pid),
+            "levels": results,
+        }
+    finally:
+        target.close()
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    artifacts = Path(args.artifacts).resolve()
+    bodies = [json.dumps(patient).encode("utf-8") for patient in synthetic_patients(args.patients, args.seed)]
+    report: Dict[str, Any] = {
+        "meta": {
+            "commit": _git_commit(),
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "config": {
+                "model": args.model_file,
+                "backend": args.backend,
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+                "warmup": args.warmup,
+                "patients": args.patients,
+                "seed": args.seed,
+            },
+        },
+        "targets": {},
+    }
+    with ArtifactServer(str(artifacts)) as standin:
+        for name in args.targets:
+            report["targets"][name] = bench_target(
+                name, artifacts, args.model_file, args.backend, standin, bodies,
+                args.concurrency, args.requests, args.warmup, args.timeout,
+            )
+    return report
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """Regressions of ``current`` vs ``baseline`` beyond ``threshold`` (relative)."""
+    regressions = []
+
+    def check(label: str, old: Optional[float], new: Optional[float], higher_is_worse: bool = True) -> None:
+        if not old or new is None:
+            return
+        change = (new - old) / old
+        worse = change > threshold if higher_is_worse else change < -threshold
+        flag = "REGRESSION" if worse else "ok"
+        print(f"{label:<40} {old:>10.3f} -> {new:>10.3f} ({change:+.1%}) {flag}")
+        if worse:
+            regressions.append(label)
+
+    for name, new in current.get("targets", {}).items():
+        old = baseline.get("targets", {}).get(name)
+        if old is None:
+            continue
+        check(f"{name} cold start first_response s", old["cold_start_s"]["first_response"], new["cold_start_s"]["first_response"])
+        check(f"{name} peak RSS MB", old.get("peak_rss_mb"), new.get("peak_rss_mb"))
+        old_levels = {level["concurrency"]: level for level in old["levels"]}
+        for level in new["levels"]:
+            before = old_levels.get(level["concurrency"])
+            if before is None:
+                continue
+            c = level["concurrency"]
+            for key in ("p50", "p95", "p99"):
+                check(f"{name} c={c} {key} ms", before["latency_ms"].get(key), level["latency_ms"].get(key))
+            check(f"{name} c={c} throughput req/s", before["throughput_rps"], level["throughput_rps"], higher_is_worse=False)
+    return regressions
+
+
+def main(argv: Any = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Benchmark the serving entry points")
+    run_parser.add_argument("--artifacts", default=str(ROOT / "model"), help="Directory with the model and scaler_cardio.joblib")
+    run_parser.add_argument("--model-file", default="rf_cardio_model.joblib")
+    run_parser.add_argument("--backend", default="sklearn", choices=("sklearn", "compiled"))
+    run_parser.add_argument("--targets", nargs="+", default=list(TARGETS), choices=TARGETS)
+    run_parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    run_parser.add_argument("--requests", type=int, default=500, help="Measured requests per concurrency level")
+    run_parser.add_argument("--warmup", type=int, default=20)
+    run_parser.add_argument("--patients", type=int, default=1000)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--timeout", type=float, default=120.0)
+    run_parser.add_argument("--output", default=None, help="JSON file (default: bench-serving-<commit>.json)")
+    run_parser.add_argument("--baseline", default=None, help="Previous JSON to compare against")
+    run_parser.add_argument("--threshold", type=float, default=0.10)
+
+    compare_parser = commands.add_parser("compare", help="Flag regressions between two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        report = run(args)
+        output = args.output or f"bench-serving-{(report['meta']['commit'] or 'local')[:8]}.json"
+        with open(output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"Results written to {output}")
+        if not args.baseline:
+            return
+        with open(args.baseline, "r", encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        current = report
+    else:
+        with open(args.baseline, "r", encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        with open(args.current, "r", encoding="utf-8") as fh:
+            current = json.load(fh)
+
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        raise SystemExit(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+    print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
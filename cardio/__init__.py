@@ -0,0 +1 @@
+"""Shared helpers for training and serving the cardio disease model."""
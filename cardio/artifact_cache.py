@@ -0,0 +1,384 @@
+"""Persistent on-disk cache for downloaded model artifacts.
+
+Entries are keyed by URL and remember the server's ETag / Last-Modified, so a
+warm start only costs one conditional request (or none while the entry is
+younger than ``max_age``). Bodies are stored once per SHA-256 content hash
+and the least recently used ones are evicted when the cache grows past
+``max_bytes`` (by default a share of the disk the cache lives on, so a small
+``/tmp`` such as a serverless function's 512 MB never fills up), and also
+before a download whose size is announced starts streaming, to make room
+for it.
+
+Downloads stream in chunks straight to disk and, when the connection drops,
+resume with ``Range`` / ``If-Range`` requests instead of starting over.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from http.client import HTTPException, IncompleteRead
+from pathlib import Path
+from typing import Any, Collection, Dict, List, Optional, Sequence
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+
+DEFAULT_CACHE_DIR = Path(tempfile.gettempdir()) / "cardio-artifact-cache"
+# Upper bound of the default cap; the default is also at most DISK_FRACTION
+# of what the cache can use on its disk (free space + what it already holds)
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DISK_FRACTION = 0.8
+CHUNK_SIZE = 1024 * 1024
+USER_AGENT = "Mozilla/5.0"
+ORPHAN_GRACE = 60.0
+
+_url_locks: Dict[str, threading.Lock] = {}
+_url_locks_guard = threading.Lock()
+
+
+def _url_lock(url: str) -> threading.Lock:
+    with _url_locks_guard:
+        return _url_locks.setdefault(url, threading.Lock())
+
+
+def _expected_size(response: Any, offset: int) -> Optional[int]:
+    """Total artifact size announced by a 200 or 206 response, if any."""
+    if response.status == 206:
+        total = response.headers.get("Content-Range", "").rpartition("/")[2]
+        return int(total) if total.isdigit() else None
+    length = response.headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+
+def _resumes_at(response: Any, offset: int) -> bool:
+    """True when ``response`` is a 206 continuing exactly at ``offset``."""
+    if response.status != 206:
+        return False
+    content_range = response.headers.get("Content-Range", "")
+    try:
+        start = int(content_range.split()[1].split("-")[0])
+    except (IndexError, ValueError):
+        return False
+    return start == offset
+
+
+def default_max_bytes(root: str | Path) -> int:
+    """Default cap for a cache in ``root``: DISK_FRACTION of its usable disk, at most DEFAULT_MAX_BYTES."""
+    root = Path(root)
+    held = 0
+    for path in root.rglob("*"):
+        try:
+            held += path.stat().st_size if path.is_file() else 0
+        except FileNotFoundError:
+            continue
+    usable = shutil.disk_usage(root).free + held
+    return int(min(DEFAULT_MAX_BYTES, usable * DISK_FRACTION))
+
+
+@dataclass
+class CachedArtifact:
+    """Result of a cache lookup."""
+
+    url: str
+    path: Path
+    status: str  # "hit", "revalidated", "miss" or "stale"
+    sha256: str
+    size: int
+    seconds: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["path"] = str(self.path)
+        data["seconds"] = round(self.seconds, 4)
+        return data
+
+
+class ArtifactCache:
+    """Content-addressed artifact store with conditional revalidation."""
+
+    def __init__(
+        self,
+        root: str | Path = DEFAULT_CACHE_DIR,
+        max_bytes: Optional[int] = None,
+        max_age: float = 0.0,
+        timeout: float = 30.0,
+        retries: int = 3,
+        backoff: float = 0.5,
+    ) -> None:
+        self.root = Path(root)
+        self.max_age = float(max_age)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.index_dir = self.root / "index"
+        self.blob_dir = self.root / "blobs"
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes) if max_bytes is not None else default_max_bytes(self.root)
+
+    @classmethod
+    def from_env(cls) -> "ArtifactCache":
+        """Build a cache from ARTIFACT_CACHE_DIR / _MAX_MB / _MAX_AGE / ARTIFACT_DOWNLOAD_RETRIES."""
+        max_mb = os.environ.get("ARTIFACT_CACHE_MAX_MB")
+        return cls(
+            root=os.environ.get("ARTIFACT_CACHE_DIR", DEFAULT_CACHE_DIR),
+            max_bytes=int(float(max_mb) * 1024 * 1024) if max_mb else None,
+            max_age=float(os.environ.get("ARTIFACT_CACHE_MAX_AGE", 0)),
+            retries=int(os.environ.get("ARTIFACT_DOWNLOAD_RETRIES", 3)),
+        )
+
+    # --- index helpers ---
+    def _index_path(self, url: str) -> Path:
+        return self.index_dir / (hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def _blob_path(self, sha256: str, url: str) -> Path:
+        suffix = os.path.splitext(urlparse(url).path)[1]
+        return self.blob_dir / (sha256 + suffix)
+
+    def _read_entry(self, url: str) -> Optional[Dict[str, Any]]:
+        try:
+            with self._index_path(url).open("r", encoding="utf-8") as fh:
+                entry = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if entry.get("url") != url or not Path(entry.get("path", "")).exists():
+            return None
+        return entry
+
+    def _write_entry(self, entry: Dict[str, Any]) -> None:
+        path = self._index_path(entry["url"])
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with tmp.open("w", encoding="utf-8") as fh:
+            json.dump(entry, fh)
+        os.replace(tmp, path)
+
+    # --- public API ---
+    def fetch(self, url: str, evict: bool = True, keep: Optional[set] = None) -> CachedArtifact:
+        """Return a local path for ``url``, downloading only when it changed.
+
+        Concurrent calls for the same URL in one process are serialised, so
+        only the first one downloads and the rest find a warm entry.
+        ``evict=False`` leaves trimming the cache to the caller (see
+        ``fetch_many``); ``keep`` collects the paths no eviction may remove,
+        this artifact's included.
+        """
+        with _url_lock(url):
+            return self._fetch(url, evict, set() if keep is None else keep)
+
+    def _fetch(self, url: str, evict: bool, keep: set) -> CachedArtifact:
+        start = time.perf_counter()
+        entry = self._read_entry(url)
+        now = time.time()
+
+        if entry is not None and now - entry["fetched_at"] < self.max_age:
+            status = "hit"
+        else:
+            headers = {"User-Agent": USER_AGENT}
+            if entry is not None:
+                if entry.get("etag"):
+                    headers["If-None-Match"] = entry["etag"]
+                if entry.get("last_modified"):
+                    headers["If-Modified-Since"] = entry["last_modified"]
+            try:
+                entry, status = self._download(url, headers, entry, keep)
+            except (HTTPError, URLError, OSError):
+                if entry is None or not Path(entry["path"]).exists():
+                    raise
+                # Origin unreachable: keep serving the copy we have
+                status = "stale"
+
+        entry["accessed_at"] = now
+        keep.add(entry["path"])
+        self._write_entry(entry)
+        if evict:
+            self.evict(keep=keep)
+        return CachedArtifact(
+            url=url,
+            path=Path(entry["path"]),
+            status=status,
+            sha256=entry["sha256"],
+            size=entry["size"],
+            seconds=time.perf_counter() - start,
+        )
+
+    def fetch_many(self, urls: Sequence[str], max_workers: Optional[int] = None) -> List[CachedArtifact]:
+        """Fetch several artifacts in parallel, preserving order.
+
+        The cache is trimmed once after the batch, keeping every artifact of
+        the batch: evicting per fetch could delete what a sibling thread has
+        just downloaded.
+        """
+        keep: set = set()
+        with ThreadPoolExecutor(max_workers=max_workers or len(urls) or 1) as pool:
+            artifacts = list(pool.map(lambda url: self.fetch(url, evict=False, keep=keep), urls))
+        self.evict(keep=keep)
+        return artifacts
+
+    def _download(
+        self, url: str, headers: Dict[str, str], entry: Optional[Dict[str, Any]], keep: Collection[str] = ()
+    ) -> tuple[Dict[str, Any], str]:
+        """Stream ``url`` to a part file, resuming with Range requests on failure."""
+        digest = hashlib.sha256()
+        size = 0
+        etag = last_modified = validator = None
+        failures = 0
+        error: Optional[BaseException] = None
+        tmp = tempfile.NamedTemporaryFile(dir=self.blob_dir, suffix=".part", delete=False)
+        try:
+            with tmp:
+                while True:
+                    request_headers = dict(headers)
+                    if size:
+                        request_headers = {"User-Agent": USER_AGENT, "Range": f"bytes={size}-"}
+                        if validator:
+                            request_headers["If-Range"] = validator
+                    try:
+                        response = urlopen(Request(url, headers=request_headers), timeout=self.timeout)
+                    except HTTPError as exc:
+                        if exc.code == 304 and entry is not None and not size:
+                            os.unlink(tmp.name)
+                            entry["fetched_at"] = time.time()
+                            return entry, "revalidated"
+                        if exc.code < 500 and exc.code != 429:
+                            raise
+                        error = exc
+                    except (URLError, OSError) as exc:
+                        error = exc
+                    else:
+                        with response:
+                            if size and not _resumes_at(response, size):
+                                # Range ignored or the artifact changed: start over
+                                tmp.seek(0)
+                                tmp.truncate()
+                                digest = hashlib.sha256()
+                                size = 0
+                            if not size:
+                                etag = response.headers.get("ETag")
+                                last_modified = response.headers.get("Last-Modified")
+                                strong_etag = etag if etag and not etag.startswith("W/") else None
+                                validator = strong_etag or last_modified
+                            expected = _expected_size(response, size)
+                            if not size and expected:
+                                # Make room first: the cache plus this part file must fit the cap
+                                self.evict(keep=keep, reserve=expected)
+                            try:
+                                while True:
+                                    chunk = response.read(CHUNK_SIZE)
+                                    if not chunk:
+                                        break
+                                    digest.update(chunk)
+                                    tmp.write(chunk)
+                                    size += len(chunk)
+                                if expected is None or size >= expected:
+                                    break
+                                error = IncompleteRead(b"", expected - size)
+                            except (OSError, HTTPException) as exc:
+                                error = exc
+
+                    failures += 1
+                    if failures > self.retries:
+                        raise error
+                    time.sleep(self.backoff * 2 ** (failures - 1))
+        except BaseException:
+            if os.path.exists(tmp.name):
+                os.unlink(tmp.name)
+            raise
+
+        sha256 = digest.hexdigest()
+        blob = self._blob_path(sha256, url)
+        if blob.exists():
+            os.unlink(tmp.name)
+        else:
+            os.replace(tmp.name, blob)
+
+        new_entry = {
+            "url": url,
+            "path": str(blob),
+            "sha256": sha256,
+            "size": size,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.time(),
+        }
+        return new_entry, "miss"
+
+    def entries(self) -> list[Dict[str, Any]]:
+        found = []
+        for path in self.index_dir.glob("*.json"):
+            try:
+                with path.open("r", encoding="utf-8") as fh:
+                    found.append(json.load(fh))
+            except (OSError, ValueError):
+                continue
+        return found
+
+    def evict(self, keep: Collection[str] = (), reserve: int = 0) -> int:
+        """Drop least recently used entries (except the ``keep`` paths) until the cache fits ``max_bytes``.
+
+        ``reserve`` bytes (a download about to start) are counted as already held.
+        """
+        entries = self.entries()
+        referenced = {entry["path"] for entry in entries}
+        removed = 0
+
+        # Bodies no index entry points at any more (replaced or orphaned).
+        # Recent files may belong to a download another process is finishing.
+        for blob in self.blob_dir.iterdir():
+            try:
+                if str(blob) in referenced or time.time() - blob.stat().st_mtime < ORPHAN_GRACE:
+                    continue
+                blob.unlink()
+            except FileNotFoundError:
+                continue
+            removed += 1
+
+        blobs: Dict[str, Dict[str, Any]] = {}
+        for entry in entries:
+            known = blobs.get(entry["path"])
+            if known is None or entry.get("accessed_at", 0) > known.get("accessed_at", 0):
+                blobs[entry["path"]] = entry
+        total = sum(entry["size"] for entry in blobs.values())
+
+        for path, entry in sorted(blobs.items(), key=lambda item: item[1].get("accessed_at", 0)):
+            if total + reserve <= self.max_bytes:
+                break
+            if path in keep:
+                continue
+            for other in entries:
+                if other["path"] == path:
+                    self._index_path(other["url"]).unlink(missing_ok=True)
+            Path(path).unlink(missing_ok=True)
+            total -= entry["size"]
+            removed += 1
+        return removed
+
+    def clear(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+
+
+def main(argv: Any = None) -> None:
+    parser = argparse.ArgumentParser(description="Fetch artifacts through the local cache")
+    parser.add_argument("urls", nargs="+", help="Artifact URLs to fetch")
+    parser.add_argument("--cache-dir", default=os.environ.get("ARTIFACT_CACHE_DIR", DEFAULT_CACHE_DIR))
+    parser.add_argument("--max-mb", type=float, default=os.environ.get("ARTIFACT_CACHE_MAX_MB"),
+                        help="Cache cap (default: 80%% of the disk the cache can use, at most 1024)")
+    args = parser.parse_args(argv)
+
+    max_bytes = int(float(args.max_mb) * 1024 * 1024) if args.max_mb else None
+    cache = ArtifactCache(args.cache_dir, max_bytes=max_bytes)
+    for artifact in cache.fetch_many(args.urls):
+        print(json.dumps(artifact.to_dict()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Async micro-batching for the FastAPI inference service.
+
+Concurrent requests are queued for at most ``max_wait_us`` microseconds (or
+until ``max_batch_size`` rows are waiting) and scored with one vectorized
+call on a single worker thread, so sklearn's thread pools are not fought
+over by every request. Each caller gets back its own row of the result.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Upper bounds (microseconds) of the queueing-delay histogram buckets
+DELAY_BUCKETS_US = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+RECENT_SAMPLES = 10000
+
+
+class MicroBatcher:
+    """Collect rows submitted concurrently and score them in one call.
+
+    ``predict_fn`` takes a 2-D array of stacked rows and returns a sequence
+    of arrays indexed by row (e.g. ``(labels, probabilities)``).
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[np.ndarray], Sequence[np.ndarray]],
+        max_batch_size: int = 64,
+        max_wait_us: int = 1000,
+    ) -> None:
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0, int(max_wait_us)) / 1e6
+        self._pending: Deque[Tuple[np.ndarray, asyncio.Future, float]] = deque()
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="microbatch")
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self) -> None:
+        self._batch_sizes = [0] * (self.max_batch_size + 1)
+        self._delay_buckets = [0] * (len(DELAY_BUCKETS_US) + 1)
+        self._delay_sum = 0.0
+        self._rows = 0
+        self._recent_delays: Deque[float] = deque(maxlen=RECENT_SAMPLES)
+        self._recent_predict: Deque[float] = deque(maxlen=RECENT_SAMPLES)
+
+    async def submit(self, row: np.ndarray) -> Tuple[Any, ...]:
+        """Queue one feature row and wait for its slice of the batch result."""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        future = loop.create_future()
+        self._pending.append((row, future, time.perf_counter()))
+        self._wakeup.set()
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        wakeup = self._wakeup
+        while True:
+            if not self._pending:
+                wakeup.clear()
+                await wakeup.wait()
+
+            # Wait for the batch to fill, but never past the oldest row's deadline
+            deadline = self._pending[0][2] + self.max_wait
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            size = min(len(self._pending), self.max_batch_size)
+            batch = [self._pending.popleft() for _ in range(size)]
+            batch = [item for item in batch if not item[1].cancelled()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            try:
+                X = np.stack([item[0] for item in batch])
+                outputs = await loop.run_in_executor(self._executor, self.predict_fn, X)
+            except Exception as exc:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            finished = time.perf_counter()
+
+            for i, (_, future, _) in enumerate(batch):
+                if not future.done():
+                    future.set_result(tuple(output[i] for output in outputs))
+            self._record(batch, started, finished)
+
+    def _record(self, batch: List[Tuple[np.ndarray, asyncio.Future, float]], started: float, finished: float) -> None:
+        with self._stats_lock:
+            self._batch_sizes[len(batch)] += 1
+            self._rows += len(batch)
+            self._recent_predict.append(finished - started)
+            for _, _, enqueued in batch:
+                delay = started - enqueued
+                delay_us = delay * 1e6
+                bucket = next(
+                    (k for k, bound in enumerate(DELAY_BUCKETS_US) if delay_us <= bound),
+                    len(DELAY_BUCKETS_US),
+                )
+                self._delay_buckets[bucket] += 1
+                self._delay_sum += delay
+                self._recent_delays.append(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch-size histogram and queueing-delay distribution so far."""
+        with self._stats_lock:
+            batches = sum(self._batch_sizes)
+            delays = np.array(self._recent_delays) * 1e6
+            predict = np.array(self._recent_predict) * 1e6
+            bounds = [str(bound) for bound in DELAY_BUCKETS_US] + ["+Inf"]
+
+            def percentiles(values: np.ndarray) -> Dict[str, float]:
+                if not values.size:
+                    return {}
+                p50, p95, p99 = np.percentile(values, [50, 95, 99])
+                return {"p50": round(p50, 1), "p95": round(p95, 1), "p99": round(p99, 1)}
+
+            return {
+                "config": {
+                    "max_batch_size": self.max_batch_size,
+                    "max_wait_us": int(self.max_wait * 1e6),
+                },
+                "batches": batches,
+                "rows": self._rows,
+                "mean_batch_size": round(self._rows / batches, 3) if batches else 0.0,
+                "batch_size_histogram": {
+                    str(size): count for size, count in enumerate(self._batch_sizes) if count
+                },
+                "queue_delay_us": {
+                    "mean": round(self._delay_sum / self._rows * 1e6, 1) if self._rows else 0.0,
+                    **percentiles(delays),
+                    "histogram": dict(zip(bounds, self._delay_buckets)),
+                },
+                "predict_us": percentiles(predict),
+            }
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            self._reset_stats()
@@ -0,0 +1,264 @@
+"""Two-tier serving: the logistic regression first, the forest only when unsure.
+
+The CELL 13 ``LogisticRegression`` scores a row with one dot product. When
+its probability is outside the band ``[low, high]`` the row is answered by
+the linear tier; rows inside the band go to the RandomForest. The band is
+tuned on half of the held-out rows as the widest short-circuit (fewest
+forest calls) that keeps agreement with forest-only labels at or above a
+target; agreement, short-circuit rate and ROC-AUC are reported on the other
+half::
+
+    python -m cardio.cascade --csv cardio_train.csv --target 0.99 --out lr_cascade.npz
+
+``Cascade`` has the ``predict_with_proba`` / ``predict_proba`` interface of
+the forest, so the serving code wraps the model without other changes.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+from cardio.forest import predict_with_proba, validation_split
+
+DEFAULT_TARGET = 0.99
+# Share of the held-out rows the band is tuned on; the rest is for the report
+VALIDATION_FRACTION = 0.5
+# Candidate band edges; 0.5 on both sides means "always the linear tier"
+BAND_GRID = np.round(np.linspace(0.0, 1.0, 201), 3)
+LATENCY_ROWS = 300
+
+
+class LinearTier:
+    """Binary logistic regression as a coefficient vector (NumPy only)."""
+
+    def __init__(self, coef: Any, intercept: float, classes: Any) -> None:
+        self.coef = np.ascontiguousarray(coef, dtype=np.float64).ravel()
+        self.intercept = float(intercept)
+        self.classes_ = np.asarray(classes)
+        self.n_features_in_ = len(self.coef)
+
+    @classmethod
+    def from_sklearn(cls, model: Any) -> "LinearTier":
+        if len(model.classes_) != 2:
+            raise ValueError("The linear tier needs a binary LogisticRegression")
+        return cls(model.coef_[0], model.intercept_[0], model.classes_)
+
+    def positive_proba(self, X: Any) -> np.ndarray:
+        """P(classes_[1]) per row, like ``LogisticRegression.predict_proba(X)[:, 1]``."""
+        z = np.asarray(X, dtype=np.float64) @ self.coef + self.intercept
+        return 1.0 / (1.0 + np.exp(-z))
+
+
+class Cascade:
+    """Linear tier outside ``[low, high]``, ``forest`` inside."""
+
+    def __init__(self, linear: LinearTier, forest: Any, low: float, high: float) -> None:
+        if not 0.0 <= low <= 0.5 <= high <= 1.0:
+            raise ValueError(f"Band must satisfy 0 <= low <= 0.5 <= high <= 1, got [{low}, {high}]")
+        self.linear = linear
+        self.forest = forest
+        self.low = float(low)
+        self.high = float(high)
+        self.classes_ = np.asarray(forest.classes_)
+        self.n_features_in_ = linear.n_features_in_
+        self._lock = threading.Lock()
+        self._rows = 0
+        self._short_circuited = 0
+
+    def route(self, X: Any) -> Tuple[np.ndarray, np.ndarray]:
+        """(linear P(class 1), mask of rows the linear tier answers)."""
+        p = self.linear.positive_proba(X)
+        return p, (p < self.low) | (p > self.high)
+
+    def predict_with_proba(self, X: Any) -> Tuple[np.ndarray, np.ndarray]:
+        X = np.asarray(X, dtype=np.float64)
+        p, confident = self.route(X)
+        proba = np.column_stack([1.0 - p, p])
+        labels = self.classes_.take((p > 0.5).astype(np.intp))
+        unsure = np.flatnonzero(~confident)
+        if unsure.size:
+            forest_labels, forest_proba = predict_with_proba(self.forest, X[unsure])
+            labels[unsure] = forest_labels
+            proba[unsure] = forest_proba
+        with self._lock:
+            self._rows += len(p)
+            self._short_circuited += len(p) - unsure.size
+        return labels, proba
+
+    def predict_proba(self, X: Any) -> np.ndarray:
+        return self.predict_with_proba(X)[1]
+
+    def predict(self, X: Any) -> np.ndarray:
+        return self.predict_with_proba(X)[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows, short = self._rows, self._short_circuited
+        return {
+            "band": [self.low, self.high],
+            "rows": rows,
+            "short_circuited": short,
+            "short_circuit_fraction": round(short / rows, 4) if rows else 0.0,
+        }
+
+    def save(self, path: str | Path) -> None:
+        """Write the linear tier and band (the forest is its own artifact)."""
+        np.savez(
+            path,
+            coef=self.linear.coef,
+            intercept=np.float64(self.linear.intercept),
+            classes=self.linear.classes_,
+            band=np.array([self.low, self.high]),
+        )
+
+    @classmethod
+    def load(cls, path: str | Path, forest: Any) -> "Cascade":
+        with np.load(path, allow_pickle=False) as data:
+            linear = LinearTier(data["coef"], float(data["intercept"]), data["classes"])
+            low, high = (float(v) for v in data["band"])
+        if not np.array_equal(linear.classes_, np.asarray(forest.classes_)):
+            raise ValueError("Linear tier and forest were trained on different classes")
+        if linear.n_features_in_ != forest.n_features_in_:
+            raise ValueError(f"Linear tier expects {linear.n_features_in_} features, forest {forest.n_features_in_}")
+        return cls(linear, forest, low, high)
+
+
+@dataclass
+class Band:
+    low: float
+    high: float
+    agreement: float
+    short_circuit_fraction: float
+
+
+def tune_band(linear_proba: Any, forest_positive: Any, target: float = DEFAULT_TARGET) -> Band:
+    """Band that short-circuits the most rows with agreement >= ``target``.
+
+    ``forest_positive`` is the forest-only label as ``label == classes_[1]``.
+    Rows inside the band take the forest's label, so only rows outside can
+    disagree: forest positives below ``low`` and negatives above ``high``.
+    """
+    p = np.asarray(linear_proba, dtype=np.float64)
+    positive = np.asarray(forest_positive, dtype=bool)
+    n = len(p)
+    lows = BAND_GRID[BAND_GRID <= 0.5]
+    highs = BAND_GRID[BAND_GRID >= 0.5]
+    # Per edge: rows answered by the linear tier and how many of them disagree
+    below = np.array([np.count_nonzero(p < low) for low in lows])
+    below_wrong = np.array([np.count_nonzero((p < low) & positive) for low in lows])
+    above = np.array([np.count_nonzero(p > high) for high in highs])
+    above_wrong = np.array([np.count_nonzero((p > high) & ~positive) for high in highs])
+
+    allowed = np.floor((1.0 - target) * n + 1e-9)
+    ok = below_wrong[:, None] + above_wrong[None, :] <= allowed
+    covered = np.where(ok, below[:, None] + above[None, :], -1)
+    # Most rows short-circuited; ties go to the widest band (safest)
+    i, j = max(zip(*np.nonzero(covered == covered.max())), key=lambda ij: highs[ij[1]] - lows[ij[0]])
+    wrong = below_wrong[i] + above_wrong[j]
+    return Band(float(lows[i]), float(highs[j]), 1.0 - wrong / n if n else 1.0, covered[i, j] / n if n else 0.0)
+
+
+def _per_row_ms(model: Any, X: np.ndarray) -> float:
+    """Mean latency of scoring the rows of X one at a time."""
+    predict_with_proba(model, X[:1])  # warm-up
+    start = time.perf_counter()
+    for i in range(len(X)):
+        predict_with_proba(model, X[i:i + 1])
+    return (time.perf_counter() - start) / len(X) * 1000
+
+
+def evaluate(cascade: Cascade, X: Any, y: Any = None, latency_rows: int = LATENCY_ROWS) -> Dict[str, Any]:
+    """Agreement with forest-only labels, share of rows short-circuited and per-row latency.
+
+    With labels ``y`` the ROC-AUC of both paths is reported as well.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    forest_labels, forest_proba = predict_with_proba(cascade.forest, X)
+    _, confident = cascade.route(X)
+    labels, proba = cascade.predict_with_proba(X)
+    sample = X[np.linspace(0, len(X) - 1, min(latency_rows, len(X))).astype(int)]
+    forest_ms = _per_row_ms(cascade.forest, sample)
+    cascade_ms = _per_row_ms(cascade, sample)
+    report: Dict[str, Any] = {
+        "band": [cascade.low, cascade.high],
+        "rows": len(X),
+        "agreement": round(float(np.mean(labels == forest_labels)), 6),
+        "short_circuit_fraction": round(float(np.mean(confident)), 4),
+        "latency_ms_per_row": {"forest": round(forest_ms, 4), "cascade": round(cascade_ms, 4)},
+        "latency_saved_fraction": round(1.0 - cascade_ms / forest_ms, 4) if forest_ms else 0.0,
+    }
+    if y is not None:
+        from sklearn.metrics import roc_auc_score
+
+        positive = np.asarray(y) == cascade.classes_[1]
+        report["roc_auc"] = {
+            "forest": round(float(roc_auc_score(positive, forest_proba[:, 1])), 6),
+            "cascade": round(float(roc_auc_score(positive, proba[:, 1])), 6),
+        }
+    return report
+
+
+def build(
+    lr_model: Any,
+    forest: Any,
+    X: Any,
+    y: Any = None,
+    target: float = DEFAULT_TARGET,
+    validation_fraction: float = VALIDATION_FRACTION,
+    seed: int = 0,
+) -> Tuple[Cascade, Dict[str, Any]]:
+    """Tune the band on a ``validation_fraction`` of held-out ``X`` and report on the rest."""
+    linear = LinearTier.from_sklearn(lr_model)
+    X = np.asarray(X, dtype=np.float64)
+    forest_labels, _ = predict_with_proba(forest, X)
+    tune, held = validation_split(forest_labels if y is None else y, validation_fraction, seed)
+    positive = forest_labels[tune] == np.asarray(forest.classes_)[1]
+    band = tune_band(linear.positive_proba(X[tune]), positive, target)
+    cascade = Cascade(linear, forest, band.low, band.high)
+    report = {
+        "target": target,
+        "tune": {"rows": len(tune), "agreement": round(band.agreement, 6), "short_circuit_fraction": round(band.short_circuit_fraction, 4)},
+        **evaluate(cascade, X[held], None if y is None else np.asarray(y)[held]),
+    }
+    return cascade, report
+
+
+def main(argv: Any = None) -> None:
+    parser = argparse.ArgumentParser(description="Tune and export the logistic-regression tier of the cascade")
+    parser.add_argument("--csv", default="cardio_train.csv")
+    parser.add_argument("--cache-dir", default=os.environ.get("CARDIO_PIPELINE_CACHE", ".cardio-cache"))
+    parser.add_argument("--model", default=None, help="Forest artifact (.joblib / .npz; default: the DAG's rf stage)")
+    parser.add_argument("--target", type=float, default=DEFAULT_TARGET, help="Minimum agreement with forest-only labels")
+    parser.add_argument("--validation-fraction", type=float, default=VALIDATION_FRACTION,
+                        help="Share of the held-out rows the band is tuned on (the rest is reported on)")
+    parser.add_argument("--out", default="lr_cascade.npz")
+    args = parser.parse_args(argv)
+
+    from cardio.forest import load_model
+    from cardio.pipeline import build_pipeline
+
+    # The band is tuned on the held-out split, like the metrics of the lr / rf stages
+    pipe = build_pipeline(args.csv, args.cache_dir)
+    targets = ["split", "scale", "lr"] + ([] if args.model else ["rf"])
+    outputs, _ = pipe.run(targets, log=lambda line: print(line, file=sys.stderr))
+    forest = load_model(args.model, "compiled") if args.model else outputs["rf"]["model"]
+
+    cascade, report = build(
+        outputs["lr"]["model"], forest, outputs["scale"]["X_test"], outputs["split"]["y_test"], args.target,
+        args.validation_fraction,
+    )
+    cascade.save(args.out)
+    print(json.dumps({"out": args.out, **report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
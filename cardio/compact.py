@@ -0,0 +1,434 @@
+"""Compaction of the exported forest for serving.
+
+The forest is trained with ``max_depth=None``, so most of its nodes sit
+deep in trees whose lower levels barely move the ROC-AUC. Compaction:
+
+* scores every (tree count, depth cap) pair on one half of the held-out
+  rows from a single traversal (internal nodes keep their normalised class
+  distribution, so a depth-capped tree predicts the value of the node it
+  stops at) and picks the smallest forest whose AUC is within ``tolerance``
+  of the full one;
+* truncates to that prefix of trees and depth, then prunes subtrees whose
+  leaves all predict the same distribution (lossless at ``prune_tolerance=0``);
+* stores thresholds as float32, rounded down so that decisions on float32
+  inputs (what the trees compare anyway) are unchanged, features as int8
+  and, for binary models, only P(class 1) as float32 per node.
+
+The report lists artifact size, load time and single-row latency against
+ROC-AUC (``roc_auc_built``, measured on the other half of the held-out rows,
+which played no part in the choice) for the Pareto front of the grid, so a point can be chosen
+deliberately::
+
+    python -m cardio.compact --csv cardio_train.csv --tolerance 0.005
+    python -m cardio.compact --model rf_cardio_model.joblib --csv cardio_train.csv --out rf_small.npz
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import warnings
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from cardio.forest import CHUNK_ROWS, CompiledForest, load_model, validation_split
+
+DEFAULT_TOLERANCE = 0.005
+DEFAULT_TREE_COUNTS = (10, 20, 30, 50, 75, 100, 150, 200, 300, 500)
+DEFAULT_DEPTHS = (4, 6, 8, 10, 12, 14, 16, 20, 24, 32)
+# Share of the held-out rows the point is chosen on; the rest is for the report
+VALIDATION_FRACTION = 0.5
+LATENCY_REPEATS = 200
+
+
+@dataclass
+class Point:
+    """One (n_trees, max_depth) configuration; ``max_depth=None`` is uncapped."""
+
+    n_trees: int
+    max_depth: Optional[int]
+    n_nodes: int
+    roc_auc: float
+    measured: Dict[str, float] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "n_trees": self.n_trees,
+            "max_depth": self.max_depth,
+            "n_nodes": self.n_nodes,
+            "roc_auc": round(self.roc_auc, 6),
+            **self.measured,
+        }
+
+
+@dataclass
+class CompactResult:
+    forest: CompiledForest
+    chosen: Point
+    full: Point
+    tolerance: float
+    frontier: List[Point]
+    baseline: Dict[str, float] = field(default_factory=dict)
+    # Held-out rows the point was chosen on / the built forests were reported on
+    rows: Dict[str, int] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "tolerance": self.tolerance,
+            "rows": self.rows,
+            "full": self.full.to_dict(),
+            "chosen": self.chosen.to_dict(),
+            "baseline": self.baseline,
+            "frontier": [point.to_dict() for point in self.frontier],
+        }
+
+
+def node_depths(forest: CompiledForest) -> np.ndarray:
+    """Depth of every node (roots are 0)."""
+    depth = np.zeros(forest.n_nodes, dtype=np.int32)
+    frontier = np.asarray(forest.roots, dtype=np.intp)
+    level = 0
+    while frontier.size:
+        depth[frontier] = level
+        frontier = frontier[~forest._is_leaf[frontier]]
+        frontier = np.concatenate([forest.children_left[frontier], forest.children_right[frontier]]).astype(np.intp)
+        level += 1
+    return depth
+
+
+def node_trees(forest: CompiledForest) -> np.ndarray:
+    """Tree index of every node (trees are stored contiguously, in order)."""
+    return (np.searchsorted(forest.roots, np.arange(forest.n_nodes), side="right") - 1).astype(np.int32)
+
+
+def positive_values(forest: CompiledForest) -> np.ndarray:
+    """P(classes_[1]) at every node of a binary forest."""
+    if len(forest.classes_) != 2:
+        raise ValueError("Compaction by ROC-AUC needs a binary classifier")
+    column = 0 if forest.value.shape[1] == 1 else 1
+    return np.asarray(forest.value[:, column], dtype=np.float64)
+
+
+def _subset(forest: CompiledForest, keep: np.ndarray, leaf: np.ndarray) -> CompiledForest:
+    """Forest made of the ``keep`` nodes, with ``leaf`` nodes turned into leaves."""
+    index = np.cumsum(keep) - 1
+    old = np.flatnonzero(keep)
+    new = np.arange(old.size)
+    is_leaf = leaf[old] | forest._is_leaf[old]
+    left = np.where(is_leaf, new, index[forest.children_left[old]]).astype(np.int32)
+    right = np.where(is_leaf, new, index[forest.children_right[old]]).astype(np.int32)
+    roots = index[forest.roots[keep[forest.roots]]].astype(np.int32)
+    subset = CompiledForest(
+        feature=np.where(is_leaf, 0, forest.feature[old]).astype(forest.feature.dtype),
+        threshold=np.where(is_leaf, np.inf, forest.threshold[old]).astype(forest.threshold.dtype),
+        children_left=left,
+        children_right=right,
+        value=np.ascontiguousarray(forest.value[old]),
+        roots=roots,
+        max_depth=0,
+        classes=forest.classes_,
+        n_features=forest.n_features_in_,
+    )
+    subset.max_depth = int(node_depths(subset).max(initial=0))
+    return subset
+
+
+def truncate(forest: CompiledForest, n_trees: Optional[int] = None, max_depth: Optional[int] = None) -> CompiledForest:
+    """First ``n_trees`` trees, with nodes at ``max_depth`` turned into leaves."""
+    n_trees = forest.n_estimators if n_trees is None else min(int(n_trees), forest.n_estimators)
+    keep = node_trees(forest) < n_trees
+    leaf = np.zeros(forest.n_nodes, dtype=bool)
+    if max_depth is not None:
+        depth = node_depths(forest)
+        keep &= depth <= max_depth
+        leaf = depth == max_depth
+    return _subset(forest, keep, leaf)
+
+
+def prune(forest: CompiledForest, tolerance: float = 0.0) -> CompiledForest:
+    """Collapse subtrees whose leaves differ by at most ``tolerance`` in every class.
+
+    Done bottom-up on pairs of sibling leaves; the parent keeps its own
+    (sample-weighted) distribution, so ``tolerance=0`` changes no prediction.
+    """
+    left, right = forest.children_left, forest.children_right
+    value = np.asarray(forest.value)
+    leaf = forest._is_leaf.copy()
+    while True:
+        candidates = np.flatnonzero(~leaf & leaf[left] & leaf[right])
+        close = np.abs(value[left[candidates]] - value[right[candidates]]).max(axis=1) <= tolerance
+        collapse = candidates[close]
+        if not collapse.size:
+            break
+        leaf[collapse] = True
+    if np.array_equal(leaf, forest._is_leaf):
+        return forest
+    # Children of collapsed nodes are no longer reachable
+    keep = np.zeros(forest.n_nodes, dtype=bool)
+    frontier = np.asarray(forest.roots, dtype=np.intp)
+    while frontier.size:
+        keep[frontier] = True
+        frontier = frontier[~leaf[frontier]]
+        frontier = np.concatenate([left[frontier], right[frontier]])
+    return _subset(forest, keep, leaf)
+
+
+def float32_thresholds(threshold: np.ndarray) -> np.ndarray:
+    """Largest float32 <= each threshold, so ``x > t`` is unchanged for float32 ``x``."""
+    single = threshold.astype(np.float32)
+    above = single.astype(np.float64) > threshold
+    single[above] = np.nextafter(single[above], np.float32(-np.inf))
+    return single
+
+
+def compact_arrays(forest: CompiledForest, leaf_dtype: str = "float32") -> CompiledForest:
+    """Narrow the node arrays: float32 thresholds, int8 features, P(class 1) only."""
+    feature_dtype = np.int8 if forest.n_features_in_ <= np.iinfo(np.int8).max else np.int16
+    value = forest.value
+    if len(forest.classes_) == 2 and value.shape[1] == 2:
+        value = value[:, 1:]
+    return CompiledForest(
+        feature=forest.feature.astype(feature_dtype),
+        threshold=float32_thresholds(np.asarray(forest.threshold, dtype=np.float64)),
+        children_left=forest.children_left.astype(np.int32),
+        children_right=forest.children_right.astype(np.int32),
+        value=np.ascontiguousarray(value, dtype=leaf_dtype),
+        roots=forest.roots.astype(np.int32),
+        max_depth=forest.max_depth,
+        classes=forest.classes_,
+        n_features=forest.n_features_in_,
+    )
+
+
+def depth_curves(forest: CompiledForest, X: Any, depths: Sequence[Optional[int]]) -> Dict[Optional[int], np.ndarray]:
+    """P(class 1) of every (row, tree) when trees stop at each depth in ``depths``.
+
+    One walk for all depths: leaves point to themselves, so a pair that has
+    reached its leaf keeps reporting it at deeper levels.
+    """
+    X = forest._check_input(X)
+    p1 = positive_values(forest)
+    n_rows, n_features = X.shape
+    stops = {d: _stop_level(d, forest) for d in depths}
+    curves = {d: np.empty((n_rows, forest.n_estimators), dtype=np.float64) for d in depths}
+    for start in range(0, n_rows, CHUNK_ROWS):
+        chunk = X[start:start + CHUNK_ROWS]
+        rows = chunk.shape[0]
+        flat_x = chunk.ravel()
+        node = np.tile(forest.roots, rows).astype(np.intp)
+        row_base = (np.arange(node.size) // forest.n_estimators) * n_features
+        for level in range(max(stops.values()) + 1):
+            for d, stop in stops.items():
+                if stop == level:
+                    curves[d][start:start + rows] = p1[node].reshape(rows, -1)
+            x = flat_x.take(row_base + forest.feature.take(node))
+            node = np.where(x > forest.threshold.take(node), forest.children_right.take(node), forest.children_left.take(node))
+    return curves
+
+
+def _stop_level(depth: Optional[int], forest: CompiledForest) -> int:
+    return forest.max_depth if depth is None else min(depth, forest.max_depth)
+
+
+def grid_points(
+    forest: CompiledForest,
+    X: Any,
+    y: Any,
+    tree_counts: Sequence[int] = DEFAULT_TREE_COUNTS,
+    depths: Sequence[Optional[int]] = DEFAULT_DEPTHS,
+) -> List[Point]:
+    """ROC-AUC and node count of every (tree count, depth cap) on ``(X, y)``."""
+    from sklearn.metrics import roc_auc_score
+
+    y = np.asarray(y) == forest.classes_[1]
+    counts = sorted({t for t in tree_counts if t < forest.n_estimators} | {forest.n_estimators})
+    depths = [d for d in depths if d is not None and d < forest.max_depth] + [None]
+
+    # Nodes per (tree, depth), accumulated into "trees < t and depth <= d"
+    depth = node_depths(forest)
+    per_tree = np.zeros((forest.n_estimators, forest.max_depth + 1), dtype=np.int64)
+    np.add.at(per_tree, (node_trees(forest), depth), 1)
+    nodes = np.cumsum(np.cumsum(per_tree, axis=1), axis=0)
+
+    points = []
+    for d, proba in depth_curves(forest, X, depths).items():
+        summed = np.cumsum(proba, axis=1)
+        for t in counts:
+            auc = float(roc_auc_score(y, summed[:, t - 1] / t))
+            points.append(Point(t, d, int(nodes[t - 1, _stop_level(d, forest)]), auc))
+    return points
+
+
+def pareto_front(points: Sequence[Point]) -> List[Point]:
+    """Points not beaten on both node count and AUC, smallest first."""
+    front = []
+    best_auc = -np.inf
+    for point in sorted(points, key=lambda p: (p.n_nodes, -p.roc_auc)):
+        if point.roc_auc > best_auc:
+            front.append(point)
+            best_auc = point.roc_auc
+    return front
+
+
+def build(forest: CompiledForest, point: Point, prune_tolerance: float = 0.0, leaf_dtype: str = "float32") -> CompiledForest:
+    return compact_arrays(prune(truncate(forest, point.n_trees, point.max_depth), prune_tolerance), leaf_dtype)
+
+
+def measure(model: Any, path: Path, row: np.ndarray, save: Any, load: Any, repeats: int = LATENCY_REPEATS) -> Dict[str, float]:
+    """Artifact size, load time and median single-row predict latency."""
+    save(model, path)
+    start = time.perf_counter()
+    loaded = load(path)
+    load_seconds = time.perf_counter() - start
+    loaded.predict_proba(row)  # warm-up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        loaded.predict_proba(row)
+        timings.append(time.perf_counter() - start)
+    return {
+        "bytes": path.stat().st_size,
+        "load_ms": round(load_seconds * 1000, 3),
+        "latency_ms_p50": round(float(np.median(timings)) * 1000, 4),
+    }
+
+
+def _save_compiled(forest: CompiledForest, path: Path) -> None:
+    forest.save(path)
+
+
+def compact(
+    forest: CompiledForest,
+    X: Any,
+    y: Any,
+    tolerance: float = DEFAULT_TOLERANCE,
+    prune_tolerance: float = 0.0,
+    leaf_dtype: str = "float32",
+    tree_counts: Sequence[int] = DEFAULT_TREE_COUNTS,
+    depths: Sequence[Optional[int]] = DEFAULT_DEPTHS,
+    sklearn_model: Any = None,
+    measure_frontier: bool = True,
+    validation_fraction: float = VALIDATION_FRACTION,
+    seed: int = 0,
+) -> CompactResult:
+    """Smallest (by node count) forest whose ROC-AUC is within ``tolerance`` of the full one.
+
+    ``(X, y)`` are held-out rows: the point is chosen on a stratified
+    ``validation_fraction`` of them and the built forests' ROC-AUC is
+    reported on the rest.
+    """
+    from sklearn.metrics import roc_auc_score
+
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y)
+    tune, held = validation_split(y, validation_fraction, seed)
+    points = grid_points(forest, X[tune], y[tune], tree_counts, depths)
+    full = next(p for p in points if p.n_trees == forest.n_estimators and p.max_depth is None)
+    feasible = [p for p in points if p.roc_auc >= full.roc_auc - tolerance]
+    chosen = min(feasible, key=lambda p: (p.n_nodes, p.n_trees))
+    frontier = pareto_front(points)
+    if chosen not in frontier:
+        frontier.append(chosen)
+        frontier.sort(key=lambda p: p.n_nodes)
+    if full not in frontier:
+        frontier.append(full)
+
+    X, y_true = X[held], y[held] == forest.classes_[1]
+    row = X[:1]
+    result_forest = build(forest, chosen, prune_tolerance, leaf_dtype)
+    baseline: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory(prefix="cardio-compact-") as tmp:
+        for i, point in enumerate(frontier if measure_frontier else [chosen]):
+            built = result_forest if point is chosen else build(forest, point, prune_tolerance, leaf_dtype)
+            point.measured = measure(built, Path(tmp) / f"{i}.npz", row, _save_compiled, CompiledForest.load)
+            # AUC of what is actually shipped (after pruning / float32)
+            point.measured["roc_auc_built"] = round(float(roc_auc_score(y_true, built.predict_proba(X)[:, 1])), 6)
+            point.measured["n_nodes_built"] = built.n_nodes
+        if sklearn_model is not None:
+            import joblib
+
+            # The fitted model may carry feature names; the report rows are plain arrays
+            warnings.filterwarnings("ignore", message="X does not have valid feature names")
+            baseline = measure(sklearn_model, Path(tmp) / "model.joblib", row, joblib.dump, joblib.load)
+            baseline["roc_auc"] = round(float(roc_auc_score(y_true, sklearn_model.predict_proba(X)[:, 1])), 6)
+    return CompactResult(result_forest, chosen, full, tolerance, frontier, baseline, {"tune": len(tune), "report": len(held)})
+
+
+def format_report(result: CompactResult) -> str:
+    """Plain-text table of the measured points."""
+    lines = [f"{'trees':>5} {'depth':>5} {'nodes':>9} {'size MB':>8} {'load ms':>8} {'1-row ms':>8} {'ROC-AUC':>8}"]
+    if result.baseline:
+        b = result.baseline
+        lines.append(
+            f"{'joblib':>11} {'':>9} {b['bytes'] / 1e6:>8.2f} {b['load_ms']:>8.1f} {b['latency_ms_p50']:>8.3f} {b['roc_auc']:>8.4f}"
+        )
+    for point in result.frontier:
+        if not point.measured:
+            continue
+        m = point.measured
+        depth = "-" if point.max_depth is None else str(point.max_depth)
+        mark = "  <- chosen" if point is result.chosen else ""
+        lines.append(
+            f"{point.n_trees:>5} {depth:>5} {m['n_nodes_built']:>9} {m['bytes'] / 1e6:>8.2f} "
+            f"{m['load_ms']:>8.1f} {m['latency_ms_p50']:>8.3f} {m['roc_auc_built']:>8.4f}{mark}"
+        )
+    return "\n".join(lines)
+
+
+def _ints(values: Sequence[str]) -> Tuple[int, ...]:
+    return tuple(int(v) for v in values)
+
+
+def main(argv: Any = None) -> None:
+    parser = argparse.ArgumentParser(description="Pick and write a smaller forest within an ROC-AUC tolerance")
+    parser.add_argument("--csv", default="cardio_train.csv", help="Training CSV; the held-out split comes from the DAG")
+    parser.add_argument("--cache-dir", default=os.environ.get("CARDIO_PIPELINE_CACHE", ".cardio-cache"))
+    parser.add_argument("--model", default=None, help="Model artifact to compact (default: the DAG's rf stage)")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed ROC-AUC drop")
+    parser.add_argument("--prune-tolerance", type=float, default=0.0, help="Max leaf difference for collapsing subtrees")
+    parser.add_argument("--leaf-dtype", default="float32", choices=("float32", "float16"))
+    parser.add_argument("--trees", nargs="+", default=DEFAULT_TREE_COUNTS, help="Tree counts to try")
+    parser.add_argument("--depths", nargs="+", default=DEFAULT_DEPTHS, help="Depth caps to try")
+    parser.add_argument("--validation-fraction", type=float, default=VALIDATION_FRACTION,
+                        help="Share of the held-out rows the point is chosen on (the rest is reported on)")
+    parser.add_argument("--out", default="rf_cardio_model.compact.npz")
+    parser.add_argument("--report", default=None, help="Also write the JSON report here")
+    args = parser.parse_args(argv)
+
+    from cardio.pipeline import build_pipeline
+
+    pipe = build_pipeline(args.csv, args.cache_dir)
+    targets = ["split", "scale"] if args.model else ["split", "scale", "rf"]
+    outputs, _ = pipe.run(targets, log=lambda line: print(line, file=sys.stderr))
+    model = load_model(args.model) if args.model else outputs["rf"]["model"]
+    forest = model if isinstance(model, CompiledForest) else CompiledForest.from_sklearn(model)
+
+    result = compact(
+        forest,
+        outputs["scale"]["X_test"],
+        outputs["split"]["y_test"],
+        tolerance=args.tolerance,
+        prune_tolerance=args.prune_tolerance,
+        leaf_dtype=args.leaf_dtype,
+        tree_counts=_ints(args.trees),
+        depths=_ints(args.depths),
+        sklearn_model=None if isinstance(model, CompiledForest) else model,
+        validation_fraction=args.validation_fraction,
+    )
+    result.forest.save(args.out)
+    report = result.to_dict()
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+    print(format_report(result), file=sys.stderr)
+    print(json.dumps({"out": args.out, "chosen": report["chosen"], "full": report["full"]}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
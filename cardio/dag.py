@@ -0,0 +1,317 @@
+"""Small stage DAG with outputs memoized on disk.
+
+A stage is a function ``fn(params, **inputs)`` whose inputs are the outputs
+of the stages it depends on. Its cache key hashes the stage's source code,
+its parameters, any extra fingerprint (e.g. of a source file) and the keys
+of its dependencies. Functions of the stage's own module that it calls
+(directly or through each other) are hashed with it; other code counts only
+when declared: ``modules`` adds the source of helper modules (e.g.
+``cardio.features`` for feature engineering) and ``packages`` the installed
+version of libraries whose results it depends on (e.g. ``scikit-learn`` for
+fitted models). With those declared, a change anywhere upstream invalidates
+everything downstream and nothing else. Outputs are stored with joblib under
+``<root>/<stage>/<key>.joblib``; a run only loads the outputs it actually
+needs and only executes stages whose key has no stored output.
+"""
+from __future__ import annotations
+
+import dis
+import hashlib
+import importlib.metadata
+import importlib.util
+import inspect
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+DEFAULT_KEEP = 5
+# No usable stored output (a stage may legitimately return None)
+_MISSING = object()
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable[..., Any]
+    deps: Tuple[str, ...] = ()
+    params: Dict[str, Any] = field(default_factory=dict)
+    # Settings that do not change the output (e.g. n_jobs); not part of the key
+    options: Dict[str, Any] = field(default_factory=dict)
+    # Extra fingerprint computed from the params, e.g. the hash of an input file
+    fingerprint: Optional[Callable[[Dict[str, Any]], str]] = None
+    # Side-effect stages (writing artifacts) run every time they are requested
+    cache: bool = True
+    # Optional check that a cached output is still usable (e.g. files it wrote exist)
+    check: Optional[Callable[[Any], bool]] = None
+    # Helper modules the stage calls; their source is part of the key
+    modules: Tuple[str, ...] = ()
+    # Distributions whose installed version is part of the key
+    packages: Tuple[str, ...] = ()
+
+    def code_hash(self) -> str:
+        try:
+            source = inspect.getsource(self.fn)
+        except (OSError, TypeError):
+            source = self.fn.__qualname__
+        digest = hashlib.sha256(source.encode("utf-8"))
+        for helper in _local_helpers(self.fn):
+            digest.update(f"\0{helper.__qualname__}\0".encode("utf-8"))
+            digest.update(inspect.getsource(helper).encode("utf-8"))
+        for module in self.modules:
+            digest.update(f"\0{module}\0".encode("utf-8"))
+            digest.update(_module_source(module))
+        return digest.hexdigest()
+
+    def package_versions(self) -> Dict[str, str]:
+        versions = {}
+        for package in self.packages:
+            try:
+                versions[package] = importlib.metadata.version(package)
+            except importlib.metadata.PackageNotFoundError:
+                versions[package] = "missing"
+        return versions
+
+
+def _local_helpers(fn: Callable[..., Any]) -> List[Callable[..., Any]]:
+    """Functions of ``fn``'s module that it reads as globals, transitively, by name."""
+    found: Dict[str, Callable[..., Any]] = {}
+    pending = [fn]
+    while pending:
+        code = getattr(pending.pop(), "__code__", None)
+        codes = [code] if code is not None else []
+        while codes:
+            code = codes.pop()
+            # Comprehensions, lambdas and nested functions are constants of the body
+            codes.extend(const for const in code.co_consts if inspect.iscode(const))
+            for instruction in dis.get_instructions(code):
+                if instruction.opname not in ("LOAD_GLOBAL", "LOAD_NAME") or instruction.argval in found:
+                    continue
+                value = getattr(fn, "__globals__", {}).get(instruction.argval)
+                if inspect.isfunction(value) and value is not fn and value.__module__ == fn.__module__:
+                    found[instruction.argval] = value
+                    pending.append(value)
+    return [found[name] for name in sorted(found)]
+
+
+def _module_source(name: str) -> bytes:
+    """Source bytes of module ``name``, read without importing it."""
+    spec = importlib.util.find_spec(name)
+    if spec is None or not spec.origin or not os.path.isfile(spec.origin):
+        raise ValueError(f"Cannot find the source of module {name!r}")
+    with open(spec.origin, "rb") as fh:
+        return fh.read()
+
+
+@dataclass
+class StageRun:
+    name: str
+    key: str
+    status: str  # "cached" or "ran"
+    seconds: float = 0.0
+
+
+class Pipeline:
+    """Registry of stages plus the on-disk store of their outputs."""
+
+    def __init__(self, root: str | Path, keep: int = DEFAULT_KEEP) -> None:
+        self.root = Path(root)
+        self.keep = keep
+        self.stages: Dict[str, Stage] = {}
+
+    def stage(
+        self,
+        deps: Sequence[str] = (),
+        params: Optional[Mapping[str, Any]] = None,
+        options: Optional[Mapping[str, Any]] = None,
+        fingerprint: Optional[Callable[[Dict[str, Any]], str]] = None,
+        cache: bool = True,
+        check: Optional[Callable[[Any], bool]] = None,
+        name: Optional[str] = None,
+        modules: Sequence[str] = (),
+        packages: Sequence[str] = (),
+    ) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        """Decorator registering ``fn`` as a stage."""
+
+        def register(fn: Callable[..., Any]) -> Callable[..., Any]:
+            stage_name = name or fn.__name__
+            for dep in deps:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage {stage_name!r} depends on unknown stage {dep!r}")
+            self.stages[stage_name] = Stage(
+                stage_name, fn, tuple(deps), dict(params or {}), dict(options or {}), fingerprint, cache, check,
+                tuple(modules), tuple(packages),
+            )
+            return fn
+
+        return register
+
+    # --- configuration ---
+    def configure(self, overrides: Mapping[str, Any]) -> None:
+        """Apply ``{"stage.param": value}`` overrides to params or options."""
+        for dotted, value in overrides.items():
+            stage_name, _, param = dotted.partition(".")
+            stage = self.stages.get(stage_name)
+            if stage is None:
+                raise KeyError(f"Unknown stage: {stage_name}")
+            if param in stage.params:
+                stage.params[param] = value
+            elif param in stage.options:
+                stage.options[param] = value
+            else:
+                known = ", ".join(sorted({*stage.params, *stage.options})) or "none"
+                raise KeyError(f"Stage {stage_name!r} has no parameter {param!r} (known: {known})")
+
+    # --- keys ---
+    def keys(self, targets: Iterable[str]) -> Dict[str, str]:
+        """Cache key of every stage ``targets`` need, dependencies first."""
+        keys: Dict[str, str] = {}
+
+        def visit(name: str) -> str:
+            if name in keys:
+                return keys[name]
+            stage = self.stages[name]
+            payload = {
+                "stage": name,
+                "code": stage.code_hash(),
+                "params": stage.params,
+                "deps": {dep: visit(dep) for dep in stage.deps},
+            }
+            if stage.packages:
+                payload["packages"] = stage.package_versions()
+            if stage.fingerprint is not None:
+                payload["fingerprint"] = stage.fingerprint(stage.params)
+            blob = json.dumps(payload, sort_keys=True, default=repr).encode("utf-8")
+            keys[name] = hashlib.sha256(blob).hexdigest()[:24]
+            return keys[name]
+
+        for target in targets:
+            if target not in self.stages:
+                raise KeyError(f"Unknown stage: {target}")
+            visit(target)
+        return keys
+
+    # --- store ---
+    def _path(self, name: str, key: str) -> Path:
+        return self.root / name / f"{key}.joblib"
+
+    def is_cached(self, name: str, key: str) -> bool:
+        stage = self.stages[name]
+        if not (stage.cache and self._path(name, key).exists()):
+            return False
+        return stage.check is None or stage.check(self.load(name, key))
+
+    def _cached(self, name: str, key: str) -> Any:
+        """The stored output if it is still usable, else ``_MISSING``; loads it at most once."""
+        stage = self.stages[name]
+        if not (stage.cache and self._path(name, key).exists()):
+            return _MISSING
+        value = self.load(name, key)
+        if stage.check is not None and not stage.check(value):
+            return _MISSING
+        return value
+
+    def load(self, name: str, key: str) -> Any:
+        import joblib
+
+        return joblib.load(self._path(name, key))
+
+    def _store(self, name: str, key: str, value: Any, meta: Dict[str, Any]) -> None:
+        import joblib
+
+        directory = self.root / name
+        directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(name, key)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        joblib.dump(value, tmp)
+        os.replace(tmp, path)
+        with path.with_suffix(".json").open("w", encoding="utf-8") as fh:
+            json.dump(meta, fh, indent=2, default=repr)
+        self._prune(directory)
+
+    def _prune(self, directory: Path) -> None:
+        """Keep the ``keep`` most recent outputs of a stage."""
+        outputs = sorted(directory.glob("*.joblib"), key=lambda path: path.stat().st_mtime, reverse=True)
+        for path in outputs[self.keep:]:
+            path.unlink(missing_ok=True)
+            path.with_suffix(".json").unlink(missing_ok=True)
+
+    # --- execution ---
+    def plan(self, targets: Sequence[str], force: Iterable[str] = ()) -> Dict[str, str]:
+        """``{stage: "cached" | "run"}`` for what ``run`` would do, without running."""
+        keys = self.keys(targets)
+        forced = self._forced(force, keys)
+        needed: Dict[str, str] = {}
+
+        def visit(name: str) -> None:
+            if name in needed:
+                return
+            if name not in forced and self.is_cached(name, keys[name]):
+                needed[name] = "cached"
+                return
+            needed[name] = "run"
+            for dep in self.stages[name].deps:
+                visit(dep)
+
+        for target in targets:
+            visit(target)
+        return {name: needed[name] for name in keys if name in needed}
+
+    def _forced(self, force: Iterable[str], keys: Mapping[str, str]) -> set:
+        """Stages in ``force`` plus everything downstream of them."""
+        forced = set(force)
+        for name in keys:  # keys are in dependency order
+            if any(dep in forced for dep in self.stages[name].deps):
+                forced.add(name)
+        return forced
+
+    def run(
+        self,
+        targets: Sequence[str],
+        force: Iterable[str] = (),
+        log: Callable[[str], None] = print,
+    ) -> Tuple[Dict[str, Any], List[StageRun]]:
+        """Produce the outputs of ``targets``, executing only stale stages."""
+        keys = self.keys(targets)
+        forced = self._forced(force, keys)
+        outputs: Dict[str, Any] = {}
+        runs: List[StageRun] = []
+
+        def produce(name: str) -> Any:
+            if name in outputs:
+                return outputs[name]
+            stage = self.stages[name]
+            key = keys[name]
+            start = time.perf_counter()
+            cached = _MISSING if name in forced else self._cached(name, key)
+            if cached is not _MISSING:
+                outputs[name] = cached
+                runs.append(StageRun(name, key, "cached", time.perf_counter() - start))
+                log(f"[{name}] cached ({key})")
+                return cached
+
+            inputs = {dep: produce(dep) for dep in stage.deps}
+            log(f"[{name}] running ({key})")
+            start = time.perf_counter()
+            value = stage.fn({**stage.params, **stage.options}, **inputs)
+            seconds = time.perf_counter() - start
+            if stage.cache:
+                meta = {
+                    "stage": name,
+                    "key": key,
+                    "params": stage.params,
+                    "deps": {dep: keys[dep] for dep in stage.deps},
+                    "seconds": round(seconds, 3),
+                    "created_at": time.time(),
+                }
+                self._store(name, key, value, meta)
+            outputs[name] = value
+            runs.append(StageRun(name, key, "ran", seconds))
+            log(f"[{name}] done in {seconds:.2f}s")
+            return value
+
+        for target in targets:
+            produce(target)
+        return {target: outputs[target] for target in targets}, runs
@@ -0,0 +1,288 @@
+"""Fingerprinted, memory-mapped cache of the cleaned training dataset.
+
+The first run parses ``cardio_train.csv`` once, applies the CELL 4 cleaning
+and ``cardio.features`` encoding and writes every column as its own ``.npy``
+file with the smallest dtype that holds it exactly (int8 flags and dummies,
+int16 measurements, float64 only where a value is not an exact float32).
+The directory name is a fingerprint of the source file's contents and the
+cleaning / feature parameters, so changing either builds a new entry. Later
+runs skip parsing and map the columns read-only::
+
+    python -m cardio.dataset cardio_train.csv
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from cardio.features import (
+    AGE_BINS,
+    AGE_LABELS,
+    CLEAN_LIMITS,
+    DAYS_PER_YEAR,
+    FEATURE_ORDER,
+    age_years_from_days,
+    build_features,
+    clean_mask,
+    raw_from_columns,
+)
+
+DEFAULT_CACHE_DIR = Path(tempfile.gettempdir()) / "cardio-dataset-cache"
+FORMAT_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+# Columns kept next to the features (CELL 7): id, age in days and the label
+EXTRA_COLUMNS = ("id", "age", "cardio")
+INTEGER_DTYPES = (np.int8, np.int16, np.int32, np.int64)
+
+
+def cleaning_params(feature_order: Sequence[str] = FEATURE_ORDER, float32: bool = False) -> Dict[str, Any]:
+    """Everything besides the CSV that changes the cached columns."""
+    return {
+        "format": FORMAT_VERSION,
+        "clean_limits": {name: list(bounds) for name, bounds in CLEAN_LIMITS.items()},
+        "days_per_year": DAYS_PER_YEAR,
+        "age_bins": list(AGE_BINS),
+        "age_labels": list(AGE_LABELS),
+        "feature_order": list(feature_order),
+        "float32": float32,
+    }
+
+
+def file_sha256(path: str | Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def downcast(values: np.ndarray, float32: bool = False) -> np.ndarray:
+    """Smallest dtype holding ``values`` exactly.
+
+    Integer-valued columns become the narrowest signed int; other floats
+    become float32 only when that round-trips (or when ``float32`` allows
+    rounding).
+    """
+    values = np.asarray(values)
+    if values.dtype == np.bool_:
+        return values.astype(np.int8)
+    if values.size == 0:
+        return values
+    if np.issubdtype(values.dtype, np.floating):
+        finite = np.isfinite(values).all()
+        if finite and np.array_equal(values, np.trunc(values)):
+            values = values.astype(np.int64)
+        else:
+            single = values.astype(np.float32)
+            if float32 or np.array_equal(single.astype(values.dtype), values, equal_nan=True):
+                return single
+            return values
+    if np.issubdtype(values.dtype, np.integer):
+        low, high = values.min(), values.max()
+        for dtype in INTEGER_DTYPES:
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                return values.astype(dtype)
+    return values
+
+
+@dataclass
+class CachedDataset:
+    """Cleaned and encoded columns of one source file, memory-mapped."""
+
+    path: Path
+    status: str  # "hit" or "built"
+    manifest: Dict[str, Any]
+    columns: Dict[str, np.ndarray] = field(repr=False)
+    seconds: float = 0.0
+
+    @property
+    def feature_order(self) -> List[str]:
+        return list(self.manifest["params"]["feature_order"])
+
+    @property
+    def rows(self) -> int:
+        return int(self.manifest["rows"])
+
+    def frame(self, columns: Optional[Sequence[str]] = None):
+        """DataFrame over the cached columns (``id``, ``age``, ``cardio`` + features)."""
+        import pandas as pd
+
+        names = list(columns) if columns is not None else list(self.manifest["columns"])
+        return pd.DataFrame({name: self.columns[name] for name in names}, copy=False)
+
+    def features(self) -> np.ndarray:
+        """Unscaled (n, n_features) float64 matrix in ``feature_order``."""
+        return np.column_stack([np.asarray(self.columns[name], dtype=np.float64) for name in self.feature_order])
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "path": str(self.path),
+            "status": self.status,
+            "rows": self.rows,
+            "source_rows": self.manifest["source_rows"],
+            "bytes": self.manifest["bytes"],
+            "dtypes": {name: spec["dtype"] for name, spec in self.manifest["columns"].items()},
+            "seconds": round(self.seconds, 4),
+        }
+
+
+class DatasetCache:
+    """Directory of fingerprinted dataset builds plus a stat index of sources."""
+
+    def __init__(self, root: str | Path = DEFAULT_CACHE_DIR) -> None:
+        self.root = Path(root)
+        self.index_dir = self.root / "sources"
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "DatasetCache":
+        return cls(os.environ.get("CARDIO_DATASET_CACHE", DEFAULT_CACHE_DIR))
+
+    def _source_sha256(self, csv_path: Path) -> str:
+        """Content hash of ``csv_path``, reused while size and mtime are unchanged."""
+        stat = csv_path.stat()
+        index = self.index_dir / (hashlib.sha256(str(csv_path.resolve()).encode("utf-8")).hexdigest() + ".json")
+        try:
+            with index.open("r", encoding="utf-8") as fh:
+                known = json.load(fh)
+            if known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+                return known["sha256"]
+        except (OSError, ValueError, KeyError):
+            pass
+        sha256 = file_sha256(csv_path)
+        tmp = index.with_suffix(f".{os.getpid()}.tmp")
+        with tmp.open("w", encoding="utf-8") as fh:
+            json.dump(
+                {"path": str(csv_path.resolve()), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256},
+                fh,
+            )
+        os.replace(tmp, index)
+        return sha256
+
+    def fingerprint(self, csv_path: str | Path, feature_order: Sequence[str] = FEATURE_ORDER, float32: bool = False) -> str:
+        params = json.dumps(cleaning_params(feature_order, float32), sort_keys=True)
+        digest = hashlib.sha256(self._source_sha256(Path(csv_path)).encode("ascii"))
+        digest.update(params.encode("utf-8"))
+        return digest.hexdigest()[:32]
+
+    def load(
+        self,
+        csv_path: str | Path,
+        feature_order: Sequence[str] = FEATURE_ORDER,
+        float32: bool = False,
+        mmap_mode: Optional[str] = "r",
+        rebuild: bool = False,
+        sep: str = ";",
+    ) -> CachedDataset:
+        """Map the cached build of ``csv_path``, building it first if needed."""
+        start = time.perf_counter()
+        key = self.fingerprint(csv_path, feature_order, float32)
+        directory = self.root / key
+        status = "hit"
+        if rebuild or not (directory / "manifest.json").exists():
+            self._build(Path(csv_path), directory, key, feature_order, float32, sep)
+            status = "built"
+
+        with (directory / "manifest.json").open("r", encoding="utf-8") as fh:
+            manifest = json.load(fh)
+        columns = {
+            name: np.load(directory / spec["file"], mmap_mode=mmap_mode)
+            for name, spec in manifest["columns"].items()
+        }
+        return CachedDataset(directory, status, manifest, columns, time.perf_counter() - start)
+
+    def _build(
+        self, csv_path: Path, directory: Path, key: str, feature_order: Sequence[str], float32: bool, sep: str
+    ) -> None:
+        import pandas as pd
+
+        df = pd.read_csv(csv_path, sep=sep)
+        source_rows = len(df)
+        df = df[clean_mask(df)].copy()
+        df["age_years"] = age_years_from_days(df["age"])
+        features = build_features(raw_from_columns(df, age="age_years"), feature_order)
+
+        columns: Dict[str, np.ndarray] = {
+            name: df[name].to_numpy() for name in EXTRA_COLUMNS if name in df.columns
+        }
+        for j, name in enumerate(feature_order):
+            columns[name] = features[:, j]
+
+        tmp = Path(tempfile.mkdtemp(prefix=f".{key}-", dir=self.root))
+        try:
+            specs = {}
+            total = 0
+            for i, (name, values) in enumerate(columns.items()):
+                stored = downcast(values, float32)
+                filename = f"{i:02d}.npy"
+                np.save(tmp / filename, np.ascontiguousarray(stored))
+                specs[name] = {"file": filename, "dtype": stored.dtype.str}
+                total += stored.nbytes
+            with (tmp / "features.json").open("w", encoding="utf-8") as fh:
+                json.dump(list(feature_order), fh, ensure_ascii=False, indent=2)
+            manifest = {
+                "key": key,
+                "source": str(csv_path.resolve()),
+                "source_sha256": self._source_sha256(csv_path),
+                "source_rows": source_rows,
+                "rows": len(df),
+                "bytes": total,
+                "params": cleaning_params(feature_order, float32),
+                "columns": specs,
+                "created_at": time.time(),
+            }
+            with (tmp / "manifest.json").open("w", encoding="utf-8") as fh:
+                json.dump(manifest, fh, indent=2)
+            if directory.exists():
+                shutil.rmtree(directory)
+            os.replace(tmp, directory)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+    def entries(self) -> List[Dict[str, Any]]:
+        found = []
+        for manifest in self.root.glob("*/manifest.json"):
+            try:
+                with manifest.open("r", encoding="utf-8") as fh:
+                    found.append(json.load(fh))
+            except (OSError, ValueError):
+                continue
+        return found
+
+    def clear(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+
+
+def load_dataset(csv_path: str | Path, cache_dir: Optional[str | Path] = None, **kwargs: Any) -> CachedDataset:
+    """Shortcut for ``DatasetCache(cache_dir).load(csv_path)`` (CARDIO_DATASET_CACHE by default)."""
+    cache = DatasetCache(cache_dir) if cache_dir is not None else DatasetCache.from_env()
+    return cache.load(csv_path, **kwargs)
+
+
+def main(argv: Any = None) -> None:
+    parser = argparse.ArgumentParser(description="Build or load the cached training dataset")
+    parser.add_argument("csv", help="cardio_train.csv-style source file")
+    parser.add_argument("--cache-dir", default=os.environ.get("CARDIO_DATASET_CACHE", DEFAULT_CACHE_DIR))
+    parser.add_argument("--float32", action="store_true", help="Round non-integer columns to float32")
+    parser.add_argument("--rebuild", action="store_true")
+    args = parser.parse_args(argv)
+
+    dataset = DatasetCache(args.cache_dir).load(args.csv, float32=args.float32, rebuild=args.rebuild)
+    print(json.dumps(dataset.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
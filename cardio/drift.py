@@ -0,0 +1,387 @@
+"""Streaming drift monitor: live model inputs vs the training data.
+
+A ``DriftSketch`` summarises engineered feature rows (``FEATURE_ORDER``,
+unscaled) in constant memory:
+
+* a fixed-edge histogram for every continuous feature (``CONTINUOUS``);
+* count, mean, variance (Chan et al. parallel update), min and max of
+  every column;
+* category counts for cholesterol, gluc, age_cat and the binary inputs.
+
+Sketches with the same edges merge exactly, so per-process snapshots can
+be added up. The reference sketch is built from the training split by the
+``drift`` stage of ``cardio.pipeline`` (and CELL 18 of the notebook), with
+quantile edges so each reference bin holds about the same mass. Its edges
+are reused by the live sketches, and ``compare`` reports PSI per feature and,
+for continuous ones, a binned two-sample KS statistic::
+
+    python -m cardio.pipeline drift          # writes drift_reference.json
+    python -m cardio.drift compare drift_reference.json live-*.json
+
+``DriftMonitor`` is what the services hold: ``observe`` only queues the
+raw rows of a request, and features are built and folded into the sketch
+``flush_rows`` rows at a time, so a request (cache hits included) pays a
+list append and the NumPy work is amortised over a batch.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from cardio.features import AGE_LABELS, CLEAN_LIMITS, FEATURE_ORDER, RAW_FIELDS, build_features
+
+SCHEMA = 1
+DEFAULT_BINS = 20
+FLUSH_ROWS = 256
+MIN_ROWS = 100
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+PSI_EPSILON = 1e-4
+
+CONTINUOUS = ("height", "weight", "ap_hi", "ap_lo", "age_years", "bmi", "bp_diff")
+
+# Category -> level names; the codes are read back from the dummies (_category_codes)
+CATEGORIES: Dict[str, Sequence[str]] = {
+    "cholesterol": ("1", "2", "3"),
+    "gluc": ("1", "2", "3"),
+    "age_cat": AGE_LABELS,
+    "gender": ("female", "male"),
+    "smoke": ("0", "1"),
+    "alco": ("0", "1"),
+    "active": ("0", "1"),
+}
+
+# Used when there is no reference to copy edges from
+DEFAULT_EDGES: Dict[str, np.ndarray] = {
+    **{name: np.linspace(low, high, DEFAULT_BINS + 1) for name, (low, high) in CLEAN_LIMITS.items()},
+    "age_years": np.linspace(0, 100, DEFAULT_BINS + 1),
+    "bmi": np.linspace(10, 60, DEFAULT_BINS + 1),
+    "bp_diff": np.linspace(0, 150, DEFAULT_BINS + 1),
+}
+
+
+def _category_codes(X: np.ndarray, feature_order: Sequence[str]) -> np.ndarray:
+    """(n, len(CATEGORIES)) integer level of every category per row."""
+    index = {name: i for i, name in enumerate(feature_order)}
+
+    def col(name: str) -> np.ndarray:
+        return X[:, index[name]] if name in index else np.zeros(len(X))
+
+    codes = [
+        col("cholesterol_2") + 2 * col("cholesterol_3"),
+        col("gluc_2") + 2 * col("gluc_3"),
+        sum(k * col(f"age_cat_{label}") for k, label in enumerate(AGE_LABELS[1:], 1)),
+        col("gender_male"),
+        col("smoke"),
+        col("alco"),
+        col("active"),
+    ]
+    levels = np.array([len(v) for v in CATEGORIES.values()])
+    return np.clip(np.column_stack(codes).astype(np.intp), 0, levels - 1)
+
+
+def quantile_edges(values: Any, bins: int = DEFAULT_BINS) -> np.ndarray:
+    """Interior edges putting about ``1 / bins`` of ``values`` in each bin."""
+    edges = np.quantile(np.asarray(values, dtype=np.float64), np.linspace(0, 1, bins + 1)[1:-1])
+    return np.unique(edges)
+
+
+class DriftSketch:
+    """Mergeable fixed-size summary of engineered feature rows."""
+
+    def __init__(self, edges: Optional[Mapping[str, Any]] = None, feature_order: Sequence[str] = FEATURE_ORDER) -> None:
+        self.feature_order = list(feature_order)
+        edges = edges or DEFAULT_EDGES
+        self.edges = {name: np.asarray(edges[name], dtype=np.float64) for name in CONTINUOUS}
+        self._continuous = np.array([self.feature_order.index(name) for name in CONTINUOUS])
+        # Edges padded with +inf into one matrix: a row's bin is the number of edges <= x
+        width = max(len(e) for e in self.edges.values())
+        self._edge_matrix = np.full((len(CONTINUOUS), width), np.inf)
+        for k, name in enumerate(CONTINUOUS):
+            self._edge_matrix[k, : len(self.edges[name])] = self.edges[name]
+        sizes = np.array([len(self.edges[name]) + 1 for name in CONTINUOUS])
+        self._hist_offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        self._hist_sizes = sizes
+        levels = np.array([len(v) for v in CATEGORIES.values()])
+        self._cat_offsets = np.concatenate([[0], np.cumsum(levels)[:-1]])
+        self._cat_sizes = levels
+
+        d = len(self.feature_order)
+        self.n = 0
+        self.mean = np.zeros(d)
+        self.m2 = np.zeros(d)
+        self.min = np.full(d, np.inf)
+        self.max = np.full(d, -np.inf)
+        self.hist = np.zeros(int(sizes.sum()), dtype=np.int64)
+        self.categories = np.zeros(int(levels.sum()), dtype=np.int64)
+
+    @classmethod
+    def like(cls, other: "DriftSketch") -> "DriftSketch":
+        """Empty sketch with ``other``'s layout (mergeable with it)."""
+        return cls(other.edges, other.feature_order)
+
+    def update(self, X: Any) -> None:
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        n = len(X)
+        if n == 0:
+            return
+        mean = X.mean(axis=0)
+        m2 = ((X - mean) ** 2).sum(axis=0)
+        total = self.n + n
+        delta = mean - self.mean
+        self.m2 += m2 + delta**2 * (self.n * n / total)
+        self.mean += delta * (n / total)
+        self.n = total
+        np.minimum(self.min, X.min(axis=0), out=self.min)
+        np.maximum(self.max, X.max(axis=0), out=self.max)
+
+        values = X[:, self._continuous]
+        bins = (values[:, :, None] >= self._edge_matrix[None]).sum(axis=2)
+        self.hist += np.bincount((bins + self._hist_offsets).ravel(), minlength=len(self.hist))
+        codes = _category_codes(X, self.feature_order) + self._cat_offsets
+        self.categories += np.bincount(codes.ravel(), minlength=len(self.categories))
+
+    def same_layout(self, other: "DriftSketch") -> bool:
+        """Same features and edges, i.e. the two can be merged and compared."""
+        return other.feature_order == self.feature_order and all(
+            np.array_equal(self.edges[name], other.edges[name]) for name in CONTINUOUS
+        )
+
+    def merge(self, other: "DriftSketch") -> None:
+        if not self.same_layout(other):
+            raise ValueError("Only sketches with the same features and edges can be merged")
+        if other.n == 0:
+            return
+        total = self.n + other.n
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta**2 * (self.n * other.n / total)
+        self.mean += delta * (other.n / total)
+        self.n = total
+        np.minimum(self.min, other.min, out=self.min)
+        np.maximum(self.max, other.max, out=self.max)
+        self.hist += other.hist
+        self.categories += other.categories
+
+    def histogram(self, name: str) -> np.ndarray:
+        k = CONTINUOUS.index(name)
+        start = self._hist_offsets[k]
+        return self.hist[start : start + self._hist_sizes[k]]
+
+    def category_counts(self, name: str) -> np.ndarray:
+        k = list(CATEGORIES).index(name)
+        start = self._cat_offsets[k]
+        return self.categories[start : start + self._cat_sizes[k]]
+
+    def summary(self) -> Dict[str, Dict[str, Optional[float]]]:
+        std = np.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else np.full(len(self.mean), np.nan)
+        return {
+            name: {
+                "mean": float(self.mean[i]) if self.n else None,
+                "std": float(std[i]) if self.n > 1 else None,
+                "min": float(self.min[i]) if self.n else None,
+                "max": float(self.max[i]) if self.n else None,
+            }
+            for i, name in enumerate(self.feature_order)
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "schema": SCHEMA,
+            "feature_order": self.feature_order,
+            "n": self.n,
+            "mean": self.mean.tolist(),
+            "m2": self.m2.tolist(),
+            "min": self.min.tolist(),
+            "max": self.max.tolist(),
+            "edges": {name: self.edges[name].tolist() for name in CONTINUOUS},
+            "histograms": {name: self.histogram(name).tolist() for name in CONTINUOUS},
+            "categories": {
+                name: dict(zip(levels, self.category_counts(name).tolist())) for name, levels in CATEGORIES.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "DriftSketch":
+        if data.get("schema") != SCHEMA:
+            raise ValueError(f"Unsupported drift sketch schema: {data.get('schema')!r}")
+        sketch = cls(data["edges"], data["feature_order"])
+        sketch.n = int(data["n"])
+        for name in ("mean", "m2", "min", "max"):
+            setattr(sketch, name, np.asarray(data[name], dtype=np.float64))
+        for name in CONTINUOUS:
+            sketch.histogram(name)[:] = data["histograms"][name]
+        for name, levels in CATEGORIES.items():
+            sketch.category_counts(name)[:] = [data["categories"][name][level] for level in levels]
+        return sketch
+
+    def save(self, path: str | Path) -> None:
+        with Path(path).open("w", encoding="utf-8") as fh:
+            json.dump(self.to_dict(), fh)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "DriftSketch":
+        with Path(path).open("r", encoding="utf-8") as fh:
+            return cls.from_dict(json.load(fh))
+
+
+def reference(X: Any, feature_order: Sequence[str] = FEATURE_ORDER, bins: int = DEFAULT_BINS) -> DriftSketch:
+    """Sketch of the (unscaled) training rows with quantile edges from the same rows."""
+    X = np.asarray(X, dtype=np.float64)
+    order = list(feature_order)
+    edges = {name: quantile_edges(X[:, order.index(name)], bins) for name in CONTINUOUS}
+    sketch = DriftSketch(edges, order)
+    sketch.update(X)
+    return sketch
+
+
+def psi(expected: Any, actual: Any) -> float:
+    """Population stability index between two count vectors over the same bins."""
+    p = np.asarray(expected, dtype=np.float64)
+    q = np.asarray(actual, dtype=np.float64)
+    p = np.maximum(p / p.sum(), PSI_EPSILON)
+    q = np.maximum(q / q.sum(), PSI_EPSILON)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def binned_ks(expected: Any, actual: Any) -> float:
+    """Largest gap between the two binned CDFs (a lower bound of the exact KS)."""
+    p = np.cumsum(expected) / np.sum(expected)
+    q = np.cumsum(actual) / np.sum(actual)
+    return float(np.max(np.abs(p - q)))
+
+
+def _status(value: float) -> str:
+    if value >= PSI_SIGNIFICANT:
+        return "significant"
+    return "moderate" if value >= PSI_MODERATE else "stable"
+
+
+def compare(live: DriftSketch, ref: DriftSketch, min_rows: int = MIN_ROWS) -> Dict[str, Any]:
+    """PSI (and binned KS for continuous features) of ``live`` against ``ref``."""
+    if live.n < min_rows or ref.n == 0:
+        return {"rows": live.n, "reference_rows": ref.n, "status": "insufficient_data", "features": {}}
+    live_summary, ref_summary = live.summary(), ref.summary()
+    features: Dict[str, Any] = {}
+    for name in CONTINUOUS:
+        expected, actual = ref.histogram(name), live.histogram(name)
+        value = psi(expected, actual)
+        features[name] = {
+            "psi": round(value, 4),
+            "ks": round(binned_ks(expected, actual), 4),
+            "mean": live_summary[name]["mean"],
+            "reference_mean": ref_summary[name]["mean"],
+            "status": _status(value),
+        }
+    for name in CATEGORIES:
+        expected, actual = ref.category_counts(name), live.category_counts(name)
+        value = psi(expected, actual)
+        features[name] = {
+            "psi": round(value, 4),
+            "share": dict(zip(CATEGORIES[name], np.round(actual / actual.sum(), 4).tolist())),
+            "reference_share": dict(zip(CATEGORIES[name], np.round(expected / expected.sum(), 4).tolist())),
+            "status": _status(value),
+        }
+    worst = max(features, key=lambda name: features[name]["psi"])
+    return {
+        "rows": live.n,
+        "reference_rows": ref.n,
+        "status": features[worst]["status"],
+        "worst_feature": worst,
+        "features": features,
+    }
+
+
+class DriftMonitor:
+    """Thread-safe live sketch with batched updates and an optional reference."""
+
+    def __init__(self, ref: Optional[DriftSketch] = None, flush_rows: int = FLUSH_ROWS) -> None:
+        self.reference = ref
+        self.flush_rows = max(1, int(flush_rows))
+        self.sketch = DriftSketch.like(ref) if ref is not None else DriftSketch()
+        self._pending: List[np.ndarray] = []
+        self._pending_rows = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_path(cls, path: Optional[str | Path], flush_rows: int = FLUSH_ROWS) -> "DriftMonitor":
+        """Monitor against the reference at ``path`` (none if unset or missing)."""
+        ref = DriftSketch.load(path) if path and Path(path).exists() else None
+        return cls(ref, flush_rows)
+
+    def set_reference(self, ref: Optional[DriftSketch]) -> None:
+        """Compare against ``ref`` from now on; live counts survive if the layout matches."""
+        self.flush()
+        with self._lock:
+            self.reference = ref
+            template = ref if ref is not None else DriftSketch()
+            if not template.same_layout(self.sketch):
+                self.sketch = DriftSketch.like(template)
+
+    def observe(self, raw: Any) -> None:
+        """Queue raw rows (``RAW_FIELDS`` order); sketched once ``flush_rows`` are waiting."""
+        raw = np.asarray(raw, dtype=np.float64).reshape(-1, len(RAW_FIELDS))
+        with self._lock:
+            self._pending.append(raw)
+            self._pending_rows += len(raw)
+            if self._pending_rows < self.flush_rows:
+                return
+            self._fold()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._pending:
+                self._fold()
+
+    def _fold(self) -> None:
+        pending, self._pending, self._pending_rows = self._pending, [], 0
+        self.sketch.update(build_features(np.concatenate(pending), self.sketch.feature_order))
+
+    def snapshot(self) -> DriftSketch:
+        """Copy of the live sketch, including the queued rows."""
+        self.flush()
+        with self._lock:
+            return DriftSketch.from_dict(self.sketch.to_dict())
+
+    def report(self, include_sketch: bool = False) -> Dict[str, Any]:
+        live = self.snapshot()
+        report: Dict[str, Any] = (
+            compare(live, self.reference) if self.reference is not None
+            else {"rows": live.n, "reference_rows": None, "status": "no_reference", "features": {}}
+        )
+        if include_sketch:
+            report["sketch"] = live.to_dict()
+        return report
+
+    def reset(self) -> None:
+        with self._lock:
+            self.sketch = DriftSketch.like(self.sketch)
+            self._pending, self._pending_rows = [], 0
+
+
+def main(argv: Any = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare live drift sketches against the training reference")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compare_parser = commands.add_parser("compare", help="Merge live snapshots and report PSI / KS per feature")
+    compare_parser.add_argument("reference", help="drift_reference.json from the pipeline")
+    compare_parser.add_argument("live", nargs="+", help="Snapshots (the 'sketch' of a drift report, or a sketch file)")
+    compare_parser.add_argument("--min-rows", type=int, default=MIN_ROWS)
+    args = parser.parse_args(argv)
+
+    ref = DriftSketch.load(args.reference)
+    merged = DriftSketch.like(ref)
+    for path in args.live:
+        with open(path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+        merged.merge(DriftSketch.from_dict(data.get("sketch", data)))
+    print(json.dumps(compare(merged, ref, args.min_rows), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Per-feature explanations of forest predictions (tree path contributions).
+
+Every split a row passes through moves P(class 1) of its tree from the
+parent node's value to the child's; that step is credited to the split
+feature. Summed over the path and averaged over the trees this gives the
+exact decomposition (Saabas' path attribution)::
+
+    P(class 1) = base_value + sum(contributions)
+
+where ``base_value`` is the mean root value (the training positive rate)
+and ``contributions`` has one entry per model feature (scaled space, the
+one the trees split on). The per-node deltas are computed once per model
+version by ``PathExplainer`` (at load in ``cardio.registry``), so
+explaining a row is one walk of the forest, the same level-by-level
+traversal as ``CompiledForest.predict_proba``.
+
+Offline, ``explain_parallel`` explains a whole split in chunks in a process
+pool::
+
+    python -m cardio.explain rf_cardio_model.npz scaled_rows.npy --workers 4
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from cardio.compact import positive_values
+from cardio.features import FEATURE_ORDER, is_dummy
+from cardio.forest import CHUNK_ROWS, CompiledForest
+
+DEFAULT_TOP = 5
+
+
+def is_tree_ensemble(model: Any) -> bool:
+    """Whether ``forest_of`` can explain ``model`` (checked without building anything)."""
+    model = getattr(model, "forest", model)
+    return isinstance(model, CompiledForest) or hasattr(model, "estimators_")
+
+
+def forest_of(model: Any) -> CompiledForest:
+    """The tree ensemble behind ``model`` (a cascade explains its forest tier)."""
+    model = getattr(model, "forest", model)
+    if isinstance(model, CompiledForest):
+        return model
+    if hasattr(model, "estimators_"):
+        return CompiledForest.from_sklearn(model)
+    raise ValueError(f"Cannot explain a {type(model).__name__}: not a tree ensemble")
+
+
+class PathExplainer:
+    """Path contributions of a binary ``CompiledForest``, precomputed per node."""
+
+    def __init__(self, forest: CompiledForest, feature_order: Sequence[str] = FEATURE_ORDER) -> None:
+        if len(feature_order) != forest.n_features_in_:
+            raise ValueError(f"{len(feature_order)} feature names for a forest of {forest.n_features_in_} features")
+        self.forest = forest
+        self.feature_order = list(feature_order)
+        value = positive_values(forest)
+        internal = np.flatnonzero(~forest._is_leaf)
+        parent = np.arange(forest.n_nodes)
+        parent[forest.children_left[internal]] = internal
+        parent[forest.children_right[internal]] = internal
+        # Change of P(class 1) when entering a node (0 at the roots)
+        self.delta = value - value[parent]
+        self.base_value = float(value[forest.roots].mean())
+
+    @classmethod
+    def from_model(cls, model: Any, feature_order: Sequence[str] = FEATURE_ORDER) -> "PathExplainer":
+        return cls(forest_of(model), feature_order)
+
+    def explain(self, X: Any) -> Tuple[np.ndarray, np.ndarray]:
+        """(contributions (n, n_features), P(class 1) (n,)) for scaled rows ``X``."""
+        X = self.forest._check_input(X)
+        contributions = np.empty(X.shape, dtype=np.float64)
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            contributions[start:start + CHUNK_ROWS] = self._walk(X[start:start + CHUNK_ROWS])
+        return contributions, self.base_value + contributions.sum(axis=1)
+
+    def _walk(self, X: np.ndarray) -> np.ndarray:
+        forest = self.forest
+        n_rows, n_features = X.shape
+        flat_x = X.ravel()
+        node = np.tile(forest.roots, n_rows)
+        slot = np.repeat(np.arange(n_rows, dtype=np.intp) * n_features, forest.n_estimators)
+        totals = np.zeros(n_rows * n_features)
+        while node.size:
+            split = slot + forest.feature.take(node)
+            go_right = flat_x.take(split) > forest.threshold.take(node)
+            node = np.where(go_right, forest.children_right.take(node), forest.children_left.take(node))
+            totals += np.bincount(split, weights=self.delta.take(node), minlength=totals.size)
+            pending = ~forest._is_leaf.take(node)
+            node, slot = node[pending], slot[pending]
+        return totals.reshape(n_rows, n_features) / forest.n_estimators
+
+    def describe(self, contributions: np.ndarray, X: Any = None, top: int = DEFAULT_TOP) -> List[Dict[str, Any]]:
+        """JSON-ready explanation per row; ``X`` (unscaled) adds the input values."""
+        rows = []
+        for i, row in enumerate(np.asarray(contributions)):
+            order = np.argsort(-np.abs(row))[:top]
+            rows.append({
+                "base_value": self.base_value,
+                "contributions": dict(zip(self.feature_order, row.tolist())),
+                "grouped": group_contributions(row, self.feature_order),
+                "top": [
+                    {
+                        "feature": self.feature_order[j],
+                        "contribution": float(row[j]),
+                        **({"value": float(X[i, j])} if X is not None else {}),
+                    }
+                    for j in order
+                ],
+            })
+        return rows
+
+
+def group_contributions(row: Any, feature_order: Sequence[str] = FEATURE_ORDER) -> Dict[str, float]:
+    """One value per input: dummy columns (``cholesterol_2``, ``age_cat_45-60`` ...) summed."""
+    grouped: Dict[str, float] = {}
+    for name, value in zip(feature_order, np.asarray(row).tolist()):
+        key = name.rsplit("_", 1)[0] if is_dummy(name) else name
+        grouped[key] = grouped.get(key, 0.0) + value
+    return grouped
+
+
+# Explainer of the current worker process (see _init_worker)
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(explainer: PathExplainer) -> None:
+    _worker["explainer"] = explainer
+
+
+def _explain_chunk(X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    return _worker["explainer"].explain(X)
+
+
+def explain_parallel(
+    explainer: PathExplainer,
+    X: Any,
+    workers: Optional[int] = None,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """``explainer.explain(X)`` split into chunks over ``workers`` processes (0 = in-process)."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    X = np.asarray(X, dtype=np.float64)
+    chunks = [X[start:start + chunk_rows] for start in range(0, len(X), chunk_rows)]
+    if workers <= 0 or len(chunks) <= 1:
+        return explainer.explain(X)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(explainer,)) as pool:
+        results = list(pool.map(_explain_chunk, chunks))
+    return np.concatenate([c for c, _ in results]), np.concatenate([p for _, p in results])
+
+
+def summarize(explainer: PathExplainer, contributions: np.ndarray) -> Dict[str, Any]:
+    """Mean |contribution| per feature, largest first (a global importance)."""
+    mean_abs = np.abs(contributions).mean(axis=0) if len(contributions) else np.zeros(len(explainer.feature_order))
+    order = np.argsort(-mean_abs)
+    return {
+        "rows": len(contributions),
+        "base_value": explainer.base_value,
+        "mean_abs": {explainer.feature_order[j]: round(float(mean_abs[j]), 6) for j in order},
+    }
+
+
+def main(argv: Any = None) -> None:
+    from cardio.forest import load_model
+
+    parser = argparse.ArgumentParser(description="Explain forest predictions with path contributions")
+    parser.add_argument("model", help="Forest artifact (.joblib or .npz)")
+    parser.add_argument("rows", help=".npy of scaled feature rows (n, 18)")
+    parser.add_argument("--backend", default="compiled", choices=("sklearn", "compiled"))
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: CPU count, 0 = in-process)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--out", default=None, help="Write the (n, 18) contributions to this .npy")
+    args = parser.parse_args(argv)
+
+    explainer = PathExplainer.from_model(load_model(args.model, args.backend))
+    contributions, _ = explain_parallel(explainer, np.load(args.rows), args.workers, args.chunk_rows)
+    if args.out:
+        np.save(args.out, contributions)
+    print(json.dumps(summarize(explainer, contributions), indent=2))
+
+
+if __name__ == "__main__":
+    main()
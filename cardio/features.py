@@ -0,0 +1,168 @@
+"""Feature engineering shared by training, batch scoring and serving.
+
+The column layout comes from ``features.json`` (written by CELL 10 of
+``cardio_pipeline.py``); every column is computed with NumPy from the 11 raw
+inputs so one row and a whole batch go through the same code. The result
+matches the pandas ``pd.cut`` / ``pd.get_dummies(drop_first=True)`` encoding
+used during training.
+"""
+from __future__ import annotations
+
+import functools
+import json
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Sequence
+
+import numpy as np
+
+FEATURES_PATH = Path(__file__).with_name("features.json")
+
+# Raw inputs in the order build_features expects them (age in years)
+RAW_FIELDS = (
+    "age",
+    "gender",
+    "height",
+    "weight",
+    "ap_hi",
+    "ap_lo",
+    "cholesterol",
+    "gluc",
+    "smoke",
+    "alco",
+    "active",
+)
+
+# pd.cut(age_years, bins=AGE_BINS, labels=AGE_LABELS), right-closed
+AGE_BINS = (0, 30, 45, 60, 200)
+AGE_LABELS = ("<30", "30-45", "45-60", "60+")
+
+# One-hot encoded columns are left unscaled
+DUMMY_PREFIXES = ("cholesterol_", "gluc_", "age_cat_")
+
+# Outlier filter of the training data (CELL 4), inclusive bounds
+CLEAN_LIMITS = {
+    "ap_hi": (60, 250),
+    "ap_lo": (40, 180),
+    "height": (130, 220),
+    "weight": (30, 250),
+}
+DAYS_PER_YEAR = 365
+
+
+def load_feature_order(path: str | Path = FEATURES_PATH) -> List[str]:
+    with Path(path).open("r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+FEATURE_ORDER = load_feature_order()
+
+
+def is_dummy(name: str) -> bool:
+    return name.startswith(DUMMY_PREFIXES)
+
+
+NUMERIC_FEATURES = [name for name in FEATURE_ORDER if not is_dummy(name)]
+DUMMY_FEATURES = [name for name in FEATURE_ORDER if is_dummy(name)]
+
+
+def _age_bin(label: str) -> Callable[[Dict[str, np.ndarray]], np.ndarray]:
+    k = AGE_LABELS.index(label)
+    low, high = AGE_BINS[k], AGE_BINS[k + 1]
+    return lambda cols: (cols["age"] > low) & (cols["age"] <= high)
+
+
+def _column(name: str) -> Callable[[Dict[str, np.ndarray]], np.ndarray]:
+    direct = {"height", "weight", "ap_hi", "ap_lo", "smoke", "alco", "active"}
+    if name in direct:
+        return lambda cols: cols[name]
+    if name == "age_years":
+        return lambda cols: cols["age"]
+    if name == "bmi":
+        return lambda cols: cols["weight"] / ((cols["height"] / 100) ** 2)
+    if name == "bp_diff":
+        return lambda cols: cols["ap_hi"] - cols["ap_lo"]
+    if name == "gender_male":
+        return lambda cols: cols["gender"] == 2
+    if name.startswith("age_cat_"):
+        return _age_bin(name[len("age_cat_"):])
+    for field in ("cholesterol", "gluc"):
+        if name.startswith(field + "_"):
+            level = float(name[len(field) + 1:])
+            return lambda cols, field=field: cols[field] == level
+    # Unknown columns are filled with zeros, like the old reindex
+    return lambda cols: np.zeros_like(cols["age"])
+
+
+@functools.lru_cache(maxsize=8)
+def _compile(feature_order: tuple) -> tuple:
+    return tuple(_column(name) for name in feature_order)
+
+
+def age_years_from_days(days: Any) -> np.ndarray:
+    """Whole years from the Kaggle ``age`` column (days), truncated like ``astype(int)``."""
+    return (np.asarray(days, dtype=np.float64) / DAYS_PER_YEAR).astype(np.int64)
+
+
+def clean_mask(columns: Mapping[str, Any], limits: Mapping[str, Sequence[float]] = CLEAN_LIMITS) -> np.ndarray:
+    """Boolean mask of the rows kept by the training outlier filter."""
+    mask = None
+    for name, (low, high) in limits.items():
+        values = np.asarray(columns[name], dtype=np.float64)
+        keep = (values >= low) & (values <= high)
+        mask = keep if mask is None else mask & keep
+    return mask
+
+
+def raw_from_columns(columns: Mapping[str, Any], age: str = "age") -> np.ndarray:
+    """Stack the raw input columns of a DataFrame / mapping into (n, 11).
+
+    ``age`` names the column holding age in years (``age_years`` in the
+    training data, where ``age`` is in days).
+    """
+    return np.column_stack([
+        np.asarray(columns[age if field == "age" else field], dtype=np.float64)
+        for field in RAW_FIELDS
+    ])
+
+
+def build_features(raw: Any, feature_order: Sequence[str] = FEATURE_ORDER) -> np.ndarray:
+    """Turn raw inputs (n, 11) in RAW_FIELDS order into the model layout.
+
+    A single row may be passed as a 1-D array. Returns an unscaled float64
+    matrix with one column per entry of ``feature_order``.
+    """
+    raw = np.asarray(raw, dtype=np.float64)
+    if raw.ndim == 1:
+        raw = raw[np.newaxis, :]
+    if raw.shape[1] != len(RAW_FIELDS):
+        raise ValueError(f"Expected {len(RAW_FIELDS)} raw fields, got {raw.shape[1]}")
+
+    cols = {field: raw[:, i] for i, field in enumerate(RAW_FIELDS)}
+    columns = _compile(tuple(feature_order))
+    X = np.empty((raw.shape[0], len(columns)), dtype=np.float64)
+    for j, column in enumerate(columns):
+        X[:, j] = column(cols)
+    return X
+
+
+def scale_features(X: np.ndarray, scaler: Any, feature_order: Sequence[str] = FEATURE_ORDER) -> np.ndarray:
+    """Standardise the numeric columns of X in a copy; dummies stay 0/1.
+
+    Uses the scaler's ``mean_`` / ``scale_`` directly (the same arithmetic as
+    ``StandardScaler.transform``) and falls back to ``transform`` otherwise.
+    """
+    names = getattr(scaler, "feature_names_in_", None)
+    names = list(names) if names is not None else [n for n in feature_order if not is_dummy(n)]
+    index = [list(feature_order).index(name) for name in names]
+
+    scaled = np.array(X, dtype=np.float64)
+    block = scaled[:, index]
+    if hasattr(scaler, "mean_") or hasattr(scaler, "scale_"):
+        if getattr(scaler, "with_mean", True) and getattr(scaler, "mean_", None) is not None:
+            block -= scaler.mean_
+        if getattr(scaler, "with_std", True) and getattr(scaler, "scale_", None) is not None:
+            block /= scaler.scale_
+    else:
+        block = scaler.transform(block)
+    scaled[:, index] = block
+    return scaled
@@ -0,0 +1,302 @@
+"""Array-backed inference engine for the RandomForest cardio model.
+
+``CompiledForest.from_sklearn`` flattens every tree of a fitted
+``RandomForestClassifier`` into a handful of contiguous NumPy arrays (leaves
+point back to themselves). All trees are walked level by level for the whole
+batch at once, and the label and probability come out of one pass.
+Only NumPy is needed to load and run an exported forest.
+"""
+from __future__ import annotations
+
+import argparse
+import struct
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+# Rows walked at once; bounds the (rows, trees) index matrices.
+CHUNK_ROWS = 4096
+
+
+class CompiledForest:
+    """Flattened tree ensemble with a vectorized traversal engine."""
+
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        children_left: np.ndarray,
+        children_right: np.ndarray,
+        value: np.ndarray,
+        roots: np.ndarray,
+        max_depth: int,
+        classes: np.ndarray,
+        n_features: int,
+    ) -> None:
+        self.feature = feature
+        self.threshold = threshold
+        self.children_left = children_left
+        self.children_right = children_right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.classes_ = classes
+        self.n_features_in_ = int(n_features)
+        self._is_leaf = children_left == np.arange(len(children_left))
+
+    @property
+    def n_estimators(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    @classmethod
+    def from_sklearn(cls, model: Any) -> "CompiledForest":
+        """Flatten a fitted ``RandomForestClassifier`` into contiguous arrays."""
+        trees = [est.tree_ for est in model.estimators_]
+        sizes = np.array([tree.node_count for tree in trees], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        n_nodes = int(sizes.sum())
+        n_classes = len(model.classes_)
+
+        feature = np.empty(n_nodes, dtype=np.int32)
+        threshold = np.empty(n_nodes, dtype=np.float64)
+        left = np.empty(n_nodes, dtype=np.int32)
+        right = np.empty(n_nodes, dtype=np.int32)
+        value = np.empty((n_nodes, n_classes), dtype=np.float64)
+
+        for tree, offset, size in zip(trees, offsets, sizes):
+            span = slice(offset, offset + size)
+            local = np.arange(size)
+            is_leaf = tree.children_left == -1
+
+            feature[span] = np.where(is_leaf, 0, tree.feature)
+            threshold[span] = np.where(is_leaf, np.inf, tree.threshold)
+            left[span] = np.where(is_leaf, local, tree.children_left) + offset
+            right[span] = np.where(is_leaf, local, tree.children_right) + offset
+
+            # Same normalisation as DecisionTreeClassifier.predict_proba
+            proba = tree.value[:, 0, :n_classes]
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            value[span] = proba / normalizer
+
+        return cls(
+            feature=feature,
+            threshold=threshold,
+            children_left=left,
+            children_right=right,
+            value=value,
+            roots=offsets.astype(np.int32),
+            max_depth=max(tree.max_depth for tree in trees),
+            classes=np.asarray(model.classes_),
+            n_features=model.n_features_in_,
+        )
+
+    def _check_input(self, X: Any) -> np.ndarray:
+        # Trees compare float32 features, exactly like sklearn's predict
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"Expected input of shape (n, {self.n_features_in_}), got {X.shape}"
+            )
+        return X
+
+    def apply(self, X: Any) -> np.ndarray:
+        """Return the global leaf index reached in every tree, shape (n, n_trees)."""
+        X = self._check_input(X)
+        leaves = np.empty((X.shape[0], self.n_estimators), dtype=self.roots.dtype)
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            leaves[start:start + CHUNK_ROWS] = self._walk(X[start:start + CHUNK_ROWS])
+        return leaves
+
+    def _walk(self, X: np.ndarray) -> np.ndarray:
+        # Walk every (row, tree) pair one level at a time, dropping pairs
+        # as soon as they land on a leaf.
+        n_rows, n_features = X.shape
+        flat_x = X.ravel()
+        node = np.tile(self.roots, n_rows)
+        leaves = node.copy()
+        active = np.arange(node.size, dtype=np.intp)
+        row_base = (active // self.n_estimators) * n_features
+        while active.size:
+            x = flat_x.take(row_base + self.feature.take(node))
+            go_right = x > self.threshold.take(node)
+            node = np.where(go_right, self.children_right.take(node), self.children_left.take(node))
+            done = self._is_leaf.take(node)
+            if done.any():
+                leaves[active[done]] = node[done]
+                pending = ~done
+                active, row_base, node = active[pending], row_base[pending], node[pending]
+        return leaves.reshape(n_rows, self.n_estimators)
+
+    def predict_proba(self, X: Any) -> np.ndarray:
+        X = self._check_input(X)
+        proba = np.empty((X.shape[0], self.value.shape[1]), dtype=np.float64)
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            leaves = self._walk(X[start:start + CHUNK_ROWS])
+            # Accumulate tree by tree like sklearn, then average
+            summed = np.cumsum(self.value[leaves], axis=1, dtype=np.float64)[:, -1]
+            proba[start:start + CHUNK_ROWS] = summed / self.n_estimators
+        if self.value.shape[1] == 1 and len(self.classes_) == 2:
+            # Compacted binary forest (cardio.compact): only P(class 1) is stored
+            return np.column_stack([1.0 - proba[:, 0], proba[:, 0]])
+        return proba
+
+    def predict_with_proba(self, X: Any) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (labels, class probabilities) from a single traversal."""
+        proba = self.predict_proba(X)
+        return self.classes_.take(np.argmax(proba, axis=1)), proba
+
+    def predict(self, X: Any) -> np.ndarray:
+        return self.predict_with_proba(X)[0]
+
+    def save(self, path: str | Path) -> None:
+        """Write the forest to an uncompressed ``.npz`` archive."""
+        np.savez(
+            path,
+            feature=self.feature,
+            threshold=self.threshold,
+            children_left=self.children_left,
+            children_right=self.children_right,
+            value=self.value,
+            roots=self.roots,
+            max_depth=np.int64(self.max_depth),
+            classes=self.classes_,
+            n_features=np.int64(self.n_features_in_),
+        )
+
+    @classmethod
+    def load(cls, path: str | Path, mmap_mode: Optional[str] = None) -> "CompiledForest":
+        """Load an exported forest; ``mmap_mode="r"`` maps the arrays from disk."""
+        arrays = _load_npz(path, mmap_mode)
+        return cls(
+            feature=arrays["feature"],
+            threshold=arrays["threshold"],
+            children_left=arrays["children_left"],
+            children_right=arrays["children_right"],
+            value=arrays["value"],
+            roots=arrays["roots"],
+            max_depth=int(arrays["max_depth"]),
+            classes=arrays["classes"],
+            n_features=int(arrays["n_features"]),
+        )
+
+
+def _load_npz(path: str | Path, mmap_mode: Optional[str] = None) -> Dict[str, np.ndarray]:
+    if mmap_mode is None:
+        with np.load(path, allow_pickle=False) as data:
+            return {name: data[name] for name in data.files}
+
+    # np.load cannot map archive members, but members written by np.savez
+    # are stored uncompressed, so each one is a plain .npy at some offset.
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as fh:
+        for info in archive.infolist():
+            name = info.filename[:-len(".npy")]
+            if info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member, allow_pickle=False)
+                continue
+            fh.seek(info.header_offset + 26)
+            name_len, extra_len = struct.unpack("<HH", fh.read(4))
+            fh.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(fh)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(fh)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(fh)
+            if not shape:
+                arrays[name] = np.fromfile(fh, dtype=dtype, count=1).reshape(())
+                continue
+            arrays[name] = np.memmap(
+                path,
+                dtype=dtype,
+                mode=mmap_mode,
+                offset=fh.tell(),
+                shape=shape,
+                order="F" if fortran_order else "C",
+            )
+    return arrays
+
+
+def predict_with_proba(model: Any, X: Any) -> Tuple[np.ndarray, np.ndarray]:
+    """Labels and class probabilities from either backend."""
+    if hasattr(model, "predict_with_proba"):
+        return model.predict_with_proba(X)
+    proba = model.predict_proba(X)
+    return model.classes_.take(np.argmax(proba, axis=1)), proba
+
+
+def load_model(path: str | Path, backend: str = "sklearn", mmap_mode: Optional[str] = None) -> Any:
+    """Load a model artifact for the requested backend.
+
+    ``.npz`` files are compiled exports; joblib artifacts are compiled on
+    the fly when ``backend == "compiled"``. ``mmap_mode`` is passed through
+    to the loader so large arrays can stay on disk.
+    """
+    if str(path).endswith(".npz"):
+        return CompiledForest.load(path, mmap_mode=mmap_mode)
+
+    import joblib
+
+    model = joblib.load(path, mmap_mode=mmap_mode)
+    if backend == "compiled":
+        return CompiledForest.from_sklearn(model)
+    return model
+
+
+def check_parity(model: Any, compiled: CompiledForest, X: Any) -> Dict[str, float]:
+    """Compare a compiled forest against the sklearn model on X."""
+    X = np.asarray(X, dtype=np.float64)
+    sk_labels = model.predict(X)
+    sk_proba = model.predict_proba(X)
+    labels, proba = compiled.predict_with_proba(X)
+    return {
+        "rows": int(X.shape[0]),
+        "label_mismatches": int(np.count_nonzero(sk_labels != labels)),
+        "max_proba_diff": float(np.max(np.abs(sk_proba - proba), initial=0.0)),
+    }
+
+
+def validation_split(labels: Any, fraction: float = 0.5, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Disjoint (tune, report) row indices of held-out rows, stratified by label.
+
+    Whatever is chosen on the tune rows (a compaction point, a cascade band)
+    is reported on the other rows, so the reported numbers are not biased
+    by the choice.
+    """
+    labels = np.asarray(labels)
+    if not 0.0 < fraction < 1.0:
+        raise ValueError(f"fraction must be in (0, 1), got {fraction}")
+    rng = np.random.default_rng(seed)
+    tune = [
+        rng.permutation(rows)[:int(round(len(rows) * fraction))]
+        for rows in (np.flatnonzero(labels == label) for label in np.unique(labels))
+    ]
+    tune_rows = np.sort(np.concatenate(tune))
+    return tune_rows, np.setdiff1d(np.arange(len(labels)), tune_rows)
+
+
+def main(argv: Any = None) -> None:
+    parser = argparse.ArgumentParser(description="Export a RandomForest joblib artifact to arrays")
+    parser.add_argument("model", help="Path to rf_cardio_model.joblib")
+    parser.add_argument("output", help="Destination .npz file")
+    args = parser.parse_args(argv)
+
+    import joblib
+
+    compiled = CompiledForest.from_sklearn(joblib.load(args.model))
+    compiled.save(args.output)
+    print(
+        f"Exported {compiled.n_estimators} trees / {compiled.n_nodes} nodes "
+        f"(max depth {compiled.max_depth}) to {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""Threaded HTTP/1.1 server for ``BaseHTTPRequestHandler`` classes.
+
+Runs ``api/predict.py``'s ``handler`` outside Vercel::
+
+    python -m cardio.httpserver --port 8000 --workers 16
+
+Connections are served by a fixed pool of ``workers`` threads and stay
+open between requests (keep-alive) until they are idle for
+``keepalive`` seconds. At most ``workers + backlog`` connections are
+admitted; beyond that a connection gets ``503 Service Unavailable`` with
+``Retry-After`` straight from the accept loop, without touching the pool.
+While connections are queued, workers close keep-alive connections after
+the current response so queued clients get a turn.
+
+SIGTERM / SIGINT stop accepting, close idle connections, let in-flight
+requests finish (up to ``--drain-timeout`` seconds) and exit.
+
+Scoring holds the GIL, so one process tops out at one core; ``--processes``
+forks that many servers accepting on the same port (each loads its model).
+"""
+from __future__ import annotations
+
+import argparse
+import importlib
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from cardio.predlog import close_all as close_prediction_logs
+from cardio.timing import METRICS
+
+# A worker holds one connection for its keep-alive lifetime, mostly idle,
+# so the pool is sized for connections rather than cores
+DEFAULT_WORKERS = 32
+DEFAULT_BACKLOG = 64
+DEFAULT_KEEPALIVE = 5.0
+DEFAULT_DRAIN_TIMEOUT = 10.0
+
+_BUSY_BODY = b'{"status": "error", "message": "Server is busy, retry later"}'
+BUSY_RESPONSE = (
+    b"HTTP/1.1 503 Service Unavailable\r\n"
+    b"Content-Type: application/json\r\n"
+    b"Access-Control-Allow-Origin: *\r\n"
+    b"Retry-After: 1\r\n"
+    b"Connection: close\r\n"
+    b"Content-Length: " + str(len(_BUSY_BODY)).encode("ascii") + b"\r\n\r\n" + _BUSY_BODY
+)
+
+
+def keepalive_handler(handler_class: Type[BaseHTTPRequestHandler], idle_timeout: float) -> Type[BaseHTTPRequestHandler]:
+    """``handler_class`` speaking HTTP/1.1 with persistent connections.
+
+    A response sent without ``Content-Length`` can only end at connection
+    close, so such responses (and every response while the server is
+    draining or has connections queued) carry ``Connection: close``.
+    """
+
+    class KeepAliveHandler(handler_class):  # type: ignore[valid-type, misc]
+        protocol_version = "HTTP/1.1"
+        timeout = idle_timeout
+        # Headers and body are separate writes; with Nagle the body waits for
+        # the client's delayed ACK (~40 ms) on every keep-alive response
+        disable_nagle_algorithm = True
+        _length_sent = False
+
+        def handle_one_request(self) -> None:
+            self.server.mark(self.connection, busy=False)
+            super().handle_one_request()
+
+        def parse_request(self) -> bool:
+            self.server.mark(self.connection, busy=True)
+            self.server.count_request()
+            return super().parse_request()
+
+        def send_header(self, keyword: str, value: str) -> None:
+            if keyword.lower() == "content-length":
+                self._length_sent = True
+            super().send_header(keyword, value)
+
+        def end_headers(self) -> None:
+            if not self.close_connection and (not self._length_sent or self.server.should_close()):
+                super().send_header("Connection", "close")
+            self._length_sent = False
+            super().end_headers()
+
+    KeepAliveHandler.__name__ = KeepAliveHandler.__qualname__ = f"KeepAlive{handler_class.__name__}"
+    return KeepAliveHandler
+
+
+class PooledHTTPServer(HTTPServer):
+    """``HTTPServer`` with a bounded worker pool, 503 backpressure and draining."""
+
+    request_queue_size = 128  # listen() backlog of the accepting socket
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        handler_class: Type[BaseHTTPRequestHandler],
+        workers: int = DEFAULT_WORKERS,
+        backlog: int = DEFAULT_BACKLOG,
+        keepalive: float = DEFAULT_KEEPALIVE,
+        listener: Optional[socket.socket] = None,
+    ) -> None:
+        if workers < 1:
+            raise ValueError(f"workers must be >= 1, got {workers}")
+        super().__init__(address, keepalive_handler(handler_class, keepalive), bind_and_activate=listener is None)
+        if listener is not None:
+            # Pre-forked: every process accepts on the socket bound by the parent
+            self.socket.close()
+            self.socket = listener
+            self.server_address = listener.getsockname()
+        self.workers = workers
+        self.max_connections = workers + max(0, backlog)
+        self.draining = False
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http-worker")
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        # Open connection -> True while a request on it is being handled
+        self._connections: Dict[socket.socket, bool] = {}
+        self.accepted = self.rejected = self.requests = 0
+
+    # --- admission ---
+    def process_request(self, request: socket.socket, client_address: Any) -> None:
+        with self._lock:
+            admit = not self.draining and len(self._connections) < self.max_connections
+            if admit:
+                self._connections[request] = False
+                self.accepted += 1
+            else:
+                self.rejected += 1
+        if not admit:
+            METRICS.inc("connections", endpoint="server", outcome="rejected")
+            self._reject(request)
+            return
+        METRICS.inc("connections", endpoint="server", outcome="accepted")
+        self._pool.submit(self._serve, request, client_address)
+
+    def _reject(self, request: socket.socket) -> None:
+        try:
+            request.settimeout(0.05)
+            # Read what the client already sent, otherwise close() resets the
+            # connection and the client may never see the 503
+            request.recv(65536)
+        except OSError:
+            pass
+        try:
+            request.sendall(BUSY_RESPONSE)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def _serve(self, request: socket.socket, client_address: Any) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._lock:
+                self._connections.pop(request, None)
+                self._idle.notify_all()
+
+    # --- called by the handler ---
+    def mark(self, connection: socket.socket, busy: bool) -> None:
+        with self._lock:
+            if connection in self._connections:
+                self._connections[connection] = busy
+
+    def count_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def should_close(self) -> bool:
+        """Close after this response: draining, or queued connections wait for a worker."""
+        return self.draining or len(self._connections) > self.workers
+
+    # --- shutdown ---
+    def drain(self, timeout: float = DEFAULT_DRAIN_TIMEOUT) -> bool:
+        """Stop admitting, close idle connections and wait for in-flight requests.
+
+        Call after ``shutdown()``. Returns False if requests were still
+        running when ``timeout`` expired.
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self.draining = True
+            idle = [conn for conn, busy in self._connections.items() if not busy]
+        for conn in idle:
+            try:
+                # Wakes the worker blocked reading the next request line
+                conn.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+        with self._lock:
+            while self._connections:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._idle.wait(remaining)
+            drained = not self._connections
+        self._pool.shutdown(wait=drained, cancel_futures=True)
+        return drained
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            busy = sum(self._connections.values())
+            return {
+                "workers": self.workers,
+                "max_connections": self.max_connections,
+                "open_connections": len(self._connections),
+                "busy_connections": busy,
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "requests": self.requests,
+                "draining": self.draining,
+            }
+
+
+def load_handler(spec: str, app_dir: Optional[str] = None) -> Type[BaseHTTPRequestHandler]:
+    """``module:attribute`` (e.g. ``predict:handler``) imported from ``app_dir``."""
+    module_name, _, attribute = spec.partition(":")
+    if app_dir:
+        sys.path.insert(0, str(Path(app_dir).resolve()))
+    handler_class = getattr(importlib.import_module(module_name), attribute or "handler")
+    if not (isinstance(handler_class, type) and issubclass(handler_class, BaseHTTPRequestHandler)):
+        raise ValueError(f"{spec} is not a BaseHTTPRequestHandler subclass")
+    return handler_class
+
+
+def stop_on_signals() -> threading.Event:
+    """Event set by SIGTERM / SIGINT."""
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+    return stop
+
+
+def serve(
+    server: PooledHTTPServer,
+    drain_timeout: float = DEFAULT_DRAIN_TIMEOUT,
+    stop: Optional[threading.Event] = None,
+) -> bool:
+    """Serve until ``stop`` (default: SIGTERM / SIGINT), then drain; returns ``drain()``'s result."""
+    stop = stop or stop_on_signals()
+    thread = threading.Thread(target=server.serve_forever, name="http-accept", daemon=True)
+    thread.start()
+    stop.wait()
+    server.shutdown()
+    drained = server.drain(drain_timeout)
+    server.server_close()
+    return drained
+
+
+def _run(args: argparse.Namespace, listener: Optional[socket.socket] = None) -> int:
+    # Before the (slow) handler import, so an early SIGTERM still drains
+    stop = stop_on_signals()
+    # Imported here so every pre-forked process loads its own model
+    handler_class = load_handler(args.handler, args.app_dir)
+    if args.quiet:
+        handler_class.log_message = lambda *_: None  # type: ignore[method-assign]
+    server = PooledHTTPServer(
+        (args.host, args.port), handler_class, args.workers, args.backlog, args.keepalive, listener
+    )
+    print(f"[{os.getpid()}] Serving {args.handler} at http://{args.host}:{server.server_address[1]} "
+          f"({args.workers} workers, {server.max_connections} connections max)", flush=True)
+    drained = serve(server, args.drain_timeout, stop)
+    # Pre-forked children leave through os._exit, which skips atexit hooks
+    close_prediction_logs()
+    print(f"[{os.getpid()}] Stopped: {server.stats()}", flush=True)
+    return 0 if drained else 1
+
+
+def prefork(args: argparse.Namespace) -> int:
+    """Bind once, fork ``args.processes`` servers and forward SIGTERM / SIGINT to them."""
+    listener = socket.create_server((args.host, args.port), backlog=PooledHTTPServer.request_queue_size)
+    children: List[int] = []
+
+    def forward(signum: int, _frame: Any) -> None:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, forward)
+    for _ in range(args.processes):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = _run(args, listener)
+            finally:
+                os._exit(code)
+        children.append(pid)
+    listener.close()
+    code = 0
+    for pid in children:
+        _, status = os.waitpid(pid, 0)
+        code = code or os.waitstatus_to_exitcode(status)
+    return code
+
+
+def main(argv: Any = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve a BaseHTTPRequestHandler with keep-alive and a worker pool")
+    parser.add_argument("--handler", default="predict:handler", help="module:attribute of the handler class")
+    parser.add_argument("--app-dir", default=str(Path(__file__).resolve().parent.parent / "api"))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Threads (= open connections) per process")
+    parser.add_argument("--processes", type=int, default=1, help="Pre-forked processes sharing the port (one per core)")
+    parser.add_argument("--backlog", type=int, default=DEFAULT_BACKLOG, help="Connections queued beyond the workers before 503")
+    parser.add_argument("--keepalive", type=float, default=DEFAULT_KEEPALIVE, help="Idle seconds before a connection is closed")
+    parser.add_argument("--drain-timeout", type=float, default=DEFAULT_DRAIN_TIMEOUT)
+    parser.add_argument("--quiet", action="store_true", help="No access log")
+    args = parser.parse_args(argv)
+
+    code = prefork(args) if args.processes > 1 else _run(args)
+    if code:
+        raise SystemExit(code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,469 @@
+"""Training pipeline of ``cardio_pipeline.py`` as a memoized stage DAG.
+
+Stages (dependencies in brackets)::
+
+    load -> clean -> engineer -> split -> scale -> lr, rf, grid
+    rf -> importance, shap, save          [save also needs scale, engineer]
+    rf -> explain                         [needs scale]
+    rf -> compact                         [needs split, scale]
+    lr, rf -> cascade                     [needs split, scale]
+    split -> drift
+
+Every stage's output is cached in ``--cache-dir`` keyed on its code (with
+the helpers and ``cardio`` modules it calls and, for stages that fit or split,
+the scikit-learn version), its parameters and its inputs, so e.g.
+``--set rf.n_estimators=300`` retrains only the forest and what depends on
+it. ``grid``, ``shap``, ``compact`` and
+``cascade`` are run only when asked for. ``drift`` writes the training
+reference the services compare live inputs against (``cardio.drift``), and
+``explain`` computes path contributions (``cardio.explain``) for the whole
+test split, chunked over ``--jobs`` processes; ``shap`` is the slower
+sampled TreeSHAP alternative::
+
+    python -m cardio.pipeline --csv cardio_train.csv
+    python -m cardio.pipeline --csv cardio_train.csv --set rf.n_estimators=300
+    python -m cardio.pipeline --csv cardio_train.csv grid shap --dry-run
+    python -m cardio.pipeline --csv cardio_train.csv compact --set compact.tolerance=0.002
+"""
+from __future__ import annotations
+
+import argparse
+import ast
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from cardio.dag import Pipeline
+from cardio.dataset import file_sha256
+from cardio.features import (
+    CLEAN_LIMITS,
+    FEATURE_ORDER,
+    NUMERIC_FEATURES,
+    age_years_from_days,
+    build_features,
+    clean_mask,
+    is_dummy,
+    raw_from_columns,
+)
+
+DEFAULT_CACHE_DIR = Path(".cardio-cache")
+DEFAULT_TARGETS = ("lr", "rf", "importance", "explain", "save", "drift")
+# Stages whose output depends on how scikit-learn splits, scales or fits
+SKLEARN = ("scikit-learn",)
+
+
+def _metrics(model: Any, X_test: Any, y_test: Any) -> Dict[str, Any]:
+    from sklearn.metrics import accuracy_score, classification_report, f1_score, roc_auc_score
+
+    y_pred = model.predict(X_test)
+    metrics = {
+        "accuracy": float(accuracy_score(y_test, y_pred)),
+        "f1": float(f1_score(y_test, y_pred)),
+        "report": classification_report(y_test, y_pred),
+    }
+    if hasattr(model, "predict_proba"):
+        metrics["roc_auc"] = float(roc_auc_score(y_test, model.predict_proba(X_test)[:, 1]))
+    return metrics
+
+
+# --- stages ---
+def load(params: Dict[str, Any]) -> Any:
+    import pandas as pd
+
+    return pd.read_csv(params["csv_path"], sep=params["sep"])
+
+
+def clean(params: Dict[str, Any], load: Any) -> Any:
+    df = load[clean_mask(load, params["limits"])].copy()
+    df["age_years"] = age_years_from_days(df["age"])
+    return df
+
+
+def engineer(params: Dict[str, Any], clean: Any) -> Dict[str, Any]:
+    import pandas as pd
+
+    feature_order = list(params["feature_order"])
+    features = build_features(raw_from_columns(clean, age="age_years"), feature_order)
+    X = pd.DataFrame(features, columns=feature_order, index=clean.index)
+    dummies = [name for name in feature_order if is_dummy(name)]
+    X[dummies] = X[dummies].astype("int8")
+    return {"X": X, "y": clean["cardio"], "feature_order": feature_order}
+
+
+def split(params: Dict[str, Any], engineer: Dict[str, Any]) -> Dict[str, Any]:
+    from sklearn.model_selection import train_test_split
+
+    X, y = engineer["X"], engineer["y"]
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y,
+        test_size=params["test_size"],
+        random_state=params["random_state"],
+        stratify=y if params["stratify"] else None,
+    )
+    return {"X_train": X_train, "X_test": X_test, "y_train": y_train, "y_test": y_test}
+
+
+def scale(params: Dict[str, Any], split: Dict[str, Any]) -> Dict[str, Any]:
+    from sklearn.preprocessing import StandardScaler
+
+    X_train, X_test = split["X_train"], split["X_test"]
+    num_cols = [c for c in NUMERIC_FEATURES if c in X_train.columns]
+    scaler = StandardScaler()
+    # fit on train only
+    X_train_scaled = X_train.copy()
+    X_test_scaled = X_test.copy()
+    X_train_scaled[num_cols] = scaler.fit_transform(X_train[num_cols])
+    X_test_scaled[num_cols] = scaler.transform(X_test[num_cols])
+    return {"scaler": scaler, "X_train": X_train_scaled, "X_test": X_test_scaled}
+
+
+def lr(params: Dict[str, Any], split: Dict[str, Any], scale: Dict[str, Any]) -> Dict[str, Any]:
+    from sklearn.linear_model import LogisticRegression
+
+    model = LogisticRegression(max_iter=params["max_iter"])
+    model.fit(scale["X_train"], split["y_train"])
+    return {"model": model, "metrics": _metrics(model, scale["X_test"], split["y_test"])}
+
+
+def rf(params: Dict[str, Any], split: Dict[str, Any], scale: Dict[str, Any]) -> Dict[str, Any]:
+    from sklearn.ensemble import RandomForestClassifier
+
+    model = RandomForestClassifier(
+        n_estimators=params["n_estimators"],
+        max_depth=params["max_depth"],
+        min_samples_split=params["min_samples_split"],
+        random_state=params["random_state"],
+        n_jobs=params["n_jobs"],
+    )
+    model.fit(scale["X_train"], split["y_train"])
+    return {"model": model, "metrics": _metrics(model, scale["X_test"], split["y_test"])}
+
+
+def grid(params: Dict[str, Any], split: Dict[str, Any], scale: Dict[str, Any]) -> Dict[str, Any]:
+    from cardio.search import grid_search, halving_search
+
+    X_train, y_train = scale["X_train"], split["y_train"]
+    if params["method"] == "halving":
+        result = halving_search(
+            X_train, y_train, params["param_grid"],
+            cv=params["cv"],
+            scoring=params["scoring"],
+            factor=params["factor"],
+            random_state=params["random_state"],
+            n_jobs=params["n_jobs"],
+            log=lambda line: print(line, file=sys.stderr),
+        )
+        best_params, best_score, model = result.best_params, result.best_score, result.best_estimator
+    else:
+        gs = grid_search(
+            X_train, y_train, params["param_grid"],
+            cv=params["cv"],
+            scoring=params["scoring"],
+            random_state=params["random_state"],
+            n_jobs=params["n_jobs"],
+            verbose=params["verbose"],
+        )
+        best_params, best_score, model = gs.best_params_, gs.best_score_, gs.best_estimator_
+    return {
+        "best_params": best_params,
+        "best_score": float(best_score),
+        "model": model,
+        "metrics": _metrics(model, scale["X_test"], split["y_test"]),
+    }
+
+
+def importance(params: Dict[str, Any], rf: Dict[str, Any], engineer: Dict[str, Any]) -> Any:
+    import pandas as pd
+
+    model = rf["model"]
+    return pd.Series(model.feature_importances_, index=engineer["feature_order"]).sort_values(ascending=False)
+
+
+def shap(params: Dict[str, Any], rf: Dict[str, Any], scale: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        import shap as shap_lib
+    except ImportError as exc:
+        raise RuntimeError("The shap stage needs the shap package (pip install shap)") from exc
+
+    X_test = scale["X_test"]
+    # Sample subset for faster SHAP calculation
+    rng = np.random.default_rng(params["seed"])
+    rows = rng.choice(len(X_test), min(params["max_samples"], len(X_test)), replace=False)
+    X_shap = X_test.iloc[rows]
+    values = shap_lib.TreeExplainer(rf["model"]).shap_values(X_shap)
+    return {"index": X_shap.index.to_numpy(), "columns": list(X_shap.columns), "values": values}
+
+
+def explain(params: Dict[str, Any], rf: Dict[str, Any], scale: Dict[str, Any]) -> Dict[str, Any]:
+    from cardio.explain import PathExplainer, explain_parallel, summarize
+
+    X_test = scale["X_test"]
+    explainer = PathExplainer.from_model(rf["model"], list(X_test.columns))
+    workers = (os.cpu_count() or 1) if params["n_jobs"] < 0 else params["n_jobs"]
+    values, proba = explain_parallel(explainer, X_test.to_numpy(dtype=np.float64), workers, params["chunk_rows"])
+    # base_value + sum(contributions) must reproduce the forest exactly
+    max_diff = float(np.abs(proba - rf["model"].predict_proba(X_test)[:, 1]).max()) if len(X_test) else 0.0
+    return {
+        "index": X_test.index.to_numpy(),
+        "columns": list(X_test.columns),
+        "values": values,
+        "summary": {**summarize(explainer, values), "max_proba_diff": max_diff},
+    }
+
+
+def save(params: Dict[str, Any], rf: Dict[str, Any], scale: Dict[str, Any], engineer: Dict[str, Any]) -> Dict[str, Any]:
+    import joblib
+
+    from cardio.forest import CompiledForest, check_parity
+    from cardio.portable import export as export_bundle
+
+    out_dir = Path(params["out_dir"])
+    out_dir.mkdir(parents=True, exist_ok=True)
+    written = {}
+    joblib.dump(rf["model"], out_dir / "rf_cardio_model.joblib")
+    joblib.dump(scale["scaler"], out_dir / "scaler_cardio.joblib")
+    with (out_dir / "features.json").open("w", encoding="utf-8") as fh:
+        json.dump(engineer["feature_order"], fh, ensure_ascii=False, indent=2)
+    # Array-backed export for MODEL_BACKEND=compiled, checked against sklearn on the test split
+    compiled = CompiledForest.from_sklearn(rf["model"])
+    parity = check_parity(rf["model"], compiled, scale["X_test"])
+    if parity["label_mismatches"] == 0 and parity["max_proba_diff"] <= 1e-12:
+        compiled.save(out_dir / "rf_cardio_model.npz")
+        # NumPy-only bundle (forest + scaler + feature order) for serving without sklearn
+        export_bundle(compiled, scale["scaler"], out_dir / "cardio_model.cardio", engineer["feature_order"])
+    else:
+        (out_dir / "rf_cardio_model.npz").unlink(missing_ok=True)
+        (out_dir / "cardio_model.cardio").unlink(missing_ok=True)
+    for name in ("rf_cardio_model.joblib", "scaler_cardio.joblib", "features.json", "rf_cardio_model.npz", "cardio_model.cardio"):
+        path = out_dir / name
+        if path.exists():
+            written[str(path)] = file_sha256(path)
+    return {"written": written, "parity": parity}
+
+
+def compact(params: Dict[str, Any], rf: Dict[str, Any], split: Dict[str, Any], scale: Dict[str, Any]) -> Dict[str, Any]:
+    from cardio import compact as compaction
+    from cardio.forest import CompiledForest
+
+    result = compaction.compact(
+        CompiledForest.from_sklearn(rf["model"]),
+        scale["X_test"],
+        split["y_test"],
+        tolerance=params["tolerance"],
+        prune_tolerance=params["prune_tolerance"],
+        leaf_dtype=params["leaf_dtype"],
+        sklearn_model=rf["model"],
+        validation_fraction=params["validation_fraction"],
+    )
+    out_dir = Path(params["out_dir"])
+    out_dir.mkdir(parents=True, exist_ok=True)
+    result.forest.save(out_dir / "rf_cardio_model.compact.npz")
+    with (out_dir / "compact_report.json").open("w", encoding="utf-8") as fh:
+        json.dump(result.to_dict(), fh, indent=2)
+    print(compaction.format_report(result), file=sys.stderr)
+    written = {
+        str(out_dir / name): file_sha256(out_dir / name)
+        for name in ("rf_cardio_model.compact.npz", "compact_report.json")
+    }
+    return {"written": written, "chosen": result.chosen.to_dict(), "full": result.full.to_dict()}
+
+
+def cascade(params: Dict[str, Any], lr: Dict[str, Any], rf: Dict[str, Any], split: Dict[str, Any], scale: Dict[str, Any]) -> Dict[str, Any]:
+    from cardio.cascade import build as build_cascade
+
+    tiers, report = build_cascade(
+        lr["model"], rf["model"], scale["X_test"], split["y_test"], params["target"], params["validation_fraction"]
+    )
+    out_dir = Path(params["out_dir"])
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / "lr_cascade.npz"
+    tiers.save(path)
+    return {"written": {str(path): file_sha256(path)}, "report": report}
+
+
+def drift(params: Dict[str, Any], split: Dict[str, Any]) -> Dict[str, Any]:
+    from cardio.drift import reference
+
+    X_train = split["X_train"]
+    sketch = reference(X_train.to_numpy(dtype=np.float64), list(X_train.columns), params["bins"])
+    out_dir = Path(params["out_dir"])
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / "drift_reference.json"
+    sketch.save(path)
+    return {"written": {str(path): file_sha256(path)}, "rows": sketch.n}
+
+
+def _artifacts_intact(output: Dict[str, Any]) -> bool:
+    """The files a cached save wrote are still there, unchanged."""
+    return all(Path(path).exists() and file_sha256(path) == sha256 for path, sha256 in output["written"].items())
+
+
+def build_pipeline(
+    csv_path: str | Path = "cardio_train.csv",
+    cache_dir: str | Path = DEFAULT_CACHE_DIR,
+    out_dir: str | Path = ".",
+    n_jobs: int = -1,
+) -> Pipeline:
+    """The training DAG with the notebook's default parameters."""
+    pipe = Pipeline(cache_dir)
+    pipe.stage(
+        params={"csv_path": str(csv_path), "sep": ";"},
+        fingerprint=lambda p: file_sha256(p["csv_path"]),
+    )(load)
+    pipe.stage(
+        deps=("load",),
+        params={"limits": {name: list(bounds) for name, bounds in CLEAN_LIMITS.items()}},
+        modules=("cardio.features",),
+    )(clean)
+    pipe.stage(deps=("clean",), params={"feature_order": list(FEATURE_ORDER)}, modules=("cardio.features",))(engineer)
+    pipe.stage(deps=("engineer",), params={"test_size": 0.2, "random_state": 42, "stratify": True}, packages=SKLEARN)(split)
+    pipe.stage(deps=("split",), packages=SKLEARN)(scale)
+    pipe.stage(deps=("split", "scale"), params={"max_iter": 1000}, packages=SKLEARN)(lr)
+    pipe.stage(
+        deps=("split", "scale"),
+        params={"n_estimators": 200, "max_depth": None, "min_samples_split": 2, "random_state": 42},
+        options={"n_jobs": n_jobs},
+        packages=SKLEARN,
+    )(rf)
+    pipe.stage(
+        deps=("split", "scale"),
+        params={
+            "param_grid": {"n_estimators": [100, 200], "max_depth": [None, 10, 20], "min_samples_split": [2, 5]},
+            "cv": 3,
+            "scoring": "f1",
+            "random_state": 42,
+            # "halving" (cardio.search) or "exhaustive" (GridSearchCV); both pick the same best here
+            "method": "halving",
+            "factor": 3,
+        },
+        options={"n_jobs": n_jobs, "verbose": 1},
+        modules=("cardio.search",),
+        packages=SKLEARN,
+    )(grid)
+    pipe.stage(deps=("rf", "engineer"))(importance)
+    pipe.stage(deps=("rf", "scale"), params={"max_samples": 1000, "seed": 42}, packages=("shap",))(shap)
+    pipe.stage(
+        deps=("rf", "scale"),
+        params={"chunk_rows": 2048},
+        options={"n_jobs": n_jobs},
+        modules=("cardio.explain", "cardio.compact", "cardio.forest"),
+    )(explain)
+    pipe.stage(
+        deps=("rf", "scale", "engineer"),
+        params={"out_dir": str(Path(out_dir).resolve())},
+        check=_artifacts_intact,
+        modules=("cardio.forest", "cardio.portable"),
+    )(save)
+    pipe.stage(
+        deps=("rf", "split", "scale"),
+        params={
+            # Allowed ROC-AUC drop vs the full forest, on the half of the test split
+            # the point is chosen on; compact_report.json reports the other half
+            "tolerance": 0.005,
+            "validation_fraction": 0.5,
+            "prune_tolerance": 0.0,
+            "leaf_dtype": "float32",
+            "out_dir": str(Path(out_dir).resolve()),
+        },
+        check=_artifacts_intact,
+        modules=("cardio.compact", "cardio.forest"),
+    )(compact)
+    pipe.stage(
+        deps=("lr", "rf", "split", "scale"),
+        # Minimum agreement with forest-only labels on the half of the test split the
+        # band is tuned on; the report is measured on the other half
+        params={"target": 0.99, "validation_fraction": 0.5, "out_dir": str(Path(out_dir).resolve())},
+        check=_artifacts_intact,
+        modules=("cardio.cascade", "cardio.forest"),
+        packages=SKLEARN,
+    )(cascade)
+    pipe.stage(
+        deps=("split",),
+        # Quantile bins per continuous feature in the reference histograms
+        params={"bins": 20, "out_dir": str(Path(out_dir).resolve())},
+        check=_artifacts_intact,
+        modules=("cardio.drift", "cardio.features"),
+    )(drift)
+    return pipe
+
+
+def _parse_overrides(items: Sequence[str]) -> Dict[str, Any]:
+    overrides = {}
+    for item in items:
+        dotted, sep, raw = item.partition("=")
+        if not sep:
+            raise SystemExit(f"--set expects stage.param=value, got {item!r}")
+        try:
+            overrides[dotted] = ast.literal_eval(raw)
+        except (ValueError, SyntaxError):
+            overrides[dotted] = raw
+    return overrides
+
+
+def _report(name: str, output: Any) -> Dict[str, Any]:
+    if name in ("lr", "rf", "grid"):
+        metrics = {k: round(v, 4) for k, v in output["metrics"].items() if isinstance(v, float)}
+        if name == "grid":
+            metrics["best_params"] = output["best_params"]
+        return metrics
+    if name == "importance":
+        return {k: round(float(v), 4) for k, v in output.head(10).items()}
+    if name == "explain":
+        return output["summary"]
+    if name in ("save", "compact", "cascade", "drift"):
+        return output
+    return {}
+
+
+def main(argv: Any = None) -> None:
+    parser = argparse.ArgumentParser(description="Run the cardio training stages, reusing cached outputs")
+    parser.add_argument("targets", nargs="*", help=f"Stages to produce (default: {' '.join(DEFAULT_TARGETS)})")
+    parser.add_argument("--csv", default="cardio_train.csv")
+    parser.add_argument("--cache-dir", default=os.environ.get("CARDIO_PIPELINE_CACHE", DEFAULT_CACHE_DIR))
+    parser.add_argument("--out-dir", default=".", help="Where the save stage writes the artifacts")
+    parser.add_argument("--jobs", type=int, default=-1, help="n_jobs for the forest stages (not part of the cache key)")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="STAGE.PARAM=VALUE")
+    parser.add_argument("--force", nargs="+", default=[], metavar="STAGE", help="Rerun these stages and everything downstream")
+    parser.add_argument("--dry-run", action="store_true", help="Show which stages would run")
+    parser.add_argument("--list", action="store_true", help="List stages and their parameters")
+    args = parser.parse_args(argv)
+
+    pipe = build_pipeline(args.csv, args.cache_dir, args.out_dir, args.jobs)
+    try:
+        pipe.configure(_parse_overrides(args.overrides))
+    except KeyError as exc:
+        raise SystemExit(exc.args[0])
+
+    if args.list:
+        for stage in pipe.stages.values():
+            deps = ", ".join(stage.deps) or "-"
+            print(f"{stage.name:<11} deps: {deps:<24} params: {json.dumps(stage.params, default=repr)}")
+        return
+
+    targets: List[str] = args.targets or list(DEFAULT_TARGETS)
+    unknown = [name for name in [*targets, *args.force] if name not in pipe.stages]
+    if unknown:
+        raise SystemExit(f"Unknown stage(s): {', '.join(unknown)}. Known: {', '.join(pipe.stages)}")
+
+    if args.dry_run:
+        for name, action in pipe.plan(targets, args.force).items():
+            print(f"{name:<11} {action}")
+        return
+
+    try:
+        outputs, runs = pipe.run(targets, args.force, log=lambda line: print(line, file=sys.stderr))
+    except RuntimeError as exc:
+        raise SystemExit(str(exc))
+    summary = {
+        "stages": {run.name: {"status": run.status, "seconds": round(run.seconds, 3), "key": run.key} for run in runs},
+        "results": {name: _report(name, output) for name, output in outputs.items()},
+    }
+    print(json.dumps(summary, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""Portable model bundle: scaler, feature order and forest in one file.
+
+Loading the joblib artifacts unpickles a ``StandardScaler`` and a
+``RandomForestClassifier``, which imports all of scikit-learn (and scipy)
+on every cold start. A ``.cardio`` bundle holds the same model as plain
+arrays behind a small JSON header, and reads back with NumPy only::
+
+    offset 0   MAGIC (8 bytes)  header length (uint32 LE)  header JSON
+    aligned    array payload (every array at a 64-byte aligned offset)
+
+The header carries the schema version, the feature order, the scaler's
+means / scales, the forest metadata, the location and dtype of every
+array and the SHA-256 of the payload, which ``load`` checks before use::
+
+    python -m cardio.portable export rf_cardio_model.joblib scaler_cardio.joblib cardio_model.cardio
+    python -m cardio.portable bench cardio_model.cardio --model rf_cardio_model.joblib --scaler scaler_cardio.joblib
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from cardio.forest import CompiledForest
+
+MAGIC = b"CARDIOPM"
+SCHEMA_VERSION = 1
+SUFFIX = ".cardio"
+ALIGN = 64
+FOREST_ARRAYS = ("feature", "threshold", "children_left", "children_right", "value", "roots")
+BENCH_REPEATS = 5
+
+
+class PortableScaler:
+    """The parts of a fitted ``StandardScaler`` that ``scale_features`` uses."""
+
+    def __init__(self, feature_names: Sequence[str], mean: Any, scale: Any) -> None:
+        self.feature_names_in_ = np.asarray(list(feature_names), dtype=object)
+        self.mean_ = np.asarray(mean, dtype=np.float64)
+        self.scale_ = np.asarray(scale, dtype=np.float64)
+        self.with_mean = True
+        self.with_std = True
+        self.n_features_in_ = len(self.feature_names_in_)
+
+    @classmethod
+    def from_sklearn(cls, scaler: Any) -> "PortableScaler":
+        n = scaler.n_features_in_
+        names = getattr(scaler, "feature_names_in_", None)
+        mean = scaler.mean_ if scaler.with_mean and scaler.mean_ is not None else np.zeros(n)
+        scale = scaler.scale_ if scaler.with_std and scaler.scale_ is not None else np.ones(n)
+        return cls(list(names) if names is not None else [f"x{i}" for i in range(n)], mean, scale)
+
+    def transform(self, X: Any) -> np.ndarray:
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+
+
+class PortableModel:
+    """A loaded bundle; ``model`` is a ``CompiledForest``."""
+
+    def __init__(self, model: CompiledForest, scaler: PortableScaler, feature_order: List[str], header: Dict[str, Any]) -> None:
+        self.model = model
+        self.scaler = scaler
+        self.feature_order = feature_order
+        self.header = header
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGN) * ALIGN
+
+
+def export(model: Any, scaler: Any, path: str | Path, feature_order: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """Write ``model`` (sklearn forest or ``CompiledForest``) and ``scaler`` as a bundle.
+
+    Returns the header that was written.
+    """
+    from cardio.features import FEATURE_ORDER
+
+    forest = model if isinstance(model, CompiledForest) else CompiledForest.from_sklearn(model)
+    scaler = scaler if isinstance(scaler, PortableScaler) else PortableScaler.from_sklearn(scaler)
+    feature_order = list(feature_order if feature_order is not None else FEATURE_ORDER)
+    if len(feature_order) != forest.n_features_in_:
+        raise ValueError(f"Feature order has {len(feature_order)} names, the model expects {forest.n_features_in_}")
+    missing = [name for name in scaler.feature_names_in_ if name not in feature_order]
+    if missing:
+        raise ValueError(f"Scaler columns not in the feature order: {', '.join(missing)}")
+
+    arrays = {name: np.ascontiguousarray(getattr(forest, name)) for name in FOREST_ARRAYS}
+    arrays["classes"] = np.ascontiguousarray(forest.classes_)
+    if arrays["classes"].dtype.kind not in "iufb":
+        raise ValueError(f"Only numeric class labels can be exported, got {arrays['classes'].dtype}")
+
+    specs = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = _aligned(offset)
+        specs[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset, "nbytes": array.nbytes}
+        offset += array.nbytes
+    payload_size = offset
+
+    # Hash exactly the bytes written below, padding included
+    digest = hashlib.sha256()
+    position = 0
+    for name, array in arrays.items():
+        digest.update(b"\0" * (specs[name]["offset"] - position))
+        digest.update(array.data)
+        position = specs[name]["offset"] + array.nbytes
+
+    header = {
+        "format": "cardio-portable",
+        "schema": SCHEMA_VERSION,
+        "feature_order": feature_order,
+        "scaler": {
+            "features": [str(name) for name in scaler.feature_names_in_],
+            "mean": [float(v) for v in scaler.mean_],
+            "scale": [float(v) for v in scaler.scale_],
+        },
+        "model": {
+            "type": "random_forest",
+            "n_estimators": forest.n_estimators,
+            "n_nodes": forest.n_nodes,
+            "max_depth": forest.max_depth,
+            "n_features": forest.n_features_in_,
+        },
+        "arrays": specs,
+        "payload_bytes": payload_size,
+        "sha256": digest.hexdigest(),
+    }
+    blob = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    start = _aligned(len(MAGIC) + 4 + len(blob))
+
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with tmp.open("wb") as fh:
+        fh.write(MAGIC)
+        fh.write(struct.pack("<I", len(blob)))
+        fh.write(blob)
+        fh.write(b"\0" * (start - fh.tell()))
+        for name, array in arrays.items():
+            fh.write(b"\0" * (start + specs[name]["offset"] - fh.tell()))
+            fh.write(array.data)
+    os.replace(tmp, path)
+    return header
+
+
+def read_header(path: str | Path) -> Dict[str, Any]:
+    with open(path, "rb") as fh:
+        return _read_header(fh)[0]
+
+
+def _read_header(fh: Any) -> Tuple[Dict[str, Any], int]:
+    if fh.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{getattr(fh, 'name', 'file')} is not a {SUFFIX} bundle")
+    (length,) = struct.unpack("<I", fh.read(4))
+    try:
+        header = json.loads(fh.read(length).decode("utf-8"))
+    except (UnicodeDecodeError, ValueError) as exc:
+        raise ValueError(f"Corrupt {SUFFIX} header: {exc}") from exc
+    if header.get("format") != "cardio-portable":
+        raise ValueError(f"Unknown bundle format: {header.get('format')!r}")
+    if not isinstance(header.get("schema"), int) or header["schema"] > SCHEMA_VERSION:
+        raise ValueError(f"Bundle schema {header.get('schema')!r} is newer than supported ({SCHEMA_VERSION})")
+    return header, _aligned(len(MAGIC) + 4 + length)
+
+
+def load(path: str | Path, verify: bool = True) -> PortableModel:
+    """Map a bundle read-only and rebuild the forest and scaler (NumPy only).
+
+    ``verify`` checks the payload against the header's SHA-256 first.
+    """
+    with open(path, "rb") as fh:
+        header, start = _read_header(fh)
+        size = os.fstat(fh.fileno()).st_size
+        if start + header["payload_bytes"] > size:
+            raise ValueError(f"Truncated {SUFFIX} bundle: {size} bytes, header needs {start + header['payload_bytes']}")
+        buffer = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    payload = memoryview(buffer)[start:start + header["payload_bytes"]]
+    if verify and hashlib.sha256(payload).hexdigest() != header["sha256"]:
+        raise ValueError(f"Checksum mismatch in {path}")
+
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        arrays[name] = np.frombuffer(payload, dtype=np.dtype(spec["dtype"]), count=count, offset=spec["offset"]).reshape(spec["shape"])
+
+    meta = header["model"]
+    forest = CompiledForest(
+        feature=arrays["feature"],
+        threshold=arrays["threshold"],
+        children_left=arrays["children_left"],
+        children_right=arrays["children_right"],
+        value=arrays["value"],
+        roots=arrays["roots"],
+        max_depth=meta["max_depth"],
+        classes=arrays["classes"],
+        n_features=meta["n_features"],
+    )
+    scaler = PortableScaler(header["scaler"]["features"], header["scaler"]["mean"], header["scaler"]["scale"])
+    return PortableModel(forest, scaler, list(header["feature_order"]), header)
+
+
+def is_bundle(path: str | Path) -> bool:
+    return str(path).endswith(SUFFIX)
+
+
+# --- benchmark ---
+_PORTABLE_SNIPPET = """
+import sys, time
+start = time.perf_counter()
+from cardio.portable import load
+bundle = load(sys.argv[1])
+seconds = time.perf_counter() - start
+print(seconds, int("sklearn" in sys.modules))
+"""
+
+_JOBLIB_SNIPPET = """
+import sys, time
+start = time.perf_counter()
+import joblib
+from cardio.forest import load_model
+model = load_model(sys.argv[1])
+scaler = joblib.load(sys.argv[2])
+seconds = time.perf_counter() - start
+print(seconds, int("sklearn" in sys.modules))
+"""
+
+
+def _cold_load(snippet: str, args: Sequence[str], repeats: int) -> Dict[str, Any]:
+    """Median import-plus-load time over fresh interpreters."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(Path(__file__).resolve().parent.parent), os.environ.get("PYTHONPATH")])))
+    inner, outer, sklearn = [], [], False
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", snippet, *args], capture_output=True, text=True, env=env, check=True)
+        outer.append(time.perf_counter() - start)
+        seconds, imported = out.stdout.split()
+        inner.append(float(seconds))
+        sklearn = bool(int(imported))
+    return {
+        "import_and_load_ms": round(float(np.median(inner)) * 1000, 1),
+        "process_ms": round(float(np.median(outer)) * 1000, 1),
+        "imports_sklearn": sklearn,
+    }
+
+
+def _package_bytes(names: Sequence[str]) -> Dict[str, int]:
+    """Installed size of each importable package (0 when not installed)."""
+    import importlib.util
+
+    sizes = {}
+    for name in names:
+        spec = importlib.util.find_spec(name)
+        total = 0
+        if spec is not None and spec.submodule_search_locations:
+            for root in spec.submodule_search_locations:
+                for directory, _, files in os.walk(root):
+                    total += sum(os.path.getsize(os.path.join(directory, f)) for f in files)
+            # Vendored shared libraries live next to the package (numpy.libs, scipy.libs)
+            libs = Path(root).with_name(f"{name}.libs")
+            if libs.is_dir():
+                total += sum(p.stat().st_size for p in libs.iterdir() if p.is_file())
+        elif spec is not None and spec.origin and os.path.isfile(spec.origin):
+            total = os.path.getsize(spec.origin)
+        sizes[name] = total
+    return sizes
+
+
+def benchmark(bundle: str | Path, model: str | Path, scaler: str | Path, repeats: int = BENCH_REPEATS) -> Dict[str, Any]:
+    """Compare cold import-plus-load time and bundle size of both formats."""
+    joblib_deps = _package_bytes(["numpy", "sklearn", "scipy", "joblib", "threadpoolctl"])
+    portable_deps = {"numpy": joblib_deps["numpy"]}
+    return {
+        "portable": {
+            **_cold_load(_PORTABLE_SNIPPET, [str(bundle)], repeats),
+            "artifact_bytes": Path(bundle).stat().st_size,
+            "dependency_bytes": sum(portable_deps.values()),
+            "dependencies": portable_deps,
+        },
+        "joblib": {
+            **_cold_load(_JOBLIB_SNIPPET, [str(model), str(scaler)], repeats),
+            "artifact_bytes": Path(model).stat().st_size + Path(scaler).stat().st_size,
+            "dependency_bytes": sum(joblib_deps.values()),
+            "dependencies": joblib_deps,
+        },
+    }
+
+
+def main(argv: Any = None) -> None:
+    parser = argparse.ArgumentParser(description="Export / check the NumPy-only portable model bundle")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_cmd = commands.add_parser("export", help="Write model + scaler as a .cardio bundle")
+    export_cmd.add_argument("model", help="rf_cardio_model.joblib or a compiled .npz")
+    export_cmd.add_argument("scaler", help="scaler_cardio.joblib")
+    export_cmd.add_argument("output", help=f"Destination {SUFFIX} file")
+    export_cmd.add_argument("--features", default=None, help="features.json (default: cardio/features.json)")
+
+    bench_cmd = commands.add_parser("bench", help="Cold import+load time and size vs the joblib artifacts")
+    bench_cmd.add_argument("bundle")
+    bench_cmd.add_argument("--model", default="rf_cardio_model.joblib")
+    bench_cmd.add_argument("--scaler", default="scaler_cardio.joblib")
+    bench_cmd.add_argument("--repeats", type=int, default=BENCH_REPEATS)
+
+    info_cmd = commands.add_parser("info", help="Print the header of a bundle")
+    info_cmd.add_argument("bundle")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        import joblib
+
+        from cardio.features import load_feature_order
+        from cardio.forest import load_model
+
+        feature_order = load_feature_order(args.features) if args.features else None
+        header = export(load_model(args.model), joblib.load(args.scaler), args.output, feature_order)
+        meta = header["model"]
+        print(
+            f"Exported {meta['n_estimators']} trees / {meta['n_nodes']} nodes + scaler "
+            f"({len(header['scaler']['features'])} columns) to {args.output} "
+            f"({Path(args.output).stat().st_size} bytes, sha256 {header['sha256'][:12]})"
+        )
+    elif args.command == "bench":
+        print(json.dumps(benchmark(args.bundle, args.model, args.scaler, args.repeats), indent=2))
+    else:
+        header = read_header(args.bundle)
+        header["arrays"] = {name: f"{spec['dtype']} {spec['shape']}" for name, spec in header["arrays"].items()}
+        print(json.dumps(header, indent=2))
+
+
+if __name__ == "__main__":
+    main()
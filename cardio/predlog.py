@@ -0,0 +1,561 @@
+"""Append-only binary log of served predictions, and a replay tool for it.
+
+Every scored record becomes one fixed-size little-endian record
+(``RECORD_DTYPE``): wall-clock time, a per-process request number, the 11
+raw inputs (``RAW_FIELDS`` order), P(class 1), the label, which path served
+it, whether it came from the result cache, the request's batch size, the
+model version and the request's stage timings in milliseconds. A file is a
+short JSON header (magic, record dtype, field and stage names) followed by
+records only, so a reader maps it with NumPy and a torn last record after
+a crash is simply ignored.
+
+``PredictionLog.log`` only queues the records; a background thread writes
+them in one ``write`` per flush (every ``flush_interval`` seconds or
+``flush_records`` records), so the request path never touches the disk. If
+the disk falls behind by more than ``max_pending`` records, new records are
+dropped and counted rather than blocking requests. Files rotate past
+``max_bytes`` and only the newest ``keep`` of each process are kept (file
+names carry the pid, so worker processes sharing the directory never
+delete each other's open files); files of processes that are no longer
+running share one more ``keep`` budget, so restarts do not pile up old
+logs. Configured from the
+environment by ``from_env``: ``PREDICTION_LOG_DIR`` (unset disables it),
+``PREDICTION_LOG_MAX_MB`` (default 64) and ``PREDICTION_LOG_KEEP`` (default
+10).
+
+Replay streams logs back through any model version in large batches and
+compares with the logged outputs, or re-sends the logged requests with
+their original batch sizes to a running server::
+
+    python -m cardio.predlog replay logs/ --model cardio_model.cardio
+    python -m cardio.predlog replay logs/ --url http://127.0.0.1:8000/ --concurrency 8
+    python -m cardio.predlog show logs/ --limit 5
+"""
+from __future__ import annotations
+
+import argparse
+import atexit
+import json
+import os
+import struct
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from cardio.features import RAW_FIELDS
+
+MAGIC = b"CARDLOG\x01"
+SUFFIX = ".clog"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_KEEP = 10
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_FLUSH_RECORDS = 4096
+DEFAULT_MAX_PENDING = 262144
+DEFAULT_REPLAY_BATCH = 65536
+
+# Stage timings kept per record (ms); others a timer reports are dropped
+STAGES = ("read", "load_wait", "parse", "validate", "cache", "features", "queue", "scale", "predict")
+# Serving path of a record
+SOURCES = ("json", "packed", "fastapi", "fastapi_batch")
+
+RECORD_DTYPE = np.dtype([
+    ("time", "<f8"),
+    ("request", "<u8"),
+    ("raw", "<f8", (len(RAW_FIELDS),)),
+    ("proba", "<f8"),
+    ("label", "i1"),
+    ("source", "u1"),
+    ("cached", "u1"),
+    ("batch", "<u4"),
+    ("version", "S16"),
+    ("stages", "<f4", (len(STAGES),)),
+    ("total", "<f4"),
+])
+
+_STAGE_INDEX = {name: i for i, name in enumerate(STAGES)}
+_OPEN_LOGS: "weakref.WeakSet[PredictionLog]" = weakref.WeakSet()
+
+
+def _header() -> bytes:
+    meta = json.dumps({
+        "dtype": np.lib.format.dtype_to_descr(RECORD_DTYPE),
+        "raw_fields": list(RAW_FIELDS),
+        "stages": list(STAGES),
+        "sources": list(SOURCES),
+        "pid": os.getpid(),
+        "created": time.time(),
+    }).encode("utf-8")
+    return MAGIC + struct.pack("<I", len(meta)) + meta
+
+
+def make_records(
+    raw: Any,
+    labels: Any,
+    proba: Any,
+    version: str,
+    timer: Any = None,
+    source: str = "json",
+    cached: Any = None,
+    request: int = 0,
+) -> np.ndarray:
+    """Structured records for one request (``raw`` are its valid rows)."""
+    raw = np.asarray(raw, dtype=np.float64).reshape(-1, len(RAW_FIELDS))
+    records = np.zeros(len(raw), dtype=RECORD_DTYPE)
+    records["time"] = time.time()
+    records["request"] = request
+    records["raw"] = raw
+    records["proba"] = proba
+    records["label"] = labels
+    records["source"] = SOURCES.index(source)
+    if cached is not None:
+        records["cached"] = cached
+    records["batch"] = len(raw)
+    records["version"] = (version or "").encode("ascii")[:16]
+    if timer is not None and timer.enabled:
+        stages = np.zeros(len(STAGES), dtype=np.float32)
+        for name, seconds in timer.spans:
+            if name in _STAGE_INDEX:
+                stages[_STAGE_INDEX[name]] += seconds * 1e3
+        records["stages"] = stages
+        records["total"] = timer.total() * 1e3
+    return records
+
+
+class PredictionLog:
+    """Buffered, rotating writer of ``RECORD_DTYPE`` files; disabled without a directory."""
+
+    def __init__(
+        self,
+        directory: Optional[str | Path] = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        keep: int = DEFAULT_KEEP,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        flush_records: int = DEFAULT_FLUSH_RECORDS,
+        max_pending: int = DEFAULT_MAX_PENDING,
+    ) -> None:
+        self.directory = Path(directory) if directory else None
+        self.max_bytes = max(int(max_bytes), len(_header()) + RECORD_DTYPE.itemsize)
+        self.keep = max(0, int(keep))
+        self.flush_interval = float(flush_interval)
+        self.flush_records = max(1, int(flush_records))
+        self.max_pending = max(1, int(max_pending))
+        self._pending: List[np.ndarray] = []
+        self._pending_records = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._flush_now = False
+        self._file: Any = None
+        self._path: Optional[Path] = None
+        self._size = 0
+        self._sequence = 0
+        self.requests = self.written = self.dropped = self.files = self.errors = 0
+
+    @classmethod
+    def from_env(cls) -> "PredictionLog":
+        return cls(
+            os.environ.get("PREDICTION_LOG_DIR") or None,
+            int(float(os.environ.get("PREDICTION_LOG_MAX_MB", DEFAULT_MAX_BYTES / 2**20)) * 2**20),
+            int(os.environ.get("PREDICTION_LOG_KEEP", DEFAULT_KEEP)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def log(self, raw: Any, labels: Any, proba: Any, version: str, timer: Any = None,
+            source: str = "json", cached: Any = None) -> None:
+        """Queue one request's records; never blocks on the disk."""
+        if not self.enabled or self._closed or not len(labels):
+            return
+        with self._lock:
+            self.requests += 1
+            request = self.requests
+        records = make_records(raw, labels, proba, version, timer, source, cached, request)
+        with self._lock:
+            if self._pending_records + len(records) > self.max_pending:
+                self.dropped += len(records)
+                return
+            self._pending.append(records)
+            self._pending_records += len(records)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="prediction-log", daemon=True)
+                self._thread.start()
+                _OPEN_LOGS.add(self)
+            if self._pending_records >= self.flush_records:
+                self._wake.notify()
+
+    # --- writer thread ---
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                deadline = time.monotonic() + self.flush_interval
+                while self._pending_records < self.flush_records and not (self._closed or self._flush_now):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wake.wait(remaining)
+                batch, self._pending, self._pending_records = self._pending, [], 0
+                self._flush_now = False
+                closed = self._closed
+            if batch:
+                self._write(np.concatenate(batch))
+            if closed:
+                with self._lock:
+                    if not self._pending:
+                        break
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, records: np.ndarray) -> None:
+        try:
+            data = records.tobytes()
+            step = RECORD_DTYPE.itemsize
+            while data:
+                if self._file is None or self._size + step > self.max_bytes:
+                    self._rotate()
+                room = (self.max_bytes - self._size) // step * step
+                chunk, data = data[:room], data[room:]
+                self._file.write(chunk)
+                self._size += len(chunk)
+            self.written += len(records)
+        except OSError:
+            self.errors += 1
+            self.dropped += len(records)
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._sequence += 1
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        self._path = self.directory / f"predictions-{stamp}-{os.getpid()}-{self._sequence:04d}{SUFFIX}"
+        self._file = self._path.open("ab", buffering=0)
+        header = _header()
+        self._file.write(header)
+        self._size = len(header)
+        self.files += 1
+        if self.keep:
+            self._prune()
+
+    def _prune(self) -> None:
+        """Newest ``keep`` files of this process, and of all dead processes together."""
+        own: List[Path] = []
+        dead: List[Path] = []
+        for path in self.directory.glob(f"predictions-*{SUFFIX}"):
+            # predictions-<date>-<time>-<pid>-<sequence>.clog
+            parts = path.name.split("-")
+            if len(parts) != 5 or not parts[3].isdigit():
+                continue
+            pid = int(parts[3])
+            if pid == os.getpid():
+                own.append(path)
+            elif not _pid_alive(pid):
+                # Other live workers may still be writing theirs: never touched
+                dead.append(path)
+        for group in (own, dead):
+            # Names start with the timestamp, so name order is age order
+            for old in sorted(group, key=lambda path: path.name)[:-self.keep]:
+                try:
+                    old.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Wait until everything queued so far is on disk."""
+        deadline = time.monotonic() + timeout
+        target = self.written + self._pending_records + self.dropped
+        with self._lock:
+            self._flush_now = True
+            self._wake.notify()
+        while self.written + self.dropped < target and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    def close(self, timeout: float = 5.0) -> None:
+        with self._lock:
+            self._closed = True
+            self._wake.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "directory": str(self.directory) if self.directory else None,
+            "file": str(self._path) if self._path else None,
+            "requests": self.requests,
+            "written": self.written,
+            "pending": self._pending_records,
+            "dropped": self.dropped,
+            "files": self.files,
+            "errors": self.errors,
+        }
+
+
+def close_all() -> None:
+    """Flush and close every log of this process (also run at exit)."""
+    for log in list(_OPEN_LOGS):
+        log.close()
+
+
+atexit.register(close_all)
+
+
+# --- reading ---
+def log_files(paths: Sequence[str | Path]) -> List[Path]:
+    """Log files named in ``paths`` (directories expanded), oldest first."""
+    files: List[Path] = []
+    for path in map(Path, paths):
+        files.extend(sorted(path.glob(f"*{SUFFIX}")) if path.is_dir() else [path])
+    # predictions-<date>-<time>-<pid>-<sequence>: the name sorts by creation
+    return sorted(files, key=lambda path: path.name)
+
+
+def open_log(path: str | Path) -> np.ndarray:
+    """Memory-mapped records of one file (a torn last record is left out)."""
+    with open(path, "rb") as fh:
+        if fh.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a prediction log")
+        (length,) = struct.unpack("<I", fh.read(4))
+        meta = json.loads(fh.read(length))
+    dtype = np.lib.format.descr_to_dtype(meta["dtype"])
+    if dtype != RECORD_DTYPE:
+        raise ValueError(f"{path} was written with a different record layout")
+    offset = len(MAGIC) + 4 + length
+    count = (Path(path).stat().st_size - offset) // dtype.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+
+
+def iter_records(paths: Sequence[str | Path], chunk: int = DEFAULT_REPLAY_BATCH) -> Iterator[np.ndarray]:
+    """Records of every log in ``paths``, oldest first, ``chunk`` at a time."""
+    for path in log_files(paths):
+        records = open_log(path)
+        for start in range(0, len(records), chunk):
+            yield records[start:start + chunk]
+
+
+# --- replay ---
+def replay(paths: Sequence[str | Path], version: Any, batch_rows: int = DEFAULT_REPLAY_BATCH,
+           tolerance: float = 1e-9) -> Dict[str, Any]:
+    """Score every logged record with ``version`` (a ModelVersion) and diff against the log."""
+    from cardio.features import build_features
+
+    rows = mismatches = 0
+    max_diff = 0.0
+    by_version: Dict[str, Dict[str, int]] = {}
+    start = time.perf_counter()
+    for records in iter_records(paths, batch_rows):
+        labels, proba = version.score(build_features(records["raw"], version.feature_order))
+        changed = (np.asarray(labels) != records["label"]) | (np.abs(proba - records["proba"]) > tolerance)
+        rows += len(records)
+        mismatches += int(changed.sum())
+        max_diff = max(max_diff, float(np.abs(proba - records["proba"]).max()))
+        logged, index = np.unique(records["version"], return_inverse=True)
+        for k, name in enumerate(logged):
+            entry = by_version.setdefault(name.decode("ascii"), {"rows": 0, "changed": 0})
+            entry["rows"] += int((index == k).sum())
+            entry["changed"] += int(changed[index == k].sum())
+    seconds = time.perf_counter() - start
+    return {
+        "version": version.version,
+        "rows": rows,
+        "changed": mismatches,
+        "max_proba_diff": max_diff,
+        "by_logged_version": by_version,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(rows / seconds, 1) if seconds else 0.0,
+    }
+
+
+def requests_of(records: np.ndarray) -> Iterator[np.ndarray]:
+    """Split records back into the logged requests (consecutive, same process and request number)."""
+    if not len(records):
+        return
+    cuts = np.flatnonzero(np.diff(records["request"].astype(np.int64)) != 0) + 1
+    yield from np.split(records, cuts)
+
+
+def replay_http(paths: Sequence[str | Path], url: str, concurrency: int = 4,
+                limit: Optional[int] = None, timeout: float = 30.0) -> Dict[str, Any]:
+    """Re-send the logged requests (same batch sizes) as packed bodies to ``url``."""
+    import http.client
+    from collections import deque
+    from concurrent.futures import Future, ThreadPoolExecutor
+    from urllib.parse import urlsplit
+
+    from cardio import wire
+
+    target = urlsplit(url)
+    local = threading.local()
+
+    def send(request: np.ndarray) -> Tuple[float, int, int]:
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=timeout)
+        body = wire.encode_records(request["raw"])
+        started = time.perf_counter()
+        try:
+            conn.request("POST", target.path or "/", body, {"Content-Type": wire.REQUEST_TYPE})
+            response = conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            local.conn = None
+            return time.perf_counter() - started, 599, 0
+        elapsed = time.perf_counter() - started
+        if response.status != 200:
+            return elapsed, response.status, 0
+        labels, _ = wire.decode_scores(data)
+        return elapsed, 200, int((labels != request["label"]).sum())
+
+    def logged_requests() -> Iterator[np.ndarray]:
+        sent = 0
+        for path in log_files(paths):
+            # A whole file at a time (memory-mapped), so no request is split
+            for request in requests_of(open_log(path)):
+                if limit is not None and sent >= limit:
+                    return
+                sent += 1
+                yield request
+
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    rows = changed = 0
+
+    def collect(request: np.ndarray, future: Future) -> None:
+        nonlocal rows, changed
+        elapsed, status, diff = future.result()
+        latencies.append(elapsed)
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        rows += len(request)
+        changed += diff
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        in_flight: Deque[Tuple[np.ndarray, Future]] = deque()
+        for request in logged_requests():
+            in_flight.append((request, pool.submit(send, request)))
+            if len(in_flight) >= 2 * concurrency:
+                collect(*in_flight.popleft())
+        while in_flight:
+            collect(*in_flight.popleft())
+    seconds = time.perf_counter() - start
+    ms = np.array(latencies) * 1e3 if latencies else np.zeros(1)
+    return {
+        "url": url,
+        "requests": len(latencies),
+        "rows": rows,
+        "label_changes": changed,
+        "status": statuses,
+        "seconds": round(seconds, 3),
+        "requests_per_second": round(len(latencies) / seconds, 1) if seconds else 0.0,
+        "latency_ms": {q: round(float(np.percentile(ms, p)), 3) for q, p in (("p50", 50), ("p95", 95), ("p99", 99))},
+    }
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running under another user
+        return True
+    return True
+
+
+def _load_version(model: str, scaler: Optional[str], cascade: Optional[str], backend: str) -> Any:
+    from cardio.dataset import file_sha256
+    from cardio.portable import is_bundle
+    from cardio.registry import ModelVersion
+    from cardio.result_cache import model_version
+
+    paths = [Path(model)]
+    if is_bundle(model):
+        from cardio.portable import load as load_bundle
+
+        bundle = load_bundle(model)
+        forest, fitted_scaler, order = bundle.model, bundle.scaler, bundle.feature_order
+    else:
+        import joblib
+
+        from cardio.features import FEATURE_ORDER
+        from cardio.forest import load_model
+
+        if not scaler:
+            raise SystemExit("--scaler is needed unless --model is a .cardio bundle")
+        forest, fitted_scaler, order = load_model(model, backend), joblib.load(scaler), list(FEATURE_ORDER)
+        paths.append(Path(scaler))
+    if cascade:
+        from cardio.cascade import Cascade
+
+        forest = Cascade.load(cascade, forest)
+        paths.append(Path(cascade))
+    # Same id as the server: artifact checksums in model, scaler, cascade order
+    version = model_version(*(file_sha256(path) for path in paths))
+    return ModelVersion(version=version, model=forest, scaler=fitted_scaler, feature_order=order)
+
+
+def main(argv: Any = None) -> None:
+    parser = argparse.ArgumentParser(description="Inspect and replay prediction logs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    show = commands.add_parser("show", help="Summary of the logs and the first records")
+    show.add_argument("logs", nargs="+", help="Log files or directories")
+    show.add_argument("--limit", type=int, default=5)
+    run = commands.add_parser("replay", help="Score the logged inputs again and diff with the logged outputs")
+    run.add_argument("logs", nargs="+", help="Log files or directories")
+    run.add_argument("--model", help="Model artifact (.cardio bundle, .joblib or .npz)")
+    run.add_argument("--scaler", help="Scaler (.joblib) for .joblib / .npz models")
+    run.add_argument("--cascade", help="lr_cascade.npz in front of the forest")
+    run.add_argument("--backend", default="compiled", choices=("sklearn", "compiled"))
+    run.add_argument("--batch", type=int, default=DEFAULT_REPLAY_BATCH, help="Records scored at once")
+    run.add_argument("--url", help="Send the logged requests to this server instead (packed wire format)")
+    run.add_argument("--concurrency", type=int, default=4)
+    run.add_argument("--limit", type=int, default=None, help="Requests to send with --url")
+    args = parser.parse_args(argv)
+
+    if args.command == "show":
+        files = log_files(args.logs)
+        total = sum(len(open_log(path)) for path in files)
+        print(json.dumps({"files": [str(path) for path in files], "records": total}, indent=2))
+        shown = 0
+        for records in iter_records(args.logs, args.limit):
+            for record in records[: args.limit - shown]:
+                print(json.dumps({
+                    "time": float(record["time"]),
+                    "request": int(record["request"]),
+                    "inputs": dict(zip(RAW_FIELDS, record["raw"].tolist())),
+                    "label": int(record["label"]),
+                    "probability": float(record["proba"]),
+                    "source": SOURCES[record["source"]],
+                    "cached": bool(record["cached"]),
+                    "batch": int(record["batch"]),
+                    "version": record["version"].decode("ascii"),
+                    "stages_ms": {name: round(float(v), 3) for name, v in zip(STAGES, record["stages"]) if v},
+                    "total_ms": round(float(record["total"]), 3),
+                }))
+                shown += 1
+            if shown >= args.limit:
+                break
+        return
+
+    if args.url:
+        summary = replay_http(args.logs, args.url, args.concurrency, args.limit)
+    elif args.model:
+        summary = replay(args.logs, _load_version(args.model, args.scaler, args.cascade, args.backend), args.batch)
+    else:
+        raise SystemExit("replay needs --model or --url")
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""Incremental refresh of the scaler + forest pair from new labelled rows only.
+
+A full retrain refits ``StandardScaler`` and all 200 trees on the whole
+history. ``refresh`` touches only the new rows (``cardio_train.csv``
+format, age in days, cleaned with the training outlier filter):
+
+1. the scaler's mean / variance are merged with the new rows'
+   (``StandardScaler.partial_fit``, Chan et al.'s parallel update);
+2. the split thresholds of the kept trees are mapped from the old scaled
+   space to the new one (raw value = t * scale_old + mean_old), so every
+   tree keeps splitting at the same raw value. Inputs on a 4-decimal grid
+   (every feature except ``bmi``) go the same way as before; a ``bmi``
+   within float32 rounding of a split can switch sides (about 2 in 10^5
+   leaf assignments on the training data), so essentially every input
+   keeps its path;
+3. ``k`` new trees are grown on the new rows with ``warm_start`` and the
+   ``k`` oldest trees are retired, so the forest keeps its size and each
+   refresh replaces a bounded share (``max_share``) of it. By default ``k``
+   follows the new rows' share of all rows seen.
+
+The refreshed pair is evaluated on held-out rows (``--holdout`` CSV, or a
+stratified ``holdout_fraction`` of the new rows) next to the previous
+model and, given ``--history``, a full retrain on history + new rows::
+
+    python -m cardio.refresh new_patients.csv --model rf_cardio_model.joblib \\
+        --scaler scaler_cardio.joblib --out-dir refreshed/ --history cardio_train.csv
+
+Work is proportional to the new rows (plus one pass over the tree arrays),
+not to the history. Only the sklearn forest can grow; exported ``.npz`` /
+``.cardio`` models are written next to the refreshed pair, as by the
+pipeline's ``save`` stage.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from cardio.features import (
+    FEATURE_ORDER,
+    NUMERIC_FEATURES,
+    age_years_from_days,
+    build_features,
+    clean_mask,
+    raw_from_columns,
+)
+
+DEFAULT_MAX_SHARE = 0.25
+DEFAULT_HOLDOUT_FRACTION = 0.2
+# Resolution of the raw inputs (cm, kg, mmHg, years) when matching splits to values
+GRID_DECIMALS = 4
+
+
+def load_rows(path: str | Path, sep: str = ";") -> Tuple[Any, Any]:
+    """Cleaned, engineered (unscaled) features and labels of a labelled CSV."""
+    import pandas as pd
+
+    frame = pd.read_csv(path, sep=sep)
+    frame = frame[clean_mask(frame)].copy()
+    frame["age_years"] = age_years_from_days(frame["age"])
+    X = pd.DataFrame(build_features(raw_from_columns(frame, age="age_years")), columns=FEATURE_ORDER, index=frame.index)
+    return X, frame["cardio"]
+
+
+def _scale(X: Any, scaler: Any) -> Any:
+    X = X.copy()
+    num_cols = [c for c in NUMERIC_FEATURES if c in X.columns]
+    X[num_cols] = scaler.transform(X[num_cols])
+    return X
+
+
+def _evaluate(model: Any, X: Any, y: Any) -> Dict[str, float]:
+    from sklearn.metrics import accuracy_score, f1_score, roc_auc_score
+
+    proba = model.predict_proba(X)[:, 1]
+    pred = model.classes_.take((proba > 0.5).astype(np.intp))
+    return {
+        "accuracy": round(float(accuracy_score(y, pred)), 4),
+        "f1": round(float(f1_score(y, pred)), 4),
+        "roc_auc": round(float(roc_auc_score(y, proba)), 4),
+    }
+
+
+def trees_to_replace(n_trees: int, n_new: int, n_seen: int, max_share: float = DEFAULT_MAX_SHARE) -> int:
+    """New rows' share of all rows seen, in trees; at least 1, at most ``max_share``."""
+    share = n_new / max(n_new + n_seen, 1)
+    return int(min(max(math.ceil(n_trees * share), 1), max(math.floor(n_trees * max_share), 1)))
+
+
+def update_scaler(scaler: Any, X_new: Any) -> Tuple[Any, np.ndarray, np.ndarray]:
+    """Copy of ``scaler`` with the new rows merged in, plus the old (mean, scale)."""
+    import copy
+
+    names = list(scaler.feature_names_in_) if hasattr(scaler, "feature_names_in_") else [
+        c for c in NUMERIC_FEATURES if c in X_new.columns
+    ]
+    old_mean, old_scale = np.array(scaler.mean_, dtype=np.float64), np.array(scaler.scale_, dtype=np.float64)
+    updated = copy.deepcopy(scaler)
+    updated.partial_fit(X_new[names])
+    return updated, old_mean, old_scale
+
+
+def rescale_thresholds(model: Any, feature_names: Any, scaler_names: Any, old: Tuple[np.ndarray, np.ndarray],
+                       new: Tuple[np.ndarray, np.ndarray]) -> int:
+    """Move every numeric split of ``model``'s trees to the new scaled space; returns splits moved."""
+    position = {name: i for i, name in enumerate(scaler_names)}
+    column = np.array([position.get(name, -1) for name in feature_names])
+    (old_mean, old_scale), (new_mean, new_scale) = old, new
+    moved = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        state = tree.__getstate__()
+        nodes = state["nodes"].copy()
+        internal = nodes["left_child"] != -1
+        j = np.where(internal, column[np.maximum(nodes["feature"], 0)], -1)
+        split = j >= 0
+        threshold = nodes["threshold"][split]
+        old_mean_j, old_scale_j = old_mean[j[split]], old_scale[j[split]]
+        new_mean_j, new_scale_j = new_mean[j[split]], new_scale[j[split]]
+        raw = threshold * old_scale_j + old_mean_j
+        mapped = (raw - new_mean_j) / new_scale_j
+        # A midpoint of integer-valued inputs (61 and 63) is itself a valid
+        # input (62) whose side was decided by float32 rounding: give it the
+        # same side in the new space
+        on_grid = np.round(raw, GRID_DECIMALS)
+        tie = np.abs(raw - on_grid) <= 1e-6 * np.maximum(np.abs(on_grid), 1.0)
+        went_left = ((on_grid - old_mean_j) / old_scale_j).astype(np.float32) <= threshold
+        value = ((on_grid - new_mean_j) / new_scale_j).astype(np.float32)
+        value = np.where(went_left, value, np.nextafter(value, np.float32(-np.inf)))
+        nodes["threshold"][split] = np.where(tie, value.astype(np.float64), mapped)
+        state["nodes"] = nodes
+        tree.__setstate__(state)
+        moved += int(split.sum())
+    return moved
+
+
+def grow(model: Any, X_new: Any, y_new: Any, n_replace: int) -> Any:
+    """Add ``n_replace`` trees fitted on the new rows to ``model``, then retire the oldest ``n_replace``."""
+    if len(np.unique(y_new)) != len(model.classes_):
+        raise ValueError("The new rows must contain every class to grow trees on them")
+    refreshed = model
+    n_trees = len(refreshed.estimators_)
+    refreshed.set_params(warm_start=True, n_estimators=n_trees + n_replace)
+    refreshed.fit(X_new, y_new)
+    # estimators_ is in creation order: the first ones are the oldest
+    refreshed.estimators_ = refreshed.estimators_[n_replace:]
+    refreshed.set_params(warm_start=False, n_estimators=n_trees)
+    return refreshed
+
+
+def refresh(
+    model: Any,
+    scaler: Any,
+    X_new: Any,
+    y_new: Any,
+    n_replace: Optional[int] = None,
+    max_share: float = DEFAULT_MAX_SHARE,
+) -> Tuple[Any, Any, Dict[str, Any]]:
+    """(refreshed model, updated scaler, details) from unscaled new rows; ``model`` is left as is."""
+    import copy
+
+    if not hasattr(model, "estimators_") or not hasattr(model, "warm_start"):
+        raise ValueError(f"Only a fitted sklearn forest can be refreshed, got {type(model).__name__}")
+    timings: Dict[str, float] = {}
+    n_seen = int(np.max(scaler.n_samples_seen_))
+    start = time.perf_counter()
+    new_scaler, old_mean, old_scale = update_scaler(scaler, X_new)
+    timings["scaler"] = time.perf_counter() - start
+
+    n_trees = len(model.estimators_)
+    if n_replace is None:
+        n_replace = trees_to_replace(n_trees, len(X_new), n_seen, max_share)
+    if not 1 <= n_replace <= n_trees:
+        raise ValueError(f"Can replace between 1 and {n_trees} trees, got {n_replace}")
+
+    start = time.perf_counter()
+    kept = copy.deepcopy(model)
+    scaler_names = list(getattr(scaler, "feature_names_in_", [c for c in NUMERIC_FEATURES if c in X_new.columns]))
+    moved = rescale_thresholds(kept, list(X_new.columns), scaler_names, (old_mean, old_scale),
+                               (np.asarray(new_scaler.mean_), np.asarray(new_scaler.scale_)))
+    timings["thresholds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    refreshed = grow(kept, _scale(X_new, new_scaler), y_new, n_replace)
+    timings["trees"] = time.perf_counter() - start
+    return refreshed, new_scaler, {
+        "rows_seen_before": n_seen,
+        "rows_new": len(X_new),
+        "trees_replaced": n_replace,
+        "trees": len(refreshed.estimators_),
+        "splits_rescaled": moved,
+        "seconds": {name: round(seconds, 4) for name, seconds in timings.items()},
+    }
+
+
+def full_retrain(model: Any, X: Any, y: Any) -> Tuple[Any, Any]:
+    """Scaler + forest refitted from scratch with ``model``'s parameters (the baseline)."""
+    from sklearn.base import clone
+    from sklearn.preprocessing import StandardScaler
+
+    num_cols = [c for c in NUMERIC_FEATURES if c in X.columns]
+    scaler = StandardScaler().fit(X[num_cols])
+    forest = clone(model).set_params(warm_start=False)
+    forest.fit(_scale(X, scaler), y)
+    return forest, scaler
+
+
+def save_pair(model: Any, scaler: Any, out_dir: str | Path, X_check: Any, feature_order: Any = FEATURE_ORDER) -> Dict[str, str]:
+    """Write the joblib pair and, when they match sklearn on ``X_check`` (scaled), the compiled exports."""
+    import joblib
+
+    from cardio.forest import CompiledForest, check_parity
+    from cardio.dataset import file_sha256
+    from cardio.portable import export as export_bundle
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    joblib.dump(model, out_dir / "rf_cardio_model.joblib")
+    joblib.dump(scaler, out_dir / "scaler_cardio.joblib")
+    with (out_dir / "features.json").open("w", encoding="utf-8") as fh:
+        json.dump(list(feature_order), fh, ensure_ascii=False, indent=2)
+    compiled = CompiledForest.from_sklearn(model)
+    parity = check_parity(model, compiled, X_check)
+    if parity["label_mismatches"] == 0 and parity["max_proba_diff"] <= 1e-12:
+        compiled.save(out_dir / "rf_cardio_model.npz")
+        export_bundle(compiled, scaler, out_dir / "cardio_model.cardio", list(feature_order))
+    else:
+        (out_dir / "rf_cardio_model.npz").unlink(missing_ok=True)
+        (out_dir / "cardio_model.cardio").unlink(missing_ok=True)
+    written = {}
+    for name in ("rf_cardio_model.joblib", "scaler_cardio.joblib", "features.json", "rf_cardio_model.npz", "cardio_model.cardio"):
+        path = out_dir / name
+        if path.exists():
+            written[str(path)] = file_sha256(path)
+    return written
+
+
+def main(argv: Any = None) -> None:
+    import joblib
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+
+    parser = argparse.ArgumentParser(description="Refresh the scaler + forest pair with new labelled rows only")
+    parser.add_argument("new", help="New labelled rows (cardio_train.csv format, age in days)")
+    parser.add_argument("--model", default="rf_cardio_model.joblib", help="Current sklearn forest (.joblib)")
+    parser.add_argument("--scaler", default="scaler_cardio.joblib")
+    parser.add_argument("--out-dir", default="refreshed", help="Where the refreshed pair and report are written")
+    parser.add_argument("--trees", type=int, default=None, help="Trees to replace (default: the new rows' share)")
+    parser.add_argument("--max-share", type=float, default=DEFAULT_MAX_SHARE, help="Most trees replaced per refresh, as a fraction")
+    parser.add_argument("--holdout", default=None, help="Labelled CSV to evaluate on (default: part of the new rows)")
+    parser.add_argument("--holdout-fraction", type=float, default=DEFAULT_HOLDOUT_FRACTION)
+    parser.add_argument("--history", default=None, help="Rows the current model was trained on, to compare with a full retrain")
+    parser.add_argument("--sep", default=";")
+    parser.add_argument("--random-state", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    if Path(args.model).suffix != ".joblib":
+        raise SystemExit(f"Only the sklearn forest (.joblib) can be refreshed, got {args.model}")
+    model, scaler = joblib.load(args.model), joblib.load(args.scaler)
+    X_new, y_new = load_rows(args.new, args.sep)
+    if args.holdout:
+        X_hold, y_hold = load_rows(args.holdout, args.sep)
+    else:
+        X_new, X_hold, y_new, y_hold = train_test_split(
+            X_new, y_new, test_size=args.holdout_fraction, random_state=args.random_state, stratify=y_new
+        )
+
+    try:
+        refreshed, new_scaler, details = refresh(model, scaler, X_new, y_new, args.trees, args.max_share)
+    except ValueError as exc:
+        raise SystemExit(str(exc))
+    start = time.perf_counter()
+    written = save_pair(refreshed, new_scaler, args.out_dir, _scale(X_hold, new_scaler))
+    details["seconds"]["save"] = round(time.perf_counter() - start, 4)
+    details["seconds"]["total"] = round(sum(details["seconds"].values()), 4)
+
+    report: Dict[str, Any] = {
+        "refresh": details,
+        "holdout_rows": len(X_hold),
+        "metrics": {
+            "previous": _evaluate(model, _scale(X_hold, scaler), y_hold),
+            "refreshed": _evaluate(refreshed, _scale(X_hold, new_scaler), y_hold),
+        },
+        "written": written,
+    }
+    if args.history:
+        X_hist, y_hist = load_rows(args.history, args.sep)
+        start = time.perf_counter()
+        full_model, full_scaler = full_retrain(model, pd.concat([X_hist, X_new]), pd.concat([y_hist, y_new]))
+        report["full_retrain"] = {"rows": len(X_hist) + len(X_new), "seconds": round(time.perf_counter() - start, 4)}
+        report["metrics"]["full_retrain"] = _evaluate(full_model, _scale(X_hold, full_scaler), y_hold)
+
+    with (Path(args.out_dir) / "refresh_report.json").open("w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""In-process registry of loaded model versions with background warm-up.
+
+A ``ModelVersion`` is everything one request needs (model, scaler, feature
+order) plus where it came from. Handlers take ``registry.current()`` once
+and use that snapshot to the end, so a swap never changes the model under
+a request that is already running. Loading goes through a user-supplied
+``loader(source) -> ModelVersion``, then the new version scores a set of
+warm-up rows (first-call costs such as page faults of memory-mapped arrays
+and lazy imports are paid here, and a version that cannot score is never
+activated), and only then replaces the current one in a single assignment.
+The path explainer of tree models (``cardio.explain``) is built during the
+load, before activation, when the model already is a ``CompiledForest``
+(compiled / portable backends: the explainer only adds per-node deltas).
+With the sklearn backend it holds a compiled copy of the forest, so it is
+built at load only with ``explain_preload`` and otherwise by the first
+explain call on the version.
+
+Loads run on one background thread at a time; ``status()`` reports
+``idle`` / ``loading`` / ``ready`` / ``failed`` and the active version.
+"""
+from __future__ import annotations
+
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from cardio.features import FEATURE_ORDER, build_features, scale_features
+from cardio.forest import CompiledForest, predict_with_proba
+from cardio.timing import StageTimer
+
+WARMUP_ROWS = 64
+WARMUP_ROUNDS = 3
+# Previous versions kept for rollback(); each one keeps its model in memory
+DEFAULT_HISTORY = 1
+
+
+def warmup_rows(n: int = WARMUP_ROWS, seed: int = 0) -> np.ndarray:
+    """Raw (n, 11) rows of synthetic patients, RAW_FIELDS order."""
+    from cardio.features import RAW_FIELDS
+    from cardio.synthetic import synthetic_columns
+
+    columns = synthetic_columns(n, seed)
+    return np.column_stack([np.asarray(columns[name], dtype=np.float64) for name in RAW_FIELDS])
+
+
+@dataclass
+class ModelVersion:
+    """One loaded model + scaler pair, immutable once activated."""
+
+    version: str
+    model: Any
+    scaler: Any
+    feature_order: List[str] = field(default_factory=lambda: list(FEATURE_ORDER))
+    source: Dict[str, Any] = field(default_factory=dict)
+    # Per-artifact details (sizes, checksums, cache status, load seconds)
+    artifacts: Dict[str, Any] = field(default_factory=dict)
+    loaded_at: float = field(default_factory=time.time)
+    warmup: Dict[str, Any] = field(default_factory=dict)
+    # Training-set sketch (cardio.drift) that live inputs are compared against
+    drift_reference: Any = None
+    # cardio.explain.PathExplainer, built at load or on first use (see path_explainer)
+    explainer: Any = None
+    _explainer_lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+    _explainer_built: bool = field(default=False, repr=False, compare=False)
+
+    def score(self, X: np.ndarray, timer: Any = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Labels and P(class 1) for the unscaled (n, 18) feature matrix."""
+        timer = timer or StageTimer(enabled=False)
+        with timer.span("scale"):
+            scaled = scale_features(X, self.scaler, self.feature_order)
+        with timer.span("predict"):
+            if hasattr(self.model, "predict_proba"):
+                labels, proba = predict_with_proba(self.model, scaled)
+                return labels, proba[:, 1]
+            labels = self.model.predict(scaled)
+            return labels, np.zeros(len(labels))
+
+    def explain(self, X: np.ndarray, timer: Any = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Path contributions (n, 18) and forest P(class 1) for the unscaled feature matrix."""
+        explainer = self.path_explainer()
+        if explainer is None:
+            raise ValueError(f"Model {type(self.model).__name__} cannot be explained")
+        timer = timer or StageTimer(enabled=False)
+        with timer.span("scale"):
+            scaled = scale_features(X, self.scaler, self.feature_order)
+        with timer.span("explain"):
+            return explainer.explain(scaled)
+
+    @property
+    def explainable(self) -> bool:
+        from cardio.explain import is_tree_ensemble
+
+        return self.explainer is not None or is_tree_ensemble(self.model)
+
+    def path_explainer(self) -> Any:
+        """The path explainer, built once by the first caller; None if the model is not a tree ensemble."""
+        if self.explainer is None and not self._explainer_built:
+            with self._explainer_lock:
+                if self.explainer is None and not self._explainer_built:
+                    self.explainer = _explainer(self)
+                    self._explainer_built = True
+        return self.explainer
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "backend": type(self.model).__name__,
+            "loaded_at": self.loaded_at,
+            "artifacts": self.artifacts,
+            "warmup": self.warmup,
+            "explainable": self.explainable,
+            "explainer_built": self.explainer is not None,
+        }
+
+
+def warm_up(candidate: ModelVersion, rows: np.ndarray, rounds: int = WARMUP_ROUNDS) -> Dict[str, Any]:
+    """Score ``rows`` a few times; raises if the outputs are unusable."""
+    X = build_features(rows, candidate.feature_order)
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        labels, proba = candidate.score(X)
+        timings.append(time.perf_counter() - start)
+    proba = np.asarray(proba, dtype=np.float64)
+    if len(labels) != len(rows) or not np.all(np.isfinite(proba)) or proba.min() < 0 or proba.max() > 1:
+        raise ValueError(f"Warm-up of version {candidate.version} produced invalid predictions")
+    report = {
+        "rows": len(rows),
+        "first_ms": round(timings[0] * 1000, 3),
+        "warm_ms": round(min(timings) * 1000, 3),
+        "positive_rate": round(float(np.mean(proba > 0.5)), 4),
+    }
+    if candidate.explainer is not None:
+        # Only when built at load: warming must not build one
+        start = time.perf_counter()
+        candidate.explain(X[:1])
+        report["explain_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return report
+
+
+class ModelRegistry:
+    """The active ``ModelVersion`` plus a background loader for the next one."""
+
+    def __init__(
+        self,
+        loader: Callable[[Dict[str, Any]], ModelVersion],
+        rows: Optional[np.ndarray] = None,
+        history: int = DEFAULT_HISTORY,
+        explain_preload: bool = False,
+    ) -> None:
+        self.loader = loader
+        self.rows = rows
+        # Also build the explainer at load when it copies the forest (sklearn)
+        self.explain_preload = explain_preload
+        self._current: Optional[ModelVersion] = None
+        self._previous: Deque[ModelVersion] = deque(maxlen=max(0, history))
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self._loading: Optional[Dict[str, Any]] = None
+        self._error: Optional[str] = None
+        self._listeners: List[Callable[[ModelVersion], None]] = []
+        self.swaps = 0
+
+    # --- reading ---
+    def current(self) -> Optional[ModelVersion]:
+        return self._current
+
+    @property
+    def state(self) -> str:
+        if self._loading is not None:
+            return "loading"
+        if self._error is not None and self._current is None:
+            return "failed"
+        return "ready" if self._current is not None else "idle"
+
+    def on_swap(self, callback: Callable[[ModelVersion], None]) -> None:
+        """Call ``callback(version)`` whenever a version becomes active."""
+        self._listeners.append(callback)
+
+    # --- loading ---
+    def load(self, source: Optional[Dict[str, Any]] = None, activate: bool = True) -> ModelVersion:
+        """Load, warm and (by default) activate a version on the calling thread."""
+        source = dict(source or {})
+        start = time.perf_counter()
+        candidate = self.loader(source)
+        if self.explain_preload or _shares_forest(candidate.model):
+            candidate.path_explainer()
+        if self.rows is None:
+            self.rows = warmup_rows()
+        candidate.warmup = warm_up(candidate, self.rows)
+        candidate.warmup["load_seconds"] = round(time.perf_counter() - start, 4)
+        if activate:
+            self.activate(candidate)
+        return candidate
+
+    def activate(self, candidate: ModelVersion) -> None:
+        with self._lock:
+            previous = self._current
+            if previous is not None and previous.version == candidate.version:
+                # Same artifacts reloaded: keep the warm instance already serving
+                self._error = None
+                self._ready.notify_all()
+                return
+            if previous is not None:
+                self._previous.appendleft(previous)
+            # Rolling back to the version being activated would be a no-op
+            for stale in [v for v in self._previous if v.version == candidate.version]:
+                self._previous.remove(stale)
+            # The swap: requests that already hold ``previous`` keep using it
+            self._current = candidate
+            self._error = None
+            self.swaps += 1
+            self._ready.notify_all()
+        for callback in self._listeners:
+            callback(candidate)
+
+    def rollback(self) -> ModelVersion:
+        """Reactivate the most recent previous version."""
+        with self._lock:
+            if not self._previous:
+                raise LookupError("No previous model version to roll back to")
+            candidate = self._previous.popleft()
+        self.activate(candidate)
+        return candidate
+
+    def load_async(self, source: Optional[Dict[str, Any]] = None) -> bool:
+        """Start loading ``source`` in the background; False if a load is already running."""
+        with self._lock:
+            if self._loading is not None:
+                return False
+            self._loading = {"source": dict(source or {}), "started_at": time.time()}
+            self._thread = threading.Thread(target=self._run, args=(dict(source or {}),), name="model-loader", daemon=True)
+            self._thread.start()
+        return True
+
+    def ensure_loaded(self, source: Optional[Dict[str, Any]] = None) -> None:
+        """Start the first load in the background unless one is active or done."""
+        if self._current is None and self._loading is None:
+            self.load_async(source)
+
+    def _run(self, source: Dict[str, Any]) -> None:
+        try:
+            self.load(source)
+        except Exception as exc:
+            traceback.print_exc()
+            with self._lock:
+                self._error = f"{type(exc).__name__}: {exc}"
+        finally:
+            with self._lock:
+                self._loading = None
+                self._ready.notify_all()
+
+    def wait(self, timeout: Optional[float] = None, source: Optional[Dict[str, Any]] = None) -> ModelVersion:
+        """The active version, loading it first (and waiting for it) if needed."""
+        self.ensure_loaded(source)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._current is None and self._loading is not None:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("Model is still loading")
+                self._ready.wait(remaining)
+            if self._current is None:
+                raise RuntimeError(f"Model Load Failed: {self._error or 'no model loaded'}")
+            return self._current
+
+    def status(self) -> Dict[str, Any]:
+        current = self._current
+        loading = self._loading
+        return {
+            "state": self.state,
+            "version": current.version if current is not None else None,
+            "current": current.describe() if current is not None else None,
+            "loading": dict(loading, source=_public(loading["source"])) if loading else None,
+            "previous": [version.version for version in self._previous],
+            "swaps": self.swaps,
+            "error": self._error,
+        }
+
+
+def _shares_forest(model: Any) -> bool:
+    """True if an explainer of ``model`` would reuse its arrays instead of compiling a copy."""
+    return isinstance(getattr(model, "forest", model), CompiledForest)
+
+
+def _explainer(candidate: ModelVersion) -> Any:
+    from cardio.explain import PathExplainer
+
+    try:
+        return PathExplainer.from_model(candidate.model, candidate.feature_order)
+    except ValueError:
+        return None
+
+
+def _public(source: Dict[str, Any]) -> Dict[str, Any]:
+    """Source description without query strings (signed URLs carry tokens)."""
+    return {key: str(value).split("?", 1)[0] for key, value in source.items()}
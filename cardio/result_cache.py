@@ -0,0 +1,157 @@
+"""Bounded in-process cache of prediction results.
+
+Screening traffic repeats the same small-integer inputs, and the frontend
+resends identical payloads, so both services look every validated record
+up before building features. The key is the canonical 11-field raw input
+(``RAW_FIELDS`` order, every value as a float, so ``70`` and ``70.0`` hit
+the same entry). Entries expire after ``ttl_seconds`` and the least
+recently used one is evicted past ``max_entries``. ``bind`` ties the cache
+to a model version: binding a different version drops every entry.
+
+``RESULT_CACHE_SIZE`` (default 10000, 0 disables) and ``RESULT_CACHE_TTL``
+(seconds, default 3600) configure the caches built by ``from_env``.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TTL_SECONDS = 3600.0
+# Per-entry bookkeeping of the OrderedDict (links + hash slot), roughly
+ENTRY_OVERHEAD_BYTES = 100
+
+_MISSING = object()
+
+
+def canonical_key(row: Iterable[Any]) -> Tuple[float, ...]:
+    """Validated raw inputs as a hashable tuple of floats."""
+    return tuple(float(value) for value in row)
+
+
+def model_version(*parts: Any) -> str:
+    """Short version id from artifact checksums or files (path, size and mtime)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, Path) and part.exists():
+            stat = part.stat()
+            part = f"{part.resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def _sizeof(value: Any) -> int:
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        size += sum(_sizeof(item) for item in value)
+    return size
+
+
+class ResultCache:
+    """Thread-safe LRU + TTL map from canonical inputs to results."""
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = float(ttl_seconds)
+        self.clock = clock
+        self.version: Optional[str] = None
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    @classmethod
+    def from_env(cls) -> "ResultCache":
+        return cls(
+            int(os.environ.get("RESULT_CACHE_SIZE", DEFAULT_MAX_ENTRIES)),
+            float(os.environ.get("RESULT_CACHE_TTL", DEFAULT_TTL_SECONDS)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def bind(self, version: str) -> None:
+        """Use results of model ``version`` only; drops everything if it changed."""
+        with self._lock:
+            if version != self.version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._bytes = 0
+                self.version = version
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if not self.enabled:
+            return default
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires, value, size = entry
+            if expires <= self.clock():
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, version: Optional[str] = None) -> None:
+        """Store ``value``; skipped if it was computed by a model other than the bound one."""
+        if not self.enabled:
+            return
+        size = _sizeof(key) + _sizeof(value) + ENTRY_OVERHEAD_BYTES
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (self.clock() + self.ttl, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "version": self.version,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "approx_bytes": self._bytes,
+            }
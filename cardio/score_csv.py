@@ -0,0 +1,254 @@
+"""Streaming, parallel scorer for ``cardio_train.csv``-style exports.
+
+The input (semicolon-separated, ``age`` in days) is read in fixed-size
+chunks, cleaned with the training outlier filter, turned into features with
+``cardio.features`` and scored in a process pool. Results are written as
+they arrive, in input order, so memory stays bounded by
+``chunksize * (workers + queue)`` rows whatever the file size. Every output
+row carries ``row``, the 0-based position of its record among the input's
+data rows, so predictions join back to the source even without an ``id``
+column and with the filtered rows missing::
+
+    python -m cardio.score_csv cardio_train.csv predictions.csv \\
+        --model rf_cardio_model.npz --scaler scaler_cardio.joblib --workers 4
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from cardio.features import (
+    FEATURE_ORDER,
+    RAW_FIELDS,
+    age_years_from_days,
+    build_features,
+    clean_mask,
+    scale_features,
+)
+from cardio.forest import load_model, predict_with_proba
+
+DEFAULT_CHUNKSIZE = 50_000
+INPUT_COLUMNS = ("id",) + RAW_FIELDS
+
+# Model and scaler of the current worker process (see _init_worker)
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(model_path: str, scaler_path: str, backend: str) -> None:
+    import joblib
+
+    # One process per core already; keep each scorer single-threaded
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+    model = load_model(model_path, backend, mmap_mode="r")
+    if hasattr(model, "n_jobs"):
+        model.n_jobs = 1
+    _worker["model"] = model
+    _worker["scaler"] = joblib.load(scaler_path)
+
+
+def score_frame(frame: pd.DataFrame, model: Any, scaler: Any) -> pd.DataFrame:
+    """Clean, engineer and score one chunk of raw rows.
+
+    Rows rejected by the outlier filter are dropped, as in training. The
+    chunk's index (the source row numbers when read by ``pd.read_csv``) is
+    written as the ``row`` column.
+    """
+    keep = clean_mask(frame)
+    frame = frame[keep]
+    columns = {field: frame[field].to_numpy() for field in RAW_FIELDS}
+    columns["age"] = age_years_from_days(columns["age"])
+    raw = np.column_stack([np.asarray(columns[field], dtype=np.float64) for field in RAW_FIELDS])
+
+    out = pd.DataFrame(index=frame.index)
+    out["row"] = frame.index.to_numpy(dtype=np.int64)
+    if "id" in frame.columns:
+        out["id"] = frame["id"].to_numpy()
+    if len(frame):
+        scaled = scale_features(build_features(raw, FEATURE_ORDER), scaler, FEATURE_ORDER)
+        preds, proba = predict_with_proba(model, scaled)
+        out["prediction"] = preds.astype(np.int8)
+        out["probability"] = proba[:, 1]
+    else:
+        out["prediction"] = np.empty(0, dtype=np.int8)
+        out["probability"] = np.empty(0, dtype=np.float64)
+    return out
+
+
+def _score_chunk(frame: pd.DataFrame) -> pd.DataFrame:
+    return score_frame(frame, _worker["model"], _worker["scaler"])
+
+
+class _CsvWriter:
+    def __init__(self, path: Path) -> None:
+        self.fh = path.open("w", encoding="utf-8", newline="")
+        self.header = True
+
+    def write(self, frame: pd.DataFrame) -> None:
+        frame.to_csv(self.fh, index=False, header=self.header)
+        self.header = False
+
+    def close(self) -> None:
+        self.fh.close()
+
+
+class _ParquetWriter:
+    def __init__(self, path: Path) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as exc:  # pragma: no cover - optional dependency
+            raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)") from exc
+        self.pa = pa
+        self.pq = pq
+        self.path = path
+        self.writer = None
+
+    def write(self, frame: pd.DataFrame) -> None:
+        table = self.pa.Table.from_pandas(frame, preserve_index=False)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(str(self.path), table.schema)
+        self.writer.write_table(table)
+
+    def close(self) -> None:
+        if self.writer is None:
+            # Empty input: still leave a readable file with the output schema
+            empty = pd.DataFrame({
+                "row": np.empty(0, np.int64),
+                "prediction": np.empty(0, np.int8),
+                "probability": np.empty(0),
+            })
+            self.pq.write_table(self.pa.Table.from_pandas(empty, preserve_index=False), str(self.path))
+        else:
+            self.writer.close()
+
+
+def _writer(path: Path, fmt: Optional[str]):
+    fmt = fmt or ("parquet" if path.suffix.lower() in (".parquet", ".pq") else "csv")
+    if fmt == "parquet":
+        return _ParquetWriter(path)
+    if fmt == "csv":
+        return _CsvWriter(path)
+    raise ValueError(f"Unknown output format: {fmt}")
+
+
+def _read_chunks(path: str | Path, chunksize: int, sep: str) -> Iterator[pd.DataFrame]:
+    header = pd.read_csv(path, sep=sep, nrows=0).columns
+    missing = [field for field in RAW_FIELDS if field not in header]
+    if missing:
+        raise ValueError(f"Input is missing column(s): {', '.join(missing)}")
+    usecols = [name for name in INPUT_COLUMNS if name in header]
+    yield from pd.read_csv(path, sep=sep, usecols=usecols, chunksize=chunksize)
+
+
+def score_csv(
+    input_path: str | Path,
+    output_path: str | Path,
+    model_path: str | Path,
+    scaler_path: str | Path,
+    backend: str = "sklearn",
+    workers: Optional[int] = None,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    sep: str = ";",
+    fmt: Optional[str] = None,
+    progress: bool = False,
+) -> Dict[str, Any]:
+    """Score ``input_path`` chunk by chunk and write predictions in input order.
+
+    ``workers=0`` scores in this process. At most ``2 * workers`` chunks are
+    in flight, so a slow writer or a huge file cannot grow memory.
+    Returns a summary with row counts and throughput.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    start = time.perf_counter()
+    rows_in = rows_out = 0
+    writer = _writer(Path(output_path), fmt)
+
+    def emit(result: pd.DataFrame) -> None:
+        nonlocal rows_out
+        writer.write(result)
+        rows_out += len(result)
+        if progress:
+            elapsed = time.perf_counter() - start
+            print(f"{rows_in} rows read, {rows_out} scored, {rows_out / elapsed:,.0f} rows/s", file=sys.stderr)
+
+    try:
+        chunks = _read_chunks(input_path, chunksize, sep)
+        if workers <= 0:
+            _init_worker(str(model_path), str(scaler_path), backend)
+            for frame in chunks:
+                rows_in += len(frame)
+                emit(_score_chunk(frame))
+        else:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(str(model_path), str(scaler_path), backend),
+            ) as pool:
+                pending: Deque[Future] = deque()
+                for frame in chunks:
+                    rows_in += len(frame)
+                    pending.append(pool.submit(_score_chunk, frame))
+                    del frame
+                    if len(pending) >= 2 * workers:
+                        emit(pending.popleft().result())
+                while pending:
+                    emit(pending.popleft().result())
+    finally:
+        writer.close()
+
+    seconds = time.perf_counter() - start
+    return {
+        "input": str(input_path),
+        "output": str(output_path),
+        "rows": rows_in,
+        "scored": rows_out,
+        "filtered": rows_in - rows_out,
+        "workers": workers,
+        "chunksize": chunksize,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(rows_in / seconds, 1) if seconds else 0.0,
+    }
+
+
+def main(argv: Any = None) -> None:
+    parser = argparse.ArgumentParser(description="Score a cardio_train.csv-style file in parallel chunks")
+    parser.add_argument("input", help="Semicolon-separated CSV with the raw columns (age in days)")
+    parser.add_argument("output", help="Output file (.csv or .parquet)")
+    parser.add_argument("--model", default="rf_cardio_model.joblib", help="Model artifact (.joblib or .npz)")
+    parser.add_argument("--scaler", default="scaler_cardio.joblib")
+    parser.add_argument("--backend", default=os.environ.get("MODEL_BACKEND", "sklearn"), choices=("sklearn", "compiled"))
+    parser.add_argument("--workers", type=int, default=None, help="Scoring processes (default: CPU count, 0 = in-process)")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--sep", default=";")
+    parser.add_argument("--format", choices=("csv", "parquet"), default=None)
+    parser.add_argument("--progress", action="store_true", help="Print throughput after every chunk")
+    args = parser.parse_args(argv)
+
+    summary = score_csv(
+        args.input,
+        args.output,
+        args.model,
+        args.scaler,
+        backend=args.backend,
+        workers=args.workers,
+        chunksize=args.chunksize,
+        sep=args.sep,
+        fmt=args.format,
+        progress=args.progress,
+    )
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""Successive-halving replacement for the CELL 15 ``GridSearchCV``.
+
+The exhaustive search fits 12 forests x 3 folds from scratch with
+``n_jobs=-1`` nested inside ``n_jobs=-1``. Here:
+
+* candidates that differ only in ``n_estimators`` share one warm-started
+  forest per fold (sklearn draws tree seeds so that growing 100 -> 200
+  trees gives exactly the 200-tree forest), so the 100- and 200-tree
+  candidates cost one 200-tree fit;
+* every rung trains on a nested subsample of each training fold and keeps
+  the best ``1 / factor`` of those groups; the last rung uses the full folds in
+  their original order, so its scores equal GridSearchCV's;
+* fold arrays are converted to float32 and sliced once, then shared by all
+  fits of a rung;
+* one process pool runs (candidate group, fold) tasks with single-threaded
+  forests instead of nesting pools.
+
+    python -m cardio.search --csv cardio_train.csv --verify
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_GRID = {
+    "n_estimators": [100, 200],
+    "max_depth": [None, 10, 20],
+    "min_samples_split": [2, 5],
+}
+
+
+@dataclass
+class Candidate:
+    index: int  # position in ParameterGrid order (GridSearchCV's tie-break)
+    params: Dict[str, Any]
+    scores: Dict[int, List[float]] = field(default_factory=dict)  # rung -> fold scores
+    fit_seconds: Dict[int, float] = field(default_factory=dict)  # rung -> summed over folds
+
+    def mean_score(self, rung: int) -> float:
+        return float(np.mean(self.scores[rung]))
+
+
+@dataclass
+class SearchResult:
+    best_params: Dict[str, Any]
+    best_score: float
+    best_estimator: Any
+    rungs: List[Dict[str, Any]]
+    seconds: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "best_params": self.best_params,
+            "best_score": round(self.best_score, 6),
+            "seconds": round(self.seconds, 3),
+            "rungs": self.rungs,
+        }
+
+
+def _fit_group(
+    base_params: Mapping[str, Any],
+    n_estimators: Sequence[int],
+    X_train: np.ndarray,
+    y_train: np.ndarray,
+    X_val: np.ndarray,
+    y_val: np.ndarray,
+    scoring: str,
+    random_state: int,
+) -> List[Tuple[int, float, float]]:
+    """Grow one warm-started forest through ``n_estimators``; (trees, score, fit seconds) per size."""
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import get_scorer
+
+    scorer = get_scorer(scoring)
+    model = RandomForestClassifier(random_state=random_state, n_jobs=1, warm_start=True, **base_params)
+    results = []
+    fitted = 0.0
+    for trees in sorted(n_estimators):
+        model.set_params(n_estimators=trees)
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        fitted += time.perf_counter() - start
+        results.append((trees, float(scorer(model, X_val, y_val)), fitted))
+    return results
+
+
+def halving_search(
+    X: Any,
+    y: Any,
+    param_grid: Mapping[str, Sequence[Any]] = DEFAULT_GRID,
+    cv: int = 3,
+    scoring: str = "f1",
+    factor: int = 3,
+    min_samples: Optional[int] = None,
+    random_state: int = 42,
+    n_jobs: int = -1,
+    refit: bool = True,
+    log: Callable[[str], None] = print,
+) -> SearchResult:
+    """Successive halving over training samples with warm-started tree counts.
+
+    ``min_samples`` is the per-fold training size of the first rung
+    (default: full size / factor ** (rungs - 1), with enough rungs to get
+    down to a couple of candidates).
+    """
+    from joblib import Parallel, delayed
+    from sklearn.model_selection import ParameterGrid, StratifiedKFold
+
+    start = time.perf_counter()
+    X32 = np.ascontiguousarray(np.asarray(X, dtype=np.float32))
+    y_arr = np.asarray(y)
+    # Same folds as GridSearchCV(cv=int) for a classifier
+    folds = []
+    rng = np.random.default_rng(random_state)
+    for train_idx, val_idx in StratifiedKFold(n_splits=cv).split(X32, y_arr):
+        # Rungs train on prefixes of one fixed permutation, so smaller
+        # subsamples are nested in larger ones
+        order = rng.permutation(len(train_idx))
+        folds.append((X32[train_idx], y_arr[train_idx], X32[val_idx], y_arr[val_idx], order))
+    fold_size = min(len(fold[1]) for fold in folds)
+
+    candidates = [Candidate(i, dict(params)) for i, params in enumerate(ParameterGrid(dict(param_grid)))]
+    # Candidates differing only in n_estimators are one warm-started fit, so
+    # halving eliminates whole groups and every tree count comes for free
+    groups: Dict[str, Tuple[Dict[str, Any], List[Candidate]]] = {}
+    for candidate in candidates:
+        base = {k: v for k, v in candidate.params.items() if k != "n_estimators"}
+        groups.setdefault(json.dumps(base, sort_keys=True, default=repr), (base, []))[1].append(candidate)
+
+    n_rungs = max(1, math.ceil(math.log(len(groups), factor))) if len(groups) > 1 else 1
+    if min_samples is not None:
+        n_rungs = min(n_rungs, 1 + int(math.log(max(fold_size / min_samples, 1), factor)))
+    sizes = [max(1, fold_size // factor ** (n_rungs - 1 - r)) for r in range(n_rungs)]
+
+    alive = list(groups.values())
+    rungs = []
+    with Parallel(n_jobs=n_jobs) as pool:
+        for rung, size in enumerate(sizes):
+            if rung == len(sizes) - 1:
+                size = None  # full folds
+
+            rung_folds = []
+            for X_tr, y_tr, X_val, y_val, order in folds:
+                if size is not None:
+                    # Bootstrap draws depend on row order: keep the fold's order
+                    rows = np.sort(order[:size])
+                    X_tr, y_tr = X_tr[rows], y_tr[rows]
+                rung_folds.append((X_tr, y_tr, X_val, y_val))
+
+            tasks = []
+            for base, members in alive:
+                trees = sorted({member.params.get("n_estimators", 100) for member in members})
+                for X_tr, y_tr, X_val, y_val in rung_folds:
+                    tasks.append((base, members, trees, X_tr, y_tr, X_val, y_val))
+            results = pool(
+                delayed(_fit_group)(base, trees, X_tr, y_tr, X_val, y_val, scoring, random_state)
+                for base, _, trees, X_tr, y_tr, X_val, y_val in tasks
+            )
+
+            for (_, members, *_), fitted in zip(tasks, results):
+                by_trees = {trees: (score, seconds) for trees, score, seconds in fitted}
+                for member in members:
+                    score, seconds = by_trees[member.params.get("n_estimators", 100)]
+                    member.scores.setdefault(rung, []).append(score)
+                    member.fit_seconds[rung] = member.fit_seconds.get(rung, 0.0) + seconds
+
+            samples = len(folds[0][1]) if size is None else size
+            ranked = sorted(
+                (c for _, members in alive for c in members),
+                key=lambda c: (-c.mean_score(rung), c.index),
+            )
+            for candidate in ranked:
+                log(
+                    f"rung {rung} | {samples} samples/fold | {json.dumps(candidate.params, default=repr)} "
+                    f"| {scoring} {candidate.mean_score(rung):.4f} | fit {candidate.fit_seconds[rung]:.2f}s"
+                )
+            rungs.append({
+                "rung": rung,
+                "samples_per_fold": samples,
+                "candidates": [
+                    {
+                        "params": c.params,
+                        "score": round(c.mean_score(rung), 6),
+                        "fit_seconds": round(c.fit_seconds[rung], 3),
+                    }
+                    for c in ranked
+                ],
+            })
+            if rung < len(sizes) - 1:
+                # Groups ranked by their best member
+                alive.sort(key=lambda group: min((-c.mean_score(rung), c.index) for c in group[1]))
+                alive = alive[:max(1, math.ceil(len(alive) / factor))]
+
+    last = len(sizes) - 1
+    best = min((c for _, members in alive for c in members), key=lambda c: (-c.mean_score(last), c.index))
+    best_estimator = None
+    if refit:
+        from sklearn.ensemble import RandomForestClassifier
+
+        best_estimator = RandomForestClassifier(random_state=random_state, n_jobs=n_jobs, **best.params)
+        best_estimator.fit(X, y)
+    seconds = time.perf_counter() - start
+    log(f"best {json.dumps(best.params, default=repr)} {scoring} {best.mean_score(last):.4f} in {seconds:.1f}s")
+    return SearchResult(best.params, best.mean_score(last), best_estimator, rungs, seconds)
+
+
+def grid_search(
+    X: Any,
+    y: Any,
+    param_grid: Mapping[str, Sequence[Any]] = DEFAULT_GRID,
+    cv: int = 3,
+    scoring: str = "f1",
+    random_state: int = 42,
+    n_jobs: int = -1,
+    verbose: int = 0,
+) -> Any:
+    """The exhaustive CELL 15 search, with one pool (forests are single-threaded)."""
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import GridSearchCV
+
+    gs = GridSearchCV(
+        RandomForestClassifier(random_state=random_state, n_jobs=1),
+        dict(param_grid),
+        cv=cv,
+        scoring=scoring,
+        n_jobs=n_jobs,
+        verbose=verbose,
+    )
+    gs.fit(X, y)
+    return gs
+
+
+def main(argv: Any = None) -> None:
+    parser = argparse.ArgumentParser(description="Successive-halving search for the random forest")
+    parser.add_argument("--csv", default="cardio_train.csv")
+    parser.add_argument("--cache-dir", default=os.environ.get("CARDIO_PIPELINE_CACHE", ".cardio-cache"))
+    parser.add_argument("--factor", type=int, default=3)
+    parser.add_argument("--min-samples", type=int, default=None)
+    parser.add_argument("--jobs", type=int, default=-1)
+    parser.add_argument("--verify", action="store_true", help="Also run the exhaustive grid and compare")
+    args = parser.parse_args(argv)
+
+    from cardio.pipeline import build_pipeline
+
+    # Reuse the cached split/scale stages of the training DAG
+    pipe = build_pipeline(args.csv, args.cache_dir, n_jobs=args.jobs)
+    outputs, _ = pipe.run(["split", "scale"], log=lambda line: None)
+    X_train, y_train = outputs["scale"]["X_train"], outputs["split"]["y_train"]
+
+    result = halving_search(
+        X_train, y_train,
+        factor=args.factor,
+        min_samples=args.min_samples,
+        n_jobs=args.jobs,
+        log=lambda line: print(line, file=sys.stderr),
+    )
+    summary: Dict[str, Any] = {"halving": result.to_dict()}
+    if args.verify:
+        start = time.perf_counter()
+        gs = grid_search(X_train, y_train, n_jobs=args.jobs)
+        grid_seconds = time.perf_counter() - start
+        summary["grid"] = {
+            "best_params": gs.best_params_,
+            "best_score": round(float(gs.best_score_), 6),
+            "seconds": round(grid_seconds, 3),
+        }
+        summary["same_best"] = gs.best_params_ == result.best_params
+        summary["speedup"] = round(grid_seconds / result.seconds, 2)
+    print(json.dumps(summary, indent=2, default=repr))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""Local stand-in for the MODEL_URL / SCALER_URL artifact host.
+
+Serves a directory over HTTP with ETag / Last-Modified validators and byte
+ranges, optionally dropping connections mid-body, so the artifact cache and
+the serverless loader can be exercised without the real storage bucket::
+
+    python -m cardio.standin model/ --port 8001
+    MODEL_URL=http://127.0.0.1:8001/rf_cardio_model.joblib ...
+"""
+from __future__ import annotations
+
+import argparse
+import functools
+import os
+import socket
+import threading
+from collections import Counter
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional, Sequence
+
+
+class _RangeReader:
+    """File wrapper that stops after ``remaining`` bytes."""
+
+    def __init__(self, fh: Any, remaining: int) -> None:
+        self.fh = fh
+        self.remaining = remaining
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fh.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self) -> None:
+        self.fh.close()
+
+
+class ArtifactRequestHandler(SimpleHTTPRequestHandler):
+    """Static file handler that also answers ``If-None-Match`` and ``Range``."""
+
+    protocol_version = "HTTP/1.1"
+
+    def _etag(self, path: str) -> str:
+        stat = os.stat(path)
+        return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+    def send_head(self):  # type: ignore[override]
+        path = self.translate_path(self.path)
+        self.server.requests[self.path] += 1  # type: ignore[attr-defined]
+        if not os.path.isfile(path):
+            return super().send_head()
+
+        etag = self._etag(path)
+        if self.headers.get("If-None-Match") == etag:
+            self.server.not_modified[self.path] += 1  # type: ignore[attr-defined]
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+
+        byte_range = self.headers.get("Range", "")
+        if_range = self.headers.get("If-Range")
+        if not byte_range.startswith("bytes=") or (if_range and if_range != etag):
+            return super().send_head()
+
+        size = os.path.getsize(path)
+        first, _, last = byte_range[len("bytes="):].partition("-")
+        try:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        except ValueError:
+            return super().send_head()
+        if start >= size or start > end:
+            self.send_error(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            return None
+
+        self.server.ranges[self.path] += 1  # type: ignore[attr-defined]
+        fh = open(path, "rb")
+        fh.seek(start)
+        self.send_response(HTTPStatus.PARTIAL_CONTENT)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        return _RangeReader(fh, end - start + 1)
+
+    def copyfile(self, source: Any, outputfile: Any) -> None:
+        # Optional fault injection: drop the connection part-way through a body
+        drop_after = self.server.take_fault()  # type: ignore[attr-defined]
+        if drop_after is None:
+            return super().copyfile(source, outputfile)
+        outputfile.write(source.read(drop_after))
+        outputfile.flush()
+        self.close_connection = True
+        self.connection.shutdown(socket.SHUT_RDWR)
+
+    def end_headers(self) -> None:
+        path = self.translate_path(self.path)
+        if os.path.isfile(path):
+            self.send_header("ETag", self._etag(path))
+            self.send_header("Accept-Ranges", "bytes")
+        super().end_headers()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:  # type: ignore[attr-defined]
+            super().log_message(format, *args)
+
+
+class ArtifactServer(ThreadingHTTPServer):
+    """Threaded static server that counts requests per path.
+
+    Usable as a context manager; the server runs in a daemon thread.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        directory: str,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        verbose: bool = False,
+        faults: Sequence[int] = (),
+    ) -> None:
+        handler = functools.partial(ArtifactRequestHandler, directory=directory)
+        super().__init__((host, port), handler)
+        self.verbose = verbose
+        self.requests: Counter = Counter()
+        self.not_modified: Counter = Counter()
+        self.ranges: Counter = Counter()
+        # Each entry cuts one response body after that many bytes
+        self.faults = list(faults)
+        self._faults_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def take_fault(self) -> Optional[int]:
+        with self._faults_lock:
+            return self.faults.pop(0) if self.faults else None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, name: str) -> str:
+        return f"{self.base_url}/{name}"
+
+    def __enter__(self) -> "ArtifactServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def main(argv: Any = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve model artifacts locally")
+    parser.add_argument("directory", help="Directory with the .joblib / .npz files")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args(argv)
+
+    server = ArtifactServer(args.directory, args.host, args.port, verbose=True)
+    print(f"Serving {args.directory} at {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Synthetic patients for benchmarks and local runs.
+
+Values are drawn from roughly realistic distributions and clipped to the
+ranges both ``PredictionRequest`` (inference_api.py) and the CELL 4 outlier
+filter accept, so every generated row is scoreable. ``cardio`` labels follow
+a simple logistic risk model, enough for a classifier to learn something::
+
+    python -m cardio.synthetic cardio_train.csv --rows 70000
+"""
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from cardio.features import CLEAN_LIMITS, DAYS_PER_YEAR, RAW_FIELDS
+
+# Accepted by PredictionRequest and by CLEAN_LIMITS
+AGE_RANGE = (30, 65)
+RANGES = {
+    "height": (max(120, CLEAN_LIMITS["height"][0]), min(230, CLEAN_LIMITS["height"][1])),
+    "weight": (max(25, CLEAN_LIMITS["weight"][0]), min(250, CLEAN_LIMITS["weight"][1])),
+    "ap_hi": (max(60, CLEAN_LIMITS["ap_hi"][0]), min(250, CLEAN_LIMITS["ap_hi"][1])),
+    "ap_lo": (max(40, CLEAN_LIMITS["ap_lo"][0]), min(180, CLEAN_LIMITS["ap_lo"][1])),
+}
+
+
+def synthetic_columns(n: int, seed: int = 0) -> Dict[str, np.ndarray]:
+    """``n`` patients as columns in RAW_FIELDS (age in years) plus ``cardio``."""
+    rng = np.random.default_rng(seed)
+    gender = rng.choice([1, 2], n, p=[0.65, 0.35])
+    male = gender == 2
+    age = rng.integers(AGE_RANGE[0], AGE_RANGE[1] + 1, n)
+    height = np.clip(np.round(rng.normal(np.where(male, 170, 161), 7)), *RANGES["height"])
+    bmi = np.clip(rng.lognormal(np.log(26.5), 0.17, n), 15, 60)
+    weight = np.clip(np.round(bmi * (height / 100) ** 2, 1), *RANGES["weight"])
+    ap_hi = np.clip(np.round(rng.normal(105 + 0.45 * age + 0.6 * (bmi - 26), 14) / 10) * 10, *RANGES["ap_hi"])
+    ap_lo = np.round(ap_hi * rng.uniform(0.58, 0.72, n) / 10) * 10
+    ap_lo = np.clip(ap_lo, RANGES["ap_lo"][0], np.minimum(ap_hi - 10, RANGES["ap_lo"][1]))
+    cholesterol = rng.choice([1, 2, 3], n, p=[0.75, 0.135, 0.115])
+    gluc = rng.choice([1, 2, 3], n, p=[0.85, 0.075, 0.075])
+    smoke = (rng.random(n) < np.where(male, 0.22, 0.02)).astype(np.int64)
+    alco = (rng.random(n) < np.where(male, 0.11, 0.03)).astype(np.int64)
+    active = (rng.random(n) < 0.8).astype(np.int64)
+
+    logit = (
+        -2.6 + 0.045 * age + 0.045 * (ap_hi - 120) + 0.02 * (ap_lo - 80)
+        + 0.04 * (bmi - 26) + 0.45 * (cholesterol - 1) + 0.15 * (gluc - 1)
+        - 0.15 * active + 0.05 * smoke
+    )
+    cardio = (rng.random(n) < 1 / (1 + np.exp(-logit))).astype(np.int64)
+    return {
+        "age": age,
+        "gender": gender,
+        "height": height.astype(np.int64),
+        "weight": weight,
+        "ap_hi": ap_hi.astype(np.int64),
+        "ap_lo": ap_lo.astype(np.int64),
+        "cholesterol": cholesterol,
+        "gluc": gluc,
+        "smoke": smoke,
+        "alco": alco,
+        "active": active,
+        "cardio": cardio,
+    }
+
+
+def synthetic_patients(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """``n`` request bodies for /predict (age in years, no label)."""
+    columns = synthetic_columns(n, seed)
+    return [
+        {field: columns[field][i].item() for field in RAW_FIELDS}
+        for i in range(n)
+    ]
+
+
+def write_kaggle_csv(path: str | Path, n: int, seed: int = 0) -> Path:
+    """Write ``n`` rows in the ``cardio_train.csv`` layout (``;``, age in days)."""
+    import pandas as pd
+
+    columns = synthetic_columns(n, seed)
+    rng = np.random.default_rng(seed + 1)
+    days = columns["age"] * DAYS_PER_YEAR + rng.integers(0, DAYS_PER_YEAR, n)
+    frame = pd.DataFrame({"id": np.arange(n), **columns, "age": days})
+    frame = frame[["id", *RAW_FIELDS, "cardio"]]
+    frame.to_csv(path, sep=";", index=False)
+    return Path(path)
+
+
+def main(argv: Any = None) -> None:
+    parser = argparse.ArgumentParser(description="Write a synthetic cardio_train.csv")
+    parser.add_argument("output")
+    parser.add_argument("--rows", type=int, default=70000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    print(write_kaggle_csv(args.output, args.rows, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Per-stage request timing and in-process Prometheus metrics.
+
+A ``StageTimer`` records monotonic-clock spans for one request and renders
+them as a ``Server-Timing`` header. ``METRICS`` keeps latency histograms per
+stage plus request counters for the whole process and renders them in the
+Prometheus text format. Set ``CARDIO_TIMING=0`` to turn both off.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+ENABLED = os.environ.get("CARDIO_TIMING", "1") != "0"
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+class _Span:
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer: "StageTimer", name: str) -> None:
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.timer.spans.append((self.name, (time.perf_counter_ns() - self.start) / 1e9))
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class StageTimer:
+    """Collects (stage, seconds) spans for a single request."""
+
+    __slots__ = ("enabled", "spans", "start")
+
+    def __init__(self, enabled: Optional[bool] = None) -> None:
+        self.enabled = ENABLED if enabled is None else enabled
+        self.spans: List[Tuple[str, float]] = []
+        self.start = time.perf_counter_ns()
+
+    def span(self, name: str):
+        """Context manager timing one stage."""
+        return _Span(self, name) if self.enabled else _NULL_SPAN
+
+    def add(self, name: str, seconds: float) -> None:
+        if self.enabled:
+            self.spans.append((name, seconds))
+
+    def total(self) -> float:
+        return (time.perf_counter_ns() - self.start) / 1e9
+
+    def server_timing(self) -> str:
+        """``Server-Timing`` header value, durations in milliseconds."""
+        parts = [f"{name};dur={seconds * 1e3:.3f}" for name, seconds in self.spans]
+        parts.append(f"total;dur={self.total() * 1e3:.3f}")
+        return ", ".join(parts)
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self) -> None:
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Metrics:
+    """Process-wide stage-latency histograms and request counters."""
+
+    def __init__(self, prefix: str = "cardio", enabled: Optional[bool] = None) -> None:
+        self.prefix = prefix
+        self.enabled = ENABLED if enabled is None else enabled
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[Tuple[str, str], ...], _Histogram] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+
+    def observe(self, stage: str, seconds: float, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = (("stage", stage),) + tuple(sorted(labels.items()))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(seconds)
+
+    def observe_timer(self, timer: StageTimer, **labels: str) -> None:
+        """Record every span of ``timer`` plus its total."""
+        if not (self.enabled and timer.enabled):
+            return
+        for name, seconds in timer.spans:
+            self.observe(name, seconds, **labels)
+        self.observe("total", timer.total(), **labels)
+
+    def inc(self, name: str, amount: float = 1.0, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + amount
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        with self._lock:
+            counter_names = sorted({name for name, _ in self._counters})
+            for name in counter_names:
+                metric = f"{self.prefix}_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for (key, labels), value in sorted(self._counters.items()):
+                    if key == name:
+                        lines.append(f"{metric}{_labels(labels)} {value:g}")
+
+            if self._histograms:
+                metric = f"{self.prefix}_stage_seconds"
+                lines.append(f"# HELP {metric} Per-stage request latency")
+                lines.append(f"# TYPE {metric} histogram")
+                for labels, histogram in sorted(self._histograms.items()):
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS, histogram.counts):
+                        cumulative += count
+                        bucket_labels = labels + (("le", f"{bound:g}"),)
+                        lines.append(f"{metric}_bucket{_labels(bucket_labels)} {cumulative}")
+                    inf_labels = labels + (("le", "+Inf"),)
+                    lines.append(f"{metric}_bucket{_labels(inf_labels)} {histogram.count}")
+                    lines.append(f"{metric}_sum{_labels(labels)} {histogram.sum:.9g}")
+                    lines.append(f"{metric}_count{_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+METRICS = Metrics()
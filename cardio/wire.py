@@ -0,0 +1,100 @@
+"""Packed binary request/response format for batch scoring clients.
+
+A request (``Content-Type: application/x-cardio-records``) is ``n`` records
+of 11 little-endian float64 values in ``RAW_FIELDS`` order, 88 bytes per
+record and nothing else. float64 is what the JSON path parses into, so both
+paths score identical inputs (float32 moves BMI enough to flip forest
+splits). The body is used in place through ``np.frombuffer``; it is copied
+only if an integer field needs truncating the way the JSON path's ``int()``
+casts it.
+
+The response (``application/x-cardio-scores``) is a little-endian uint64
+record count, ``n`` float64 probabilities of class 1 and ``n`` int8 labels.
+Records that fail validation get label ``-1`` and probability NaN, so the
+arrays always line up with the request.
+
+    body = encode_records(rows)            # client
+    raw, valid = decode_records(body)      # server
+    body = encode_scores(labels, proba)    # server
+    labels, proba = decode_scores(body)    # client
+"""
+from __future__ import annotations
+
+from typing import Any, Tuple
+
+import numpy as np
+
+from cardio.features import RAW_FIELDS
+
+REQUEST_TYPE = "application/x-cardio-records"
+RESPONSE_TYPE = "application/x-cardio-scores"
+
+FIELD_DTYPE = np.dtype("<f8")
+RECORD_BYTES = FIELD_DTYPE.itemsize * len(RAW_FIELDS)
+COUNT_DTYPE = np.dtype("<u8")
+PROBA_DTYPE = np.dtype("<f8")
+LABEL_DTYPE = np.dtype("<i1")
+INVALID_LABEL = -1
+
+# Inputs the JSON path casts with int(); the rest are floats
+INT_FIELDS = ("age", "gender", "ap_hi", "ap_lo", "cholesterol", "gluc", "smoke", "alco", "active")
+_INT_COLUMNS = [RAW_FIELDS.index(name) for name in INT_FIELDS]
+_HEIGHT = RAW_FIELDS.index("height")
+
+
+def media_type(header: str) -> str:
+    """``"Application/X-Cardio-Records; v=1"`` -> ``"application/x-cardio-records"``."""
+    return (header or "").split(";", 1)[0].strip().lower()
+
+
+def accepts(accept_header: str, media: str) -> bool:
+    """Whether ``accept_header`` lists ``media`` (exactly; wildcards do not count)."""
+    return any(media_type(part) == media for part in (accept_header or "").split(","))
+
+
+def encode_records(rows: Any) -> bytes:
+    """(n, 11) raw inputs in ``RAW_FIELDS`` order -> request body."""
+    rows = np.asarray(rows, dtype=FIELD_DTYPE)
+    if rows.ndim != 2 or rows.shape[1] != len(RAW_FIELDS):
+        raise ValueError(f"Expected an (n, {len(RAW_FIELDS)}) array, got shape {rows.shape}")
+    return rows.tobytes()
+
+
+def decode_records(body: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """Request body -> ((n, 11) float64 raw rows, mask of valid rows).
+
+    The rows are a read-only view of ``body`` unless truncation was needed.
+    """
+    if len(body) % RECORD_BYTES:
+        raise ValueError(f"Body of {len(body)} bytes is not a whole number of {RECORD_BYTES}-byte records")
+    raw = np.frombuffer(body, dtype=FIELD_DTYPE).reshape(-1, len(RAW_FIELDS))
+    valid = np.isfinite(raw).all(axis=1) & (raw[:, _HEIGHT] > 0)
+    ints = raw[:, _INT_COLUMNS]
+    truncated = np.trunc(ints)
+    if not np.array_equal(ints[valid], truncated[valid]):
+        raw = raw.copy()
+        raw[:, _INT_COLUMNS] = truncated
+    return raw, valid
+
+
+def encode_scores(labels: Any, proba: Any, valid: Any = None) -> bytes:
+    """Response body; ``labels`` / ``proba`` cover the valid rows of ``valid`` only."""
+    labels = np.asarray(labels)
+    proba = np.asarray(proba)
+    if valid is None:
+        valid = np.ones(len(labels), dtype=bool)
+    valid = np.asarray(valid, dtype=bool)
+    out_proba = np.full(len(valid), np.nan, dtype=PROBA_DTYPE)
+    out_labels = np.full(len(valid), INVALID_LABEL, dtype=LABEL_DTYPE)
+    out_proba[valid] = proba
+    out_labels[valid] = labels
+    return np.array([len(valid)], dtype=COUNT_DTYPE).tobytes() + out_proba.tobytes() + out_labels.tobytes()
+
+
+def decode_scores(body: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """Response body -> (int8 labels, float64 probabilities)."""
+    (n,) = np.frombuffer(body, dtype=COUNT_DTYPE, count=1)
+    offset = COUNT_DTYPE.itemsize
+    proba = np.frombuffer(body, dtype=PROBA_DTYPE, count=n, offset=offset)
+    labels = np.frombuffer(body, dtype=LABEL_DTYPE, count=n, offset=offset + n * PROBA_DTYPE.itemsize)
+    return labels, proba
@@ -0,0 +1,42 @@
+"""Shared fixtures: a small forest + scaler fitted on synthetic patients."""
+from __future__ import annotations
+
+from typing import Any, Dict
+
+import numpy as np
+import pytest
+
+from cardio.features import FEATURE_ORDER, NUMERIC_FEATURES, RAW_FIELDS, build_features, scale_features
+from cardio.synthetic import synthetic_columns
+
+N_ROWS = 1500
+
+
+@pytest.fixture(scope="session")
+def patients() -> Dict[str, Any]:
+    """Raw rows (RAW_FIELDS order), unscaled features and labels."""
+    columns = synthetic_columns(N_ROWS, seed=7)
+    raw = np.column_stack([np.asarray(columns[name], dtype=np.float64) for name in RAW_FIELDS])
+    return {"raw": raw, "X": build_features(raw, FEATURE_ORDER), "y": np.asarray(columns["cardio"])}
+
+
+@pytest.fixture(scope="session")
+def scaler(patients: Dict[str, Any]) -> Any:
+    pd = pytest.importorskip("pandas")
+    from sklearn.preprocessing import StandardScaler
+
+    index = [FEATURE_ORDER.index(name) for name in NUMERIC_FEATURES]
+    return StandardScaler().fit(pd.DataFrame(patients["X"][:, index], columns=NUMERIC_FEATURES))
+
+
+@pytest.fixture(scope="session")
+def scaled(patients: Dict[str, Any], scaler: Any) -> np.ndarray:
+    return scale_features(patients["X"], scaler, FEATURE_ORDER)
+
+
+@pytest.fixture(scope="session")
+def forest(scaled: np.ndarray, patients: Dict[str, Any]) -> Any:
+    from sklearn.ensemble import RandomForestClassifier
+
+    model = RandomForestClassifier(n_estimators=25, max_depth=10, random_state=0)
+    return model.fit(scaled, patients["y"])
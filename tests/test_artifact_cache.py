@@ -0,0 +1,49 @@
+"""Artifact cache eviction around batches and large downloads."""
+from __future__ import annotations
+
+import pytest
+
+from cardio.artifact_cache import ArtifactCache
+from cardio.standin import ArtifactServer
+
+
+@pytest.fixture
+def server(tmp_path):
+    served = tmp_path / "served"
+    served.mkdir()
+    for name, size in (("model.npz", 6000), ("scaler.joblib", 1500), ("other.npz", 5000)):
+        (served / name).write_bytes(bytes(range(256)) * (size // 256) + b"x" * (size % 256))
+    with ArtifactServer(str(served)) as artifact_server:
+        yield artifact_server
+
+
+def test_fetch_many_keeps_the_whole_batch(server, tmp_path):
+    # Room for the model alone: per-fetch eviction used to delete a sibling
+    cache = ArtifactCache(tmp_path / "cache", max_bytes=6500)
+    fetched = cache.fetch_many([server.url("model.npz"), server.url("scaler.joblib")])
+    assert [artifact.status for artifact in fetched] == ["miss", "miss"]
+    assert all(artifact.path.exists() for artifact in fetched)
+
+
+def test_next_fetch_evicts_the_previous_batch(server, tmp_path):
+    cache = ArtifactCache(tmp_path / "cache", max_bytes=6500)
+    first = cache.fetch_many([server.url("model.npz"), server.url("scaler.joblib")])
+    (other,) = cache.fetch_many([server.url("other.npz")])
+    assert other.path.exists()
+    assert not first[0].path.exists()
+    assert sum(path.stat().st_size for path in (tmp_path / "cache" / "blobs").iterdir()) <= 6500
+
+
+def test_revalidated_entries_are_hits(server, tmp_path):
+    cache = ArtifactCache(tmp_path / "cache", max_bytes=1 << 20)
+    cache.fetch(server.url("scaler.joblib"))
+    again = cache.fetch(server.url("scaler.joblib"))
+    assert again.status in ("hit", "revalidated")
+    assert server.requests["/scaler.joblib"] >= 1
+
+
+def test_default_cap_fits_the_disk(tmp_path):
+    import shutil
+
+    cache = ArtifactCache(tmp_path / "cache")
+    assert 0 < cache.max_bytes <= shutil.disk_usage(tmp_path).free
@@ -0,0 +1,96 @@
+"""Stage keys of the memoized DAG and loading of cached outputs."""
+from __future__ import annotations
+
+import importlib
+import sys
+import textwrap
+
+from cardio.dag import Pipeline
+
+HELPER = """
+def scale(value):
+    return value * {factor}
+"""
+
+STAGES = """
+def double(value):
+    return value * {factor}
+
+
+def stage(params):
+    return double(params["x"])
+"""
+
+
+def write_module(directory, name, source):
+    # Rewrites use sources of a different length: linecache and the bytecode
+    # cache compare size and (second-resolution) mtime
+    (directory / f"{name}.py").write_text(textwrap.dedent(source))
+    importlib.invalidate_caches()
+
+
+def keys_of(root, fn, **stage):
+    pipe = Pipeline(root)
+    pipe.stage(**stage)(fn)
+    return pipe.keys(["stage"])["stage"]
+
+
+def stage(params):
+    return params["x"]
+
+
+def test_declared_module_changes_the_key(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    write_module(tmp_path, "dag_helper_a", HELPER.format(factor=2))
+    before = keys_of(tmp_path / "cache", stage, modules=("dag_helper_a",))
+    undeclared = keys_of(tmp_path / "cache", stage)
+    write_module(tmp_path, "dag_helper_a", HELPER.format(factor=30))
+    assert keys_of(tmp_path / "cache", stage, modules=("dag_helper_a",)) != before
+    assert keys_of(tmp_path / "cache", stage) == undeclared
+
+
+def test_helper_of_the_stage_module_changes_the_key(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    write_module(tmp_path, "dag_stages_b", STAGES.format(factor=2))
+    module = importlib.import_module("dag_stages_b")
+    before = keys_of(tmp_path / "cache", module.stage)
+    write_module(tmp_path, "dag_stages_b", STAGES.format(factor=30))
+    module = importlib.reload(module)
+    try:
+        assert keys_of(tmp_path / "cache", module.stage) != before
+    finally:
+        sys.modules.pop("dag_stages_b", None)
+
+
+def test_params_change_the_key(tmp_path):
+    assert keys_of(tmp_path, stage, params={"x": 1}) != keys_of(tmp_path, stage, params={"x": 2})
+
+
+def test_cached_output_is_loaded_once(tmp_path, monkeypatch):
+    checks = []
+
+    def build():
+        pipe = Pipeline(tmp_path)
+        pipe.stage(params={"x": 4}, check=lambda output: checks.append(output) or True)(stage)
+        return pipe
+
+    outputs, runs = build().run(["stage"], log=lambda message: None)
+    assert outputs == {"stage": 4} and runs[0].status == "ran"
+
+    loads = []
+    original = Pipeline.load
+    monkeypatch.setattr(Pipeline, "load", lambda self, name, key: loads.append(name) or original(self, name, key))
+    outputs, runs = build().run(["stage"], log=lambda message: None)
+    assert outputs == {"stage": 4} and runs[0].status == "cached"
+    assert loads == ["stage"] and checks == [4]
+
+
+def test_failed_check_reruns_the_stage(tmp_path):
+    def build(check):
+        pipe = Pipeline(tmp_path)
+        pipe.stage(params={"x": 4}, check=check)(stage)
+        return pipe
+
+    build(None).run(["stage"], log=lambda message: None)
+    _, runs = build(lambda output: False).run(["stage"], log=lambda message: None)
+    assert runs[0].status == "ran"
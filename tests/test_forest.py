@@ -0,0 +1,78 @@
+"""CompiledForest parity with sklearn, through every serialised form."""
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from cardio import portable
+from cardio.compact import compact_arrays, float32_thresholds
+from cardio.features import FEATURE_ORDER, scale_features
+from cardio.forest import CompiledForest, check_parity
+
+
+def assert_same_predictions(model, reference, X, atol=0.0):
+    labels, proba = model.predict_with_proba(X)
+    np.testing.assert_array_equal(labels, reference.predict(X))
+    np.testing.assert_allclose(proba, reference.predict_proba(X), rtol=0, atol=atol)
+
+
+def test_compiled_matches_sklearn(forest, scaled):
+    compiled = CompiledForest.from_sklearn(forest)
+    report = check_parity(forest, compiled, scaled)
+    assert report["label_mismatches"] == 0
+    assert_same_predictions(compiled, forest, scaled, atol=1e-12)
+
+
+def test_npz_round_trip(forest, scaled, tmp_path):
+    path = tmp_path / "forest.npz"
+    CompiledForest.from_sklearn(forest).save(path)
+    for mmap_mode in (None, "r"):
+        assert_same_predictions(CompiledForest.load(path, mmap_mode=mmap_mode), forest, scaled, atol=1e-12)
+
+
+def test_cardio_bundle_round_trip(forest, scaler, patients, scaled, tmp_path):
+    path = tmp_path / "model.cardio"
+    portable.export(forest, scaler, path)
+    assert portable.is_bundle(path)
+    bundle = portable.load(path)
+    assert bundle.feature_order == FEATURE_ORDER
+    # The bundled scaler reproduces the sklearn scaling exactly
+    np.testing.assert_array_equal(scale_features(patients["X"], bundle.scaler, bundle.feature_order), scaled)
+    assert_same_predictions(bundle.model, forest, scaled, atol=1e-12)
+
+
+def test_cardio_bundle_rejects_corruption(forest, scaler, tmp_path):
+    path = tmp_path / "model.cardio"
+    portable.export(forest, scaler, path)
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xFF
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="Checksum"):
+        portable.load(path)
+    path.write_bytes(bytes(data[:-9]))
+    with pytest.raises(ValueError, match="Truncated"):
+        portable.load(path)
+
+
+def test_float32_thresholds_keep_every_decision():
+    rng = np.random.default_rng(0)
+    threshold = rng.normal(size=5000)
+    single = float32_thresholds(threshold)
+    assert single.dtype == np.float32
+    # float32 inputs at, just below and just above each float64 threshold
+    x = threshold.astype(np.float32)
+    for candidate in (x, np.nextafter(x, np.float32(-np.inf)), np.nextafter(x, np.float32(np.inf))):
+        np.testing.assert_array_equal(candidate > single, candidate.astype(np.float64) > threshold)
+
+
+def test_compacted_forest_matches(forest, scaler, scaled, tmp_path):
+    compact = compact_arrays(CompiledForest.from_sklearn(forest))
+    assert compact.threshold.dtype == np.float32
+    # Leaf values are stored as float32 P(class 1)
+    assert_same_predictions(compact, forest, scaled, atol=1e-6)
+    compact.save(tmp_path / "compact.npz")
+    assert_same_predictions(CompiledForest.load(tmp_path / "compact.npz"), forest, scaled, atol=1e-6)
+    portable.export(compact, scaler, tmp_path / "compact.cardio")
+    bundle = portable.load(tmp_path / "compact.cardio")
+    assert bundle.model.threshold.dtype == np.float32
+    assert_same_predictions(bundle.model, forest, scaled, atol=1e-6)
@@ -0,0 +1,71 @@
+"""Prediction log files: write, map back, torn tails and retention."""
+from __future__ import annotations
+
+import os
+
+import numpy as np
+import pytest
+
+from cardio import predlog
+
+
+def write_log(directory, raw, **kwargs):
+    log = predlog.PredictionLog(directory, flush_interval=0.01, **kwargs)
+    labels = (np.arange(len(raw)) % 2).astype(np.int8)
+    proba = np.linspace(0.1, 0.9, len(raw))
+    log.log(raw, labels, proba, "abcdef0123456789", source="packed")
+    log.flush()
+    log.close()
+    return labels, proba
+
+
+def test_records_read_back(tmp_path, patients):
+    raw = patients["raw"][:50]
+    labels, proba = write_log(tmp_path, raw)
+    (path,) = predlog.log_files([tmp_path])
+    records = predlog.open_log(path)
+    assert len(records) == len(raw)
+    np.testing.assert_array_equal(records["raw"], raw)
+    np.testing.assert_array_equal(records["label"], labels)
+    np.testing.assert_array_equal(records["proba"], proba)
+    assert set(records["version"]) == {b"abcdef0123456789"}
+    assert set(records["batch"]) == {len(raw)}
+
+
+def test_torn_last_record_is_ignored(tmp_path, patients):
+    raw = patients["raw"][:10]
+    write_log(tmp_path, raw)
+    (path,) = predlog.log_files([tmp_path])
+    with open(path, "ab") as fh:
+        fh.write(b"\x01" * (predlog.RECORD_DTYPE.itemsize - 3))
+    records = predlog.open_log(path)
+    assert len(records) == len(raw)
+    np.testing.assert_array_equal(records["raw"], raw)
+    assert sum(len(chunk) for chunk in predlog.iter_records([tmp_path], chunk=3)) == len(raw)
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / ("predictions-x" + predlog.SUFFIX)
+    path.write_bytes(b"not a log")
+    with pytest.raises(ValueError):
+        predlog.open_log(path)
+
+
+def test_rotation_prunes_own_and_dead_files_only(tmp_path, patients):
+    def touch(pid, sequence):
+        path = tmp_path / f"predictions-20260101-00000{sequence}-{pid}-{sequence:04d}{predlog.SUFFIX}"
+        path.write_bytes(b"x")
+        return path
+
+    dead = [touch(2 ** 22 + 17, i) for i in range(4)]  # above the default pid_max
+    live = [touch(os.getppid(), i) for i in range(4)]
+    # Every request rotates: each record is bigger than max_bytes allows
+    log = predlog.PredictionLog(tmp_path, max_bytes=1, keep=2, flush_interval=0.01)
+    for _ in range(5):
+        log.log(patients["raw"][:2], np.zeros(2), np.zeros(2), "v")
+        log.flush()
+    log.close()
+    assert all(path.exists() for path in live)
+    assert [path.exists() for path in dead] == [False, False, True, True]
+    own = list(tmp_path.glob(f"predictions-*-{os.getpid()}-*{predlog.SUFFIX}"))
+    assert len(own) == 2
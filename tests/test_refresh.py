@@ -0,0 +1,64 @@
+"""Threshold rescaling keeps every tree splitting at the same raw values."""
+from __future__ import annotations
+
+import copy
+
+import numpy as np
+import pytest
+
+from cardio.features import FEATURE_ORDER, NUMERIC_FEATURES, scale_features
+from cardio.refresh import rescale_thresholds, update_scaler
+
+pd = pytest.importorskip("pandas")
+
+
+def numeric_frame(X):
+    index = [FEATURE_ORDER.index(name) for name in NUMERIC_FEATURES]
+    return pd.DataFrame(X[:, index], columns=NUMERIC_FEATURES)
+
+
+@pytest.fixture(scope="module")
+def grid_rows(patients):
+    """Features with bmi on the 4-decimal grid every other input is on."""
+    X = patients["X"].copy()
+    X[:, FEATURE_ORDER.index("bmi")] = np.round(X[:, FEATURE_ORDER.index("bmi")], 1)
+    return X
+
+
+def test_rescaled_trees_keep_every_leaf(grid_rows, patients):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    history, new = grid_rows[:1000], grid_rows[1000:]
+    scaler = StandardScaler().fit(numeric_frame(history))
+    old_scaled = scale_features(grid_rows, scaler)
+    model = RandomForestClassifier(n_estimators=20, max_depth=12, random_state=0)
+    model.fit(old_scaled[:1000], patients["y"][:1000])
+
+    updated, old_mean, old_scale = update_scaler(scaler, numeric_frame(new))
+    assert not np.allclose(updated.mean_, old_mean)
+    rescaled = copy.deepcopy(model)
+    moved = rescale_thresholds(rescaled, FEATURE_ORDER, list(scaler.feature_names_in_),
+                               (old_mean, old_scale), (updated.mean_, updated.scale_))
+    assert moved > 0
+
+    new_scaled = scale_features(grid_rows, updated)
+    np.testing.assert_array_equal(rescaled.apply(new_scaled), model.apply(old_scaled))
+    np.testing.assert_array_equal(rescaled.predict_proba(new_scaled), model.predict_proba(old_scaled))
+
+
+def test_dummy_splits_are_left_alone(grid_rows, patients):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler().fit(numeric_frame(grid_rows))
+    model = RandomForestClassifier(n_estimators=5, random_state=0).fit(scale_features(grid_rows, scaler), patients["y"])
+    dummy = [i for i, name in enumerate(FEATURE_ORDER) if name not in NUMERIC_FEATURES]
+    before = [est.tree_.threshold.copy() for est in model.estimators_]
+    mean, scale = np.array(scaler.mean_), np.array(scaler.scale_)
+    rescale_thresholds(model, FEATURE_ORDER, list(scaler.feature_names_in_), (mean, scale), (mean + 1.0, scale * 2.0))
+    for estimator, old in zip(model.estimators_, before):
+        on_dummy = np.isin(estimator.tree_.feature, dummy)
+        np.testing.assert_array_equal(estimator.tree_.threshold[on_dummy], old[on_dummy])
+        assert not np.array_equal(estimator.tree_.threshold[~on_dummy & (estimator.tree_.feature >= 0)],
+                                  old[~on_dummy & (estimator.tree_.feature >= 0)])
@@ -0,0 +1,62 @@
+"""Packed request / response bodies, including malformed ones."""
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from cardio import wire
+from cardio.features import RAW_FIELDS
+
+
+def test_round_trip_is_a_view(patients):
+    body = wire.encode_records(patients["raw"])
+    assert len(body) == len(patients["raw"]) * wire.RECORD_BYTES
+    raw, valid = wire.decode_records(body)
+    np.testing.assert_array_equal(raw, patients["raw"])
+    assert valid.all()
+    assert not raw.flags.writeable  # no copy for integral inputs
+
+
+def test_empty_body():
+    raw, valid = wire.decode_records(b"")
+    assert raw.shape == (0, len(RAW_FIELDS))
+    assert valid.shape == (0,)
+
+
+@pytest.mark.parametrize("cut", [1, wire.RECORD_BYTES - 1, wire.RECORD_BYTES + 8])
+def test_truncated_body_is_rejected(patients, cut):
+    body = wire.encode_records(patients["raw"][:2])
+    with pytest.raises(ValueError, match="whole number"):
+        wire.decode_records(body[:-cut])
+
+
+def test_invalid_records_are_flagged(patients):
+    rows = patients["raw"][:5].copy()
+    rows[1, 0] = np.nan
+    rows[2, RAW_FIELDS.index("weight")] = np.inf
+    rows[3, RAW_FIELDS.index("height")] = 0
+    raw, valid = wire.decode_records(wire.encode_records(rows))
+    assert valid.tolist() == [True, False, False, False, True]
+
+
+def test_integer_fields_truncate_like_json(patients):
+    rows = patients["raw"][:3].copy()
+    rows[:, RAW_FIELDS.index("ap_hi")] += 0.9
+    rows[:, RAW_FIELDS.index("weight")] += 0.5
+    raw, valid = wire.decode_records(wire.encode_records(rows))
+    assert valid.all()
+    np.testing.assert_array_equal(raw[:, RAW_FIELDS.index("ap_hi")], np.trunc(rows[:, RAW_FIELDS.index("ap_hi")]))
+    # float fields are kept as sent
+    np.testing.assert_array_equal(raw[:, RAW_FIELDS.index("weight")], rows[:, RAW_FIELDS.index("weight")])
+
+
+def test_encode_rejects_wrong_shape():
+    with pytest.raises(ValueError):
+        wire.encode_records(np.zeros((2, len(RAW_FIELDS) - 1)))
+
+
+def test_scores_line_up_with_invalid_rows():
+    valid = np.array([True, False, True])
+    labels, proba = wire.decode_scores(wire.encode_scores([1, 0], [0.8, 0.3], valid))
+    assert labels.tolist() == [1, wire.INVALID_LABEL, 0]
+    assert proba[0] == 0.8 and np.isnan(proba[1]) and proba[2] == 0.3